@@ -0,0 +1,80 @@
+"""
+Batch Classification Benchmark
+Compares classifying paths one at a time (ConfigSnapshot.classify, a Path
+per entry) with BatchClassifier.classify_many on plain strings, using the
+repository's file_rules.json.
+
+Usage:
+    python benchmarks/bench_classify.py [--paths 2000000] [--batch 65536]
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+# Import the organizer modules from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from folder_monitor_json import ConfigSnapshot
+from organize import BatchClassifier, iter_batches, CLASSIFY_BATCH
+
+CONFIG_FILE = Path(__file__).resolve().parent.parent / "file_rules.json"
+
+
+def synthetic_paths(count, extensions, rng):
+    """Paths in a few hundred folders: mostly known extensions, some unknown, multi-part or none."""
+    paths = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.85:
+            ext = rng.choice(extensions)
+            if rng.random() < 0.1:
+                ext = ext.upper()
+        elif roll < 0.9:
+            ext = f".x{rng.randint(0, 50)}"
+        elif roll < 0.95:
+            ext = ".tar.gz"
+        else:
+            ext = ""
+        paths.append(f"/home/user/Downloads/folder{i % 300}/file_{i}{ext}")
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch classification")
+    parser.add_argument("--paths", type=int, default=2000000, help="paths to classify")
+    parser.add_argument("--single", type=int, default=100000, help="paths for the one-at-a-time baseline")
+    parser.add_argument("--batch", type=int, default=CLASSIFY_BATCH, help="paths per classify_many call")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    snapshot = ConfigSnapshot.from_file(CONFIG_FILE)
+    rng = random.Random(args.seed)
+    paths = synthetic_paths(args.paths, sorted(snapshot.file_extensions), rng)
+
+    start = time.perf_counter()
+    for path in paths[:args.single]:
+        snapshot.classify(path)
+    single_rate = min(args.single, len(paths)) / (time.perf_counter() - start)
+
+    batches = list(iter_batches(paths, args.batch))
+    classifier = BatchClassifier(snapshot)
+    rates = []
+    for _ in range(2):
+        start = time.perf_counter()
+        for batch in batches:
+            classifier.classify_many(batch)
+        rates.append(len(paths) / (time.perf_counter() - start))
+
+    print(f"{'method':<28} {'paths/s':>14}")
+    print("-" * 43)
+    print(f"{'classify (one Path each)':<28} {single_rate:>14,.0f}")
+    print(f"{'classify_many (cold memo)':<28} {rates[0]:>14,.0f}")
+    print(f"{'classify_many (warm memo)':<28} {rates[1]:>14,.0f}")
+    print(f"\n{len(classifier.memo or ())} memo keys, {len(classifier.tails)} extension tails")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+Pipeline Benchmark
+End-to-end benchmark of detection -> classification -> move for each monitor.
+
+Every variant runs as a child process with HOME pointed at a synthetic tree
+in a temporary directory, so the real Downloads folder is never touched:
+
+- the Downloads folder is pre-filled with --entries files (mixed extensions
+  from file_rules.json) that the monitor has to live next to
+- destination folders are pre-seeded with the names about to arrive, so
+  duplicate naming is exercised heavily
+- new files are small (up to 64 KB) with a share of large ones (--large-mb)
+
+Measured per variant:
+
+- idle CPU, extrapolated to CPU seconds per idle hour
+- end-to-end latency percentiles (file closed in Downloads -> file gone from it)
+- files/sec for a burst of files renamed into Downloads at once
+- files/sec for the startup reconcile scan (JSON monitor only)
+- peak RSS of the monitor process
+
+Results are written as JSON so runs can be compared between versions.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--entries 10000] [--variants json-polling,json-auto]
+        [--output results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import argparse
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from rule_engine import RuleEngine
+
+# Python code run in the child process for each variant
+RUNNERS = {
+    "json-polling": "import folder_monitor_json as m; m.monitor_downloads_folder(reconcile={reconcile})",
+    "json-auto": "import folder_monitor_json as m; m.monitor_downloads_folder(reconcile={reconcile})",
+    "watchdog": "import folder_monitor as m; m.monitor_downloads_folder()",
+    "service": (
+        "import win32event, file_organizer_service as s\n"
+        "svc = s.FileOrganizerService.__new__(s.FileOrganizerService)\n"
+        "svc.hWaitStop = win32event.CreateEvent(None, 0, 0, None)\n"
+        "svc.is_alive = True\n"
+        "svc.setup_logging()\n"
+        "svc.main_loop()"
+    ),
+}
+
+# Modules a variant needs; missing ones mark the variant as skipped
+REQUIREMENTS = {
+    "watchdog": ["watchdog"],
+    "service": ["win32serviceutil", "win32event"],
+}
+
+# Settings overrides per variant (written into the child's file_rules.json)
+VARIANT_SETTINGS = {
+    "json-polling": {"watcher_backend": "polling"},
+    "json-auto": {"watcher_backend": "auto"},
+}
+
+STEMS = ["report", "invoice", "IMG_0001", "setup", "document", "photo", "track", "archive", "notes", "scan"]
+
+
+def load_config():
+    with open(REPO_ROOT / "file_rules.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def flatten_extensions(config):
+    """Flatten the categorized extension map from file_rules.json."""
+    file_extensions = {}
+    for category, extensions in config.get("file_extensions", {}).items():
+        if isinstance(extensions, dict) and not category.startswith("_"):
+            file_extensions.update(extensions)
+    return file_extensions
+
+
+def process_usage(pid):
+    """Return (cpu_seconds, peak_rss_bytes) of a process, or Nones if unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        peak = None
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) * 1024
+        return cpu, peak
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+        process = psutil.Process(pid)
+        times = process.cpu_times()
+        memory = process.memory_info()
+        return times.user + times.system, getattr(memory, "peak_wset", memory.rss)
+    except Exception:
+        return None, None
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def pick(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2)
+    return {"p50_ms": pick(0.50), "p90_ms": pick(0.90), "p99_ms": pick(0.99),
+            "max_ms": round(values[-1] * 1000, 2), "samples": len(values)}
+
+
+def wait_until_gone(paths, timeout):
+    """Wait until none of paths exists. Returns {path: time it vanished}."""
+    pending = set(paths)
+    gone = {}
+    deadline = time.perf_counter() + timeout
+    while pending and time.perf_counter() < deadline:
+        for path in list(pending):
+            if not os.path.exists(path):
+                gone[path] = time.perf_counter()
+                pending.discard(path)
+        if pending:
+            time.sleep(0.001)
+    return gone
+
+
+class SyntheticTree:
+    """A fake home directory with a populated Downloads folder."""
+
+    def __init__(self, root, config, args, rng):
+        self.home = Path(root) / "home"
+        self.workdir = Path(root) / "work"
+        self.downloads = self.home / "Downloads"
+        self.staging = self.home / "staging"
+        self.config = config
+        self.args = args
+        self.rng = rng
+
+        settings = config.get("settings", {})
+        temp_suffixes = tuple(settings.get("temp_suffixes", []))
+        self.extensions = [ext for ext in sorted(flatten_extensions(config)) if not ext.endswith(temp_suffixes)]
+        self.extensions.append(".weird")  # unknown extension -> default folder
+        self.engine = RuleEngine(config.get("rules", []), flatten_extensions(config),
+                                 settings.get("case_sensitive", False))
+        self.default_folder = settings.get("default_folder", "Downloads/Others")
+
+    def build(self, variant):
+        for folder in (self.downloads, self.staging, self.workdir):
+            folder.mkdir(parents=True, exist_ok=True)
+
+        config = json.loads(json.dumps(self.config))
+        config.setdefault("settings", {}).update(VARIANT_SETTINGS.get(variant, {}))
+        config["settings"]["settle_seconds"] = self.args.settle_seconds
+        config["settings"]["reconcile_files_per_second"] = 0
+        with open(self.workdir / "file_rules.json", "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2)
+
+        # Existing entries the monitor must coexist with (empty files keep this fast)
+        for i in range(self.args.entries):
+            name = f"old{i}{self.rng.choice(self.extensions)}"
+            os.close(os.open(self.downloads / name, os.O_CREAT | os.O_WRONLY, 0o644))
+
+    def destination(self, name):
+        rule = self.engine.match(name)
+        return self.home / (rule.destination if rule else self.default_folder)
+
+    def new_name(self, unique=None):
+        stem = self.rng.choice(STEMS)
+        if unique is not None:
+            stem = f"{stem} ({unique})"
+        return stem + self.rng.choice(self.extensions)
+
+    def seed_collisions(self, name):
+        """Occupy name and name_1 at the destination so the claim has to probe."""
+        dest = self.destination(name)
+        dest.mkdir(parents=True, exist_ok=True)
+        stem, ext = os.path.splitext(name)
+        for taken in (name, f"{stem}_1{ext}"):
+            os.close(os.open(dest / taken, os.O_CREAT | os.O_WRONLY, 0o644))
+
+    def write_file(self, path):
+        """Write a small file, or a large one in 1 MB chunks."""
+        if self.rng.random() < self.args.large_ratio:
+            size = self.args.large_mb * 1024 * 1024
+        else:
+            size = self.rng.randint(0, 64 * 1024)
+        chunk = os.urandom(min(size, 1024 * 1024))
+        with open(path, "wb") as f:
+            remaining = size
+            while remaining > 0:
+                f.write(chunk[:remaining])
+                remaining -= len(chunk)
+        return size
+
+
+class MonitorProcess:
+    """A monitor variant running in a child process."""
+
+    def __init__(self, variant, tree, reconcile=False):
+        code = (f"import sys; sys.path.insert(0, {str(REPO_ROOT)!r})\n"
+                + RUNNERS[variant].format(reconcile=reconcile))
+        env = dict(os.environ, HOME=str(tree.home), USERPROFILE=str(tree.home))
+        self.process = subprocess.Popen([sys.executable, "-c", code], cwd=tree.workdir, env=env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def usage(self):
+        return process_usage(self.process.pid)
+
+    def stop(self):
+        if os.name == "posix":
+            self.process.send_signal(signal.SIGINT)  # KeyboardInterrupt: clean shutdown
+        else:
+            self.process.terminate()
+        try:
+            self.process.wait(30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+def wait_for_startup(tree, timeout):
+    """Drop probe files until the monitor moves one. Returns seconds since launch or None.
+
+    Files created before the watcher is running are never reported, so a new
+    probe is written every couple of seconds until one of them disappears.
+    """
+    start = time.perf_counter()
+    attempt = 0
+    while time.perf_counter() - start < timeout:
+        path = tree.downloads / tree.new_name(f"probe {attempt}")
+        tree.write_file(path)
+        if wait_until_gone([str(path)], 2):
+            return time.perf_counter() - start
+        attempt += 1
+    return None
+
+
+def run_variant(variant, args, config, rng):
+    missing = [module for module in REQUIREMENTS.get(variant, []) if not module_available(module)]
+    if missing:
+        return {"skipped": f"missing modules: {', '.join(missing)}"}
+
+    result = {"entries": args.entries}
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as root:
+        tree = SyntheticTree(root, config, args, rng)
+        start = time.perf_counter()
+        tree.build(variant)
+        result["build_seconds"] = round(time.perf_counter() - start, 2)
+
+        monitor = MonitorProcess(variant, tree)
+        try:
+            startup = wait_for_startup(tree, args.timeout)
+            if startup is None:
+                return dict(result, error="monitor did not move any probe file")
+            result["startup_seconds"] = round(startup, 3)
+
+            # Idle: nothing changes, the folder still holds every entry
+            cpu_before, _ = monitor.usage()
+            time.sleep(args.idle_seconds)
+            cpu_after, _ = monitor.usage()
+            if cpu_before is not None:
+                result["idle_cpu_seconds_per_hour"] = round((cpu_after - cpu_before) / args.idle_seconds * 3600, 2)
+
+            # Latency: one file at a time, timed from close to disappearance
+            latencies = []
+            timeouts = 0
+            for _ in range(args.latency_samples):
+                path = tree.downloads / tree.new_name()
+                if tree.rng.random() < args.collision_ratio:
+                    tree.seed_collisions(path.name)
+                tree.write_file(path)
+                written = time.perf_counter()
+                gone = wait_until_gone([str(path)], args.timeout)
+                if gone:
+                    latencies.append(gone[str(path)] - written)
+                else:
+                    timeouts += 1
+            result["latency"] = percentiles(latencies)
+            result["latency_timeouts"] = timeouts
+
+            # Burst: files renamed into Downloads all at once
+            staged = []
+            staged_bytes = 0
+            for i in range(args.burst):
+                name = tree.new_name(i)
+                if tree.rng.random() < args.collision_ratio:
+                    tree.seed_collisions(name)
+                staged_bytes += tree.write_file(tree.staging / name)
+                staged.append(name)
+            start = time.perf_counter()
+            for name in staged:
+                os.rename(tree.staging / name, tree.downloads / name)
+            gone = wait_until_gone([str(tree.downloads / name) for name in staged], args.timeout + args.burst)
+            elapsed = (max(gone.values()) - start) if gone else None
+            result["burst"] = {
+                "files": len(staged), "moved": len(gone), "bytes": staged_bytes,
+                "seconds": round(elapsed, 3) if elapsed else None,
+                "files_per_sec": round(len(gone) / elapsed, 1) if elapsed else None,
+            }
+
+            _, peak = monitor.usage()
+            result["peak_rss_mb"] = round(peak / (1024 * 1024), 1) if peak else None
+        finally:
+            monitor.stop()
+
+        if variant.startswith("json") and args.entries:
+            result["reconcile"] = run_reconcile(variant, tree, args)
+    return result
+
+
+def run_reconcile(variant, tree, args):
+    """Restart the JSON monitor with --reconcile and time the backlog drain."""
+    backlog = sum(1 for entry in os.scandir(tree.downloads) if entry.is_file())
+    start = time.perf_counter()
+    monitor = MonitorProcess(variant, tree, reconcile=True)
+    try:
+        deadline = start + args.timeout + backlog / 10
+        remaining = backlog
+        while remaining and time.perf_counter() < deadline:
+            time.sleep(0.5)
+            remaining = sum(1 for entry in os.scandir(tree.downloads) if entry.is_file())
+        elapsed = time.perf_counter() - start
+        _, peak = monitor.usage()
+    finally:
+        monitor.stop()
+    moved = backlog - remaining
+    return {"files": backlog, "moved": moved, "seconds": round(elapsed, 2),
+            "files_per_sec": round(moved / elapsed, 1),
+            "peak_rss_mb": round(peak / (1024 * 1024), 1) if peak else None}
+
+
+def module_available(name):
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detection -> classification -> move pipeline")
+    parser.add_argument("--variants", default=",".join(RUNNERS), help="comma-separated monitor variants")
+    parser.add_argument("--entries", type=int, default=10000, help="files already in Downloads (10k-1M)")
+    parser.add_argument("--latency-samples", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=500, help="files renamed into Downloads at once")
+    parser.add_argument("--collision-ratio", type=float, default=0.5, help="share of names already taken")
+    parser.add_argument("--large-ratio", type=float, default=0.02, help="share of large files")
+    parser.add_argument("--large-mb", type=int, default=16)
+    parser.add_argument("--settle-seconds", type=float, default=0.5)
+    parser.add_argument("--idle-seconds", type=float, default=10)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for one file")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_pipeline_results.json")
+    args = parser.parse_args()
+
+    config = load_config()
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": vars(args),
+        "results": {},
+    }
+
+    for variant in args.variants.split(","):
+        if variant not in RUNNERS:
+            parser.error(f"unknown variant {variant!r} (choose from {', '.join(RUNNERS)})")
+        print(f"Running {variant}...", flush=True)
+        result = run_variant(variant, args, config, random.Random(args.seed))
+        report["results"][variant] = result
+        print(json.dumps(result, indent=2), flush=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
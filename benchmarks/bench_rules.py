@@ -0,0 +1,110 @@
+"""
+Rule Matching Benchmark
+Compares the compiled RuleEngine with the original flat extension dict lookup.
+
+Usage:
+    python benchmarks/bench_rules.py [--names 200000]
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+# Import the organizer modules from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rule_engine import RuleEngine
+
+RULE_COUNTS = [10, 100, 1000, 5000]
+
+
+def load_extension_map():
+    """Flatten the extension map from file_rules.json."""
+    config_file = Path(__file__).resolve().parent.parent / "file_rules.json"
+    with open(config_file, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    file_extensions = {}
+    for category, extensions in config.get("file_extensions", {}).items():
+        if isinstance(extensions, dict) and not category.startswith("_"):
+            file_extensions.update(extensions)
+    return file_extensions
+
+
+def synthetic_rules(count, rng):
+    """Build an ordered rule list mixing extension, pattern and size rules."""
+    rules = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            rules.append({"destination": f"Rules/ext{i}", "extensions": [f".x{i}.gz", f".y{i}"]})
+        elif kind == 1:
+            rules.append({"destination": f"Rules/glob{i}", "pattern": f"project{i}_*"})
+        elif kind == 2:
+            rules.append({"destination": f"Rules/regex{i}", "regex": rf"^invoice-{i}-\d+"})
+        else:
+            rules.append({"destination": f"Rules/size{i}", "extensions": [f".z{i}"],
+                          "min_size": rng.randint(1, 1000)})
+    return rules
+
+
+def synthetic_names(count, extensions, rng):
+    """File names with realistic extensions plus some that hit the synthetic rules."""
+    names = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.8:
+            names.append(f"file{i}{rng.choice(extensions)}")
+        elif roll < 0.9:
+            names.append(f"archive{i}.tar.gz")
+        else:
+            names.append(f"project{rng.randint(0, 5000)}_notes.txt")
+    return names
+
+
+def time_per_call(func, names):
+    """Return nanoseconds per call of func over names."""
+    start = time.perf_counter_ns()
+    for name in names:
+        func(name)
+    return (time.perf_counter_ns() - start) / len(names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rule matching")
+    parser.add_argument("--names", type=int, default=200000, help="file names per run")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    file_extensions = load_extension_map()
+    names = synthetic_names(args.names, sorted(file_extensions), rng)
+
+    # Original lookup: Path.suffix into the flat dict
+    def dict_lookup(name):
+        return file_extensions.get(Path(name).suffix.lower(), "Downloads/Others")
+
+    class FakeStat:
+        st_size = 500
+        st_mtime = time.time()
+
+    fake_stat = FakeStat()
+
+    print(f"{'rules':>8} {'dict ns/name':>14} {'engine ns/name':>16} {'compile ms':>12}")
+    print("-" * 54)
+    baseline = time_per_call(dict_lookup, names)
+    for count in [0] + RULE_COUNTS:
+        start = time.perf_counter()
+        engine = RuleEngine(synthetic_rules(count, rng), file_extensions)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        match = engine.match
+        per_name = time_per_call(lambda name: match(name, None, fake_stat), names)
+        print(f"{count:>8} {baseline:>14.0f} {per_name:>16.0f} {compile_ms:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Snapshot Memory Check
+Guards the memory and time a polling pass needs for a huge folder: fills a
+temporary folder with empty files, polls it with PollingWatcher after adding
+a few more, and measures the pass with tracemalloc. The set-of-names diff
+the pollers used before is measured alongside, and the pass is timed
+against it (best of a few runs, outside tracemalloc).
+
+Exits with status 1 if the new files were not reported, if the peak or the
+retained snapshot exceeds its ceiling, or if the pass is more than
+--max-slowdown times slower than the set diff. The peak ceiling scales with
+the folder: --max-peak bytes per entry, plus the int objects of one sort
+run and a fixed allowance, so the default passes at any size.
+tests/test_name_snapshot.py runs the same check at a small size.
+
+Usage:
+    python benchmarks/check_snapshot_memory.py [--entries 200000] [--max-peak 24] [--max-retained 9]
+        [--max-slowdown 8]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+# Import the organizer modules from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import name_snapshot
+from folder_watchers import PollingWatcher
+
+NEW_FILES = 5
+# A pass holds the old and new hash arrays plus the merged result (8 bytes each per entry) ...
+PEAK_BYTES_PER_ENTRY = 24
+# ... and, while sorting a run, an int object and a list slot per hash in the run
+PEAK_BYTES_PER_SORTED = 48
+PEAK_FIXED_BYTES = 256 * 1024
+RETAINED_BYTES_PER_ENTRY = 9
+MAX_SLOWDOWN = 8
+# Timing noise allowed on top of the slowdown bound (small folders pass in milliseconds)
+TIME_SLACK_SECONDS = 0.05
+TIMED_RUNS = 3
+
+
+def fill_folder(folder, count):
+    """Create count empty files with download-like names."""
+    for i in range(count):
+        open(os.path.join(folder, f"download_{i:08d}_report.pdf"), "wb").close()
+
+
+def peak_ceiling(entries, bytes_per_entry=PEAK_BYTES_PER_ENTRY):
+    """Peak bytes a polling pass over a folder of entries names may allocate."""
+    return (bytes_per_entry * entries + PEAK_BYTES_PER_SORTED * min(entries, name_snapshot.SORT_RUN)
+            + PEAK_FIXED_BYTES)
+
+
+def measure(action):
+    """Run action under tracemalloc; returns (result, peak bytes above the starting point)."""
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    result = action()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return result, peak
+
+
+def best_time(action, runs=TIMED_RUNS):
+    """Fastest wall-clock time of a few runs of action."""
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def set_diff_pass(folder, previous):
+    """The old polling pass: a fresh set of names, diffed against the previous one."""
+    current = set(os.listdir(folder))
+    return current - previous
+
+
+def run_check(entries, max_peak=PEAK_BYTES_PER_ENTRY, max_retained=RETAINED_BYTES_PER_ENTRY,
+              max_slowdown=MAX_SLOWDOWN, log=print):
+    """Poll a folder of entries files. Returns (results dict, {check: failure message})."""
+    folder = tempfile.mkdtemp(prefix="snapshot_memory_")
+    try:
+        log(f"Creating {entries:,} files in {folder} ...")
+        fill_folder(folder, entries)
+
+        previous_names, retained_sets = measure(lambda: set(os.listdir(folder)))
+        watcher = PollingWatcher(folder, interval=0)
+        watcher.start()
+        previous = watcher.snapshots[folder]
+
+        new_names = {f"new_{i}.pdf" for i in range(NEW_FILES)}
+        for name in new_names:
+            open(os.path.join(folder, name), "wb").close()
+
+        def snapshot_pass():
+            # Poll as if the folder had just changed since the listing taken at start
+            watcher.snapshots[folder] = previous
+            watcher.stamps.clear()
+            return watcher.scan()
+
+        new_by_sets, peak_sets = measure(lambda: set_diff_pass(folder, previous_names))
+        events, peak = measure(snapshot_pass)
+        retained = watcher.snapshots[folder].nbytes()
+        seconds_sets = best_time(lambda: set_diff_pass(folder, previous_names))
+        seconds = best_time(snapshot_pass)
+        watcher.close()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    entries += NEW_FILES
+    results = {
+        "entries": entries,
+        "set": {"peak": peak_sets, "retained": retained_sets, "seconds": seconds_sets},
+        "snapshot": {"peak": peak, "retained": retained, "seconds": seconds},
+    }
+
+    failures = {}
+    if {event.name for event in events} != new_names or new_by_sets != new_names:
+        failures["new_files"] = f"expected {sorted(new_names)}, got {sorted(event.name for event in events)}"
+    ceiling = peak_ceiling(entries, max_peak)
+    if peak > ceiling:
+        failures["peak"] = f"peak {peak:,} bytes ({peak / entries:.1f} per entry) exceeds {ceiling:,}"
+    if retained > max_retained * entries:
+        failures["retained"] = f"snapshot keeps {retained / entries:.1f} bytes per entry, more than {max_retained:g}"
+    if seconds > max_slowdown * seconds_sets + TIME_SLACK_SECONDS:
+        failures["time"] = f"pass took {seconds:.3f}s, more than {max_slowdown:g}x the set diff ({seconds_sets:.3f}s)"
+    return results, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the memory ceiling and speed of a polling pass")
+    parser.add_argument("--entries", type=int, default=200000, help="files in the polled folder")
+    parser.add_argument("--max-peak", type=float, default=PEAK_BYTES_PER_ENTRY,
+                        help="peak bytes per entry allowed during a pass (on top of one sort run)")
+    parser.add_argument("--max-retained", type=float, default=RETAINED_BYTES_PER_ENTRY,
+                        help="bytes per entry allowed between passes")
+    parser.add_argument("--max-slowdown", type=float, default=MAX_SLOWDOWN,
+                        help="how many times slower than the set diff a pass may be")
+    args = parser.parse_args()
+
+    results, failures = run_check(args.entries, args.max_peak, args.max_retained, args.max_slowdown)
+    entries = results["entries"]
+    print(f"\n{'polling pass':<22} {'peak/entry':>12} {'kept/entry':>12} {'seconds':>9}")
+    print("-" * 58)
+    for label, key in (("set of names", "set"), ("NameSnapshot", "snapshot")):
+        row = results[key]
+        print(f"{label:<22} {row['peak'] / entries:>11.1f}B {row['retained'] / entries:>11.1f}B "
+              f"{row['seconds']:>9.3f}")
+    slowdown = results["snapshot"]["seconds"] / max(results["set"]["seconds"], 1e-9)
+    print(f"\nNameSnapshot pass is {slowdown:.1f}x the time of the set diff, "
+          f"for {results['set']['peak'] / max(results['snapshot']['peak'], 1):.1f}x less peak memory")
+
+    for failure in failures.values():
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK: polling stays within the memory and time ceilings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Content Sniffer
+Identifies a file's type from its first bytes (magic numbers), for files
+that have no extension or whose extension doesn't match their content.
+
+Only the header is read, with a single pread of HEADER_SIZE bytes. The
+signature table is compiled into a dict keyed on the first two bytes, so
+identifying a header costs one lookup plus a few byte comparisons. Results
+are kept in an LRU cache keyed by (device, inode, size, mtime), so looking
+at the same unchanged file again costs no I/O at all.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+HEADER_SIZE = 4096
+DEFAULT_CACHE_SIZE = 4096
+
+# (offset, magic bytes, extension), most specific first where prefixes overlap
+SIGNATURES = [
+    (0, b"%PDF-", ".pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", ".png"),
+    (0, b"\xff\xd8\xff", ".jpg"),
+    (0, b"GIF87a", ".gif"),
+    (0, b"GIF89a", ".gif"),
+    (0, b"BM", ".bmp"),
+    (0, b"II*\x00", ".tiff"),
+    (0, b"MM\x00*", ".tiff"),
+    (0, b"8BPS", ".psd"),
+    (0, b"\x00\x00\x01\x00", ".ico"),
+    (0, b"PK\x03\x04", ".zip"),
+    (0, b"PK\x05\x06", ".zip"),
+    (0, b"Rar!\x1a\x07", ".rar"),
+    (0, b"7z\xbc\xaf\x27\x1c", ".7z"),
+    (0, b"\x1f\x8b", ".gz"),
+    (0, b"BZh", ".bz2"),
+    (0, b"\xfd7zXZ\x00", ".xz"),
+    (257, b"ustar", ".tar"),
+    (0, b"MZ", ".exe"),
+    (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", ".doc"),
+    (0, b"{\\rtf", ".rtf"),
+    (0, b"ID3", ".mp3"),
+    (0, b"\xff\xfb", ".mp3"),
+    (0, b"\xff\xf3", ".mp3"),
+    (0, b"fLaC", ".flac"),
+    (0, b"OggS", ".ogg"),
+    (0, b"\x1aE\xdf\xa3", ".mkv"),
+    (0, b"wOFF", ".woff"),
+    (0, b"wOF2", ".woff2"),
+    (0, b"OTTO", ".otf"),
+    (0, b"<svg", ".svg"),
+]
+
+# Files with these extensions share a container format with the sniffed type,
+# so they are not treated as mislabeled (a .docx is a zip, a .mov is ISO media, ...)
+COMPATIBLE_EXTENSIONS = {
+    ".zip": {".zip", ".jar", ".apk", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".epub",
+             ".xpi", ".whl", ".nupkg", ".ipa", ".cbz", ".kmz", ".vsix", ".3mf", ".crx"},
+    ".docx": {".docx", ".docm", ".dotx", ".zip"},
+    ".xlsx": {".xlsx", ".xlsm", ".xltx", ".zip"},
+    ".pptx": {".pptx", ".pptm", ".potx", ".zip"},
+    ".epub": {".epub", ".zip"},
+    ".jpg": {".jpg", ".jpeg", ".jfif", ".jpe"},
+    ".tiff": {".tif", ".tiff", ".dng", ".nef", ".cr2", ".arw"},
+    ".mp4": {".mp4", ".m4v", ".m4a", ".mov", ".3gp", ".heic", ".avif"},
+    ".mov": {".mov", ".qt"},
+    ".mkv": {".mkv", ".webm", ".mka"},
+    ".ogg": {".ogg", ".oga", ".ogv", ".opus"},
+    ".wav": {".wav"},
+    ".exe": {".exe", ".dll", ".sys", ".scr", ".efi"},
+    ".doc": {".doc", ".xls", ".ppt", ".msi", ".msg", ".dot", ".xlt", ".pot"},
+    ".gz": {".gz", ".tgz"},
+    ".bz2": {".bz2", ".tbz", ".tbz2"},
+    ".xz": {".xz", ".txz"},
+    ".svg": {".svg", ".xml"},
+}
+
+
+# Short magic made of printable characters; plain text can start like this too
+WEAK_SIGNATURES = {b"BM", b"MZ", b"BZh", b"ID3"}
+
+
+def looks_like_text(header):
+    """True if the header is NUL-free UTF-8 (allowing a cut-off character at the end)."""
+    if b"\x00" in header:
+        return False
+    try:
+        header[:-3].decode("utf-8")
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def _compile(signatures):
+    """Index signatures at offset 0 by their first two bytes."""
+    by_lead = {}
+    other = []
+    for offset, magic, extension in signatures:
+        if offset == 0 and len(magic) >= 2:
+            by_lead.setdefault(magic[:2], []).append((magic, extension))
+        else:
+            other.append((offset, magic, extension))
+    return by_lead, other
+
+
+_BY_LEAD, _OTHER_SIGNATURES = _compile(SIGNATURES)
+
+
+def _refine_zip(header):
+    """Tell Office Open XML and EPUB files apart from plain zips."""
+    if b"mimetypeapplication/epub+zip" in header:
+        return ".epub"
+    if b"word/" in header:
+        return ".docx"
+    if b"xl/" in header:
+        return ".xlsx"
+    if b"ppt/" in header:
+        return ".pptx"
+    return ".zip"
+
+
+def _refine_riff(header):
+    form = header[8:12]
+    return {b"WAVE": ".wav", b"AVI ": ".avi", b"WEBP": ".webp"}.get(form)
+
+
+def _refine_iso_media(header):
+    """ISO base media (MP4 family): the major brand follows 'ftyp'."""
+    brand = header[8:12]
+    if brand == b"qt  ":
+        return ".mov"
+    if brand in (b"M4A ", b"M4B "):
+        return ".m4a"
+    if brand in (b"heic", b"heix", b"mif1"):
+        return ".heic"
+    if brand == b"avif":
+        return ".avif"
+    return ".mp4"
+
+
+def identify(header):
+    """Return the extension (".pdf", ...) matching a file header, or None."""
+    if header[4:8] == b"ftyp":
+        return _refine_iso_media(header)
+    if header[:4] == b"RIFF":
+        return _refine_riff(header)
+
+    for magic, extension in _BY_LEAD.get(header[:2], ()):
+        if header.startswith(magic):
+            if magic in WEAK_SIGNATURES and looks_like_text(header):
+                continue
+            return _refine_zip(header) if extension == ".zip" else extension
+
+    for offset, magic, extension in _OTHER_SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            return extension
+
+    if header.lstrip()[:5] == b"<?xml" and b"<svg" in header:
+        return ".svg"
+    return None
+
+
+def matches_extension(extension, detected):
+    """True if a file named with extension plausibly has content of type detected."""
+    extension = extension.lower()
+    return extension == detected or extension in COMPATIBLE_EXTENSIONS.get(detected, ())
+
+
+def _read_header(file_path, size):
+    fd = os.open(file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        if hasattr(os, "pread"):
+            return os.pread(fd, size, 0)
+        return os.read(fd, size)
+    finally:
+        os.close(fd)
+
+
+class ContentSniffer:
+    """Header-based type detection with an LRU cache of results."""
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, header_size=HEADER_SIZE):
+        self.cache_size = cache_size
+        self.header_size = header_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def sniff(self, file_path, stat_result=None):
+        """Return the extension matching the file's content, or None if unknown."""
+        try:
+            if stat_result is None:
+                stat_result = os.stat(file_path)
+        except OSError:
+            return None
+        key = (stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+
+        try:
+            detected = identify(_read_header(file_path, self.header_size))
+        except OSError:
+            return None
+
+        with self.lock:
+            self.cache[key] = detected
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return detected
+
+
+def create_sniffer(settings):
+    """Create a ContentSniffer configured from a settings dict."""
+    return ContentSniffer(cache_size=settings.get("sniff_cache_size", DEFAULT_CACHE_SIZE))
@@ -0,0 +1,192 @@
+"""
+Copy Throttle
+Bandwidth limits and I/O priority for cross-device copies.
+
+Each destination device (st_dev) with a limit gets a token bucket. A copy
+takes allowance for every chunk before writing it and sleeps while the
+bucket is in debt, so a 20 GB batch of videos trickles onto a second drive
+at the configured rate instead of stalling everything else that uses it.
+Copies to the same device share its bucket, however many workers run them.
+
+Limits come from the settings ("copy_mb_per_second" for every device,
+"device_copy_mb_per_second" per destination folder, 0 for no limit) and
+are applied with configure_copy_limits(), which the monitors call again on
+every reload. The bucket is looked up again for each chunk, so a new limit
+also applies to copies that are already running.
+
+With "copy_io_priority": "idle", the copying thread drops to idle I/O
+priority for the duration of the copy (ioprio_set on Linux, background
+mode on Windows), so the disk serves it when nothing else is waiting.
+"""
+
+import os
+import time
+import ctypes
+import ctypes.util
+import platform
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+from organizer_metrics import COPY_THROTTLE_SECONDS
+
+MB = 1024 * 1024
+IO_PRIORITIES = ("normal", "idle")
+
+# Chunks hold about CHUNK_SECONDS of data at the device's limit, within these bounds
+MIN_CHUNK = 64 * 1024
+MAX_CHUNK = 8 * MB
+CHUNK_SECONDS = 0.1
+# Allowance saved up while a device is idle, so a new copy can't burst for long
+BURST_SECONDS = 0.5
+
+# ioprio_set/ioprio_get syscall numbers per architecture, and the idle class (<linux/ioprio.h>)
+IOPRIO_SYSCALLS = {"x86_64": (251, 252), "amd64": (251, 252), "i386": (289, 290), "i686": (289, 290),
+                   "aarch64": (30, 31), "arm64": (30, 31), "riscv64": (30, 31), "armv7l": (314, 315)}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+# SetThreadPriority modes that lower a thread's I/O (and memory) priority on Windows
+THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+THREAD_MODE_BACKGROUND_END = 0x00020000
+
+
+class TokenBucket:
+    """Bytes per second allowed onto one device, shared by every copy to it."""
+
+    def __init__(self, rate):
+        self.lock = threading.Lock()
+        self.rate = rate
+        self.tokens = rate * BURST_SECONDS
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.rate * BURST_SECONDS, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.tokens = min(self.tokens, rate * BURST_SECONDS)
+
+    def chunk_size(self):
+        """Bytes to copy per chunk at the current rate."""
+        return int(min(MAX_CHUNK, max(MIN_CHUNK, self.rate * CHUNK_SECONDS)))
+
+    def take(self, amount):
+        """Take allowance for amount bytes, sleeping until the bucket is out of debt.
+
+        Concurrent copies each add their chunk to the debt before waiting,
+        so they share the rate instead of each getting all of it.
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            COPY_THROTTLE_SECONDS.inc(wait)
+            time.sleep(wait)
+
+
+# Current limits: bytes per second for devices without their own, and per st_dev
+_default_rate = 0
+_device_rates = {}
+_buckets = {}
+_buckets_lock = threading.Lock()
+_io_priority = "normal"
+
+
+def configure_copy_limits(settings, logger=None):
+    """Apply the copy bandwidth and I/O priority settings (again on every reload)."""
+    global _default_rate, _device_rates, _io_priority
+    # file_mover imports this module, so its device lookup is imported here
+    from file_mover import get_device
+
+    device_rates = {}
+    for folder, limit in settings.get("device_copy_mb_per_second", {}).items():
+        device = get_device(Path(folder).expanduser())
+        if device is not None:
+            device_rates[device] = float(limit) * MB
+    priority = settings.get("copy_io_priority", "normal")
+    if priority not in IO_PRIORITIES:
+        if logger:
+            logger.warning(f"Unknown copy_io_priority {priority!r} (expected one of {', '.join(IO_PRIORITIES)})")
+        priority = "normal"
+
+    _default_rate = float(settings.get("copy_mb_per_second", 0)) * MB
+    _device_rates = device_rates
+    _io_priority = priority
+    if logger and (_default_rate or any(device_rates.values())):
+        limit = f"{_default_rate / MB:g} MB/s per device" if _default_rate else "no limit by default"
+        logger.info(f"Cross-device copies throttled: {limit}, {len(device_rates)} device-specific limits")
+
+
+def throttle_for(device):
+    """The TokenBucket limiting copies onto device, or None if they are unlimited."""
+    rate = _device_rates.get(device, _default_rate)
+    if not rate:
+        return None
+    bucket = _buckets.get(device)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.setdefault(device, TokenBucket(rate))
+    if bucket.rate != rate:
+        bucket.set_rate(rate)
+    return bucket
+
+
+def next_chunk(device, remaining):
+    """Bytes to copy next onto device, after waiting for its bandwidth allowance."""
+    bucket = throttle_for(device) if device is not None else None
+    if bucket is None:
+        return min(remaining, MAX_CHUNK)
+    amount = min(remaining, bucket.chunk_size())
+    bucket.take(amount)
+    return amount
+
+
+_libc = None
+
+
+def _ioprio_syscall(index, *args):
+    """Call ioprio_set (index 0) or ioprio_get (index 1). Returns -1 where unsupported."""
+    global _libc
+    numbers = IOPRIO_SYSCALLS.get(platform.machine().lower())
+    if numbers is None:
+        return -1
+    if _libc is None:
+        try:
+            _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        except OSError:
+            return -1
+    return _libc.syscall(numbers[index], *args)
+
+
+@contextmanager
+def copy_priority():
+    """Run the enclosed copy at idle I/O priority if copy_io_priority is "idle"."""
+    if _io_priority != "idle":
+        yield
+        return
+
+    if os.name == "nt":
+        kernel32 = ctypes.windll.kernel32
+        lowered = kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_MODE_BACKGROUND_BEGIN)
+        try:
+            yield
+        finally:
+            if lowered:
+                kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_MODE_BACKGROUND_END)
+        return
+
+    # Linux: "process" 0 is the calling thread, so other workers keep their priority
+    previous = _ioprio_syscall(1, IOPRIO_WHO_PROCESS, 0) if os.name == "posix" else -1
+    lowered = previous >= 0 and _ioprio_syscall(0, IOPRIO_WHO_PROCESS, 0,
+                                                IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) == 0
+    try:
+        yield
+    finally:
+        if lowered:
+            _ioprio_syscall(0, IOPRIO_WHO_PROCESS, 0, previous)
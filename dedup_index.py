@@ -0,0 +1,284 @@
+"""
+Duplicate Detection
+Finds files that are already present in their destination folder, so the
+fifth download of the same installer doesn't become installer_4.exe.
+
+Each check stops at the cheapest test that settles it:
+1. size - only files of exactly the same size are candidates (an index lookup)
+2. partial hash - blake2b of the first and last PARTIAL_BLOCK bytes
+3. full hash - streaming blake2b of the whole file
+
+Known files live in a persistent SQLite index next to the logs. A folder is
+listed once (names, sizes and mtimes only) the first time a file heads
+there; after that every move adds its own row, so Pictures or Videos are
+never rescanned. Hashes are computed lazily, only for size collisions, and
+stored. Rows whose file changed or vanished are dropped when they come up.
+"""
+
+import os
+import time
+import errno
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from collections import namedtuple
+
+from file_mover import claim_destination, move_to_claimed, release_destination
+
+DEFAULT_INDEX_PATH = Path.home() / "AppData" / "Local" / "FileOrganizer" / "dedup.db"
+DEFAULT_TRASH_FOLDER = Path.home() / "AppData" / "Local" / "FileOrganizer" / "Trash"
+PARTIAL_BLOCK = 64 * 1024
+HASH_CHUNK = 1024 * 1024
+DEDUP_MODES = ("off", "skip", "hardlink", "trash")
+
+# Outcome of a file that needed no move because its content is already organized:
+# what was done with it ("skip", "hardlink" or "trash" for a duplicate, "done" if
+# the journal has it as moved) and the path of the organized copy
+AlreadyOrganized = namedtuple("AlreadyOrganized", ["action", "path"])
+
+try:
+    from send2trash import send2trash
+except ImportError:
+    send2trash = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    partial BLOB,
+    full BLOB,
+    PRIMARY KEY (folder, name)
+);
+CREATE INDEX IF NOT EXISTS files_size ON files (folder, size);
+CREATE TABLE IF NOT EXISTS folders (
+    folder TEXT PRIMARY KEY,
+    indexed REAL NOT NULL
+);
+"""
+
+
+def partial_hash(file_path, size):
+    """Hash of the size plus the first and last blocks of a file."""
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(file_path, "rb") as f:
+        digest.update(f.read(PARTIAL_BLOCK))
+        if size > PARTIAL_BLOCK:
+            f.seek(max(PARTIAL_BLOCK, size - PARTIAL_BLOCK))
+            digest.update(f.read(PARTIAL_BLOCK))
+    return digest.digest()
+
+
+def full_hash(file_path):
+    """Streaming hash of a whole file."""
+    digest = hashlib.blake2b(digest_size=32)
+    buffer = bytearray(HASH_CHUNK)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.digest()
+
+
+class Fingerprint:
+    """Hashes of one file, computed on demand and kept for the index."""
+
+    __slots__ = ("path", "size", "partial", "full")
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.partial = None
+        self.full = None
+
+    @property
+    def partial_covers_file(self):
+        # The first and last blocks already include every byte
+        return self.size <= 2 * PARTIAL_BLOCK
+
+    def get_partial(self):
+        if self.partial is None:
+            self.partial = partial_hash(self.path, self.size)
+        return self.partial
+
+    def get_full(self):
+        if self.full is None:
+            self.full = full_hash(self.path)
+        return self.full
+
+
+class DedupIndex:
+    """Persistent index of files in destination folders."""
+
+    def __init__(self, db_path=DEFAULT_INDEX_PATH, logger=None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+        self.indexed_folders = {row[0] for row in self.connection.execute("SELECT folder FROM folders")}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def _index_folder(self, folder):
+        """List a folder once so files that were already there are known."""
+        rows = []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            rows.append((folder, entry.name, stat.st_size, stat.st_mtime_ns))
+                    except OSError:
+                        continue
+        except FileNotFoundError:
+            pass
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files (folder, name, size, mtime_ns) VALUES (?, ?, ?, ?)", rows)
+            self.connection.execute("INSERT OR REPLACE INTO folders (folder, indexed) VALUES (?, ?)",
+                                    (folder, time.time()))
+        self.indexed_folders.add(folder)
+        if self.logger:
+            self.logger.info(f"Indexed {len(rows)} existing files in {folder} for duplicate detection")
+
+    def _candidates(self, folder, size):
+        with self.lock:
+            if folder not in self.indexed_folders:
+                self._index_folder(folder)
+            return self.connection.execute(
+                "SELECT name, mtime_ns, partial, full FROM files WHERE folder = ? AND size = ?",
+                (folder, size)).fetchall()
+
+    def _update(self, folder, name, **hashes):
+        with self.lock, self.connection:
+            for column, value in hashes.items():
+                self.connection.execute(f"UPDATE files SET {column} = ? WHERE folder = ? AND name = ?",
+                                        (value, folder, name))
+
+    def _drop(self, folder, name):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM files WHERE folder = ? AND name = ?", (folder, name))
+
+    def find_duplicate(self, dest_folder, source_path, stat_result):
+        """Return (path of an identical file in dest_folder or None, the source's Fingerprint)."""
+        folder = str(dest_folder)
+        fingerprint = Fingerprint(source_path, stat_result.st_size)
+
+        for name, mtime_ns, partial, full in self._candidates(folder, stat_result.st_size):
+            candidate_path = os.path.join(folder, name)
+            try:
+                candidate = os.stat(candidate_path)
+            except OSError:
+                self._drop(folder, name)
+                continue
+            if candidate.st_size != stat_result.st_size or candidate.st_mtime_ns != mtime_ns:
+                # Changed since it was indexed: forget it rather than trust old hashes
+                self._drop(folder, name)
+                continue
+
+            try:
+                if partial is None:
+                    partial = partial_hash(candidate_path, candidate.st_size)
+                    self._update(folder, name, partial=partial)
+                if partial != fingerprint.get_partial():
+                    continue
+                if fingerprint.partial_covers_file:
+                    return Path(candidate_path), fingerprint
+
+                if full is None:
+                    full = full_hash(candidate_path)
+                    self._update(folder, name, full=full)
+                if full == fingerprint.get_full():
+                    return Path(candidate_path), fingerprint
+            except OSError:
+                continue
+        return None, fingerprint
+
+    def add(self, dest_path, fingerprint=None):
+        """Record a file that just arrived in a destination folder."""
+        dest_path = Path(dest_path)
+        folder = str(dest_path.parent)
+        try:
+            stat = os.stat(dest_path)
+        except OSError:
+            return
+        partial = fingerprint.partial if fingerprint is not None else None
+        full = fingerprint.full if fingerprint is not None else None
+        with self.lock:
+            if folder not in self.indexed_folders:
+                # Listing the folder picks this file up too
+                self._index_folder(folder)
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO files (folder, name, size, mtime_ns, partial, full) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (folder, dest_path.name, stat.st_size, stat.st_mtime_ns, partial, full))
+
+
+def resolve_duplicate(mode, source_path, duplicate_path):
+    """Apply the dedup mode to a file whose content already exists as duplicate_path.
+
+    Nothing new is ever created in the destination folder: the file is left
+    where it is ("skip"), replaced by a hardlink to the existing copy
+    ("hardlink") or sent to the trash ("trash"). Returns an AlreadyOrganized
+    outcome naming the action actually taken.
+    """
+    source_path = Path(source_path)
+    if mode == "skip":
+        return AlreadyOrganized("skip", duplicate_path)
+
+    if mode == "hardlink":
+        if os.path.samefile(source_path, duplicate_path):
+            return AlreadyOrganized("hardlink", duplicate_path)  # Linked on an earlier pass
+        # Keep the file at its source as a link to the existing copy, so the data is stored once.
+        # Link under a temporary name and rename it over the source, so a failed link changes nothing
+        temp_path = source_path.with_name(f".{source_path.name}.{os.getpid()}-{threading.get_ident()}.link")
+        try:
+            os.link(duplicate_path, temp_path)
+        except OSError as e:
+            if e.errno in (errno.EPERM, errno.EXDEV, errno.EMLINK, errno.ENOTSUP):
+                # Filesystem without hardlinks (e.g. FAT), or another drive: fall back to trashing
+                return resolve_duplicate("trash", source_path, duplicate_path)
+            raise
+        try:
+            os.replace(temp_path, source_path)
+        except OSError:
+            release_destination(temp_path)
+            raise
+        return AlreadyOrganized("hardlink", duplicate_path)
+
+    if mode == "trash":
+        if send2trash is not None:
+            send2trash(str(source_path))
+        else:
+            # No recycle bin support installed: keep the file in the organizer's own trash
+            DEFAULT_TRASH_FOLDER.mkdir(parents=True, exist_ok=True)
+            trash_path = claim_destination(DEFAULT_TRASH_FOLDER, source_path.name)
+            try:
+                move_to_claimed(source_path, trash_path)
+            except OSError:
+                release_destination(trash_path)
+                raise
+        return AlreadyOrganized("trash", duplicate_path)
+
+    raise ValueError(f"Unknown dedup mode: {mode!r} (expected one of {', '.join(DEDUP_MODES)})")
+
+
+def open_dedup_index(settings, logger=None):
+    """Open the duplicate index if dedup_mode is enabled, else return None."""
+    if settings.get("dedup_mode", "off") == "off":
+        return None
+    return DedupIndex(Path(settings.get("dedup_index_path", DEFAULT_INDEX_PATH)).expanduser(), logger)
@@ -0,0 +1,135 @@
+"""
+Download Settler
+Holds newly detected files until they have finished downloading.
+
+A file is considered complete once its size and modification time have not
+changed for the configured quiet period, or as soon as the watcher reports
+that the writer closed it. Partial-download names (.crdownload, .part, ...)
+are never tracked; the browser renames them to the final name when done,
+which shows up as a new file.
+"""
+
+import os
+import time
+import threading
+
+# Suffixes browsers and download managers use for files still being written
+DEFAULT_TEMP_SUFFIXES = (
+    ".crdownload",
+    ".part",
+    ".partial",
+    ".tmp",
+    ".download",
+    ".opdownload",
+)
+
+DEFAULT_SETTLE_SECONDS = 2
+
+# After the writer closes a file it only has to stay unchanged this long,
+# in case the same program reopens it to append the next chunk
+CLOSE_GRACE_SECONDS = 0.5
+
+
+class DownloadSettler:
+    """Track new files and release them once they stop growing."""
+
+    def __init__(self, quiet_period=DEFAULT_SETTLE_SECONDS, temp_suffixes=DEFAULT_TEMP_SUFFIXES):
+        self.quiet_period = quiet_period
+        self.temp_suffixes = tuple(suffix.lower() for suffix in temp_suffixes)
+        # path -> [size, mtime_ns, time of last observed change, time first seen]
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def configure(self, settings):
+        """Apply settle options from a settings dict."""
+        self.quiet_period = settings.get("settle_seconds", DEFAULT_SETTLE_SECONDS)
+        self.temp_suffixes = tuple(
+            suffix.lower() for suffix in settings.get("temp_suffixes", DEFAULT_TEMP_SUFFIXES)
+        )
+
+    def is_temporary(self, file_name):
+        """Return True for partial-download names that should be ignored."""
+        return file_name.lower().endswith(self.temp_suffixes)
+
+    def track(self, file_path):
+        """Start (or keep) watching a file. Returns False if it was ignored."""
+        file_path = str(file_path)
+        if self.is_temporary(os.path.basename(file_path)):
+            return False
+
+        with self.lock:
+            if file_path not in self.pending:
+                now = time.monotonic()
+                self.pending[file_path] = [-1, -1, now, now]
+        return True
+
+    def mark_closed(self, file_path):
+        """The writer closed a tracked file, so shorten its quiet period to the close grace.
+
+        Files that are not being tracked are left alone: closing a file that
+        was already in the folder doesn't make it a new download.
+        """
+        file_path = str(file_path)
+        with self.lock:
+            entry = self.pending.get(file_path)
+            if entry is None:
+                return
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                return
+            entry[0] = stat.st_size
+            entry[1] = stat.st_mtime_ns
+            entry[2] = time.monotonic() - max(0, self.quiet_period - CLOSE_GRACE_SECONDS)
+
+    def forget(self, file_path):
+        """Stop tracking a file (deleted or renamed away)."""
+        with self.lock:
+            self.pending.pop(str(file_path), None)
+
+    def pop_ready(self, with_times=False):
+        """Return files that have been stable for the quiet period and stop tracking them.
+
+        With with_times=True, returns (path, monotonic time first seen) pairs.
+        """
+        ready = []
+        now = time.monotonic()
+
+        with self.lock:
+            for file_path, entry in list(self.pending.items()):
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    # Gone (renamed or deleted) before it settled
+                    del self.pending[file_path]
+                    continue
+
+                if stat.st_size != entry[0] or stat.st_mtime_ns != entry[1]:
+                    # Still being written, restart the quiet period
+                    entry[0] = stat.st_size
+                    entry[1] = stat.st_mtime_ns
+                    entry[2] = now
+                    continue
+
+                if now - entry[2] >= self.quiet_period:
+                    del self.pending[file_path]
+                    ready.append((file_path, entry[3]) if with_times else file_path)
+
+        return ready
+
+    def next_timeout(self, default):
+        """Seconds until the next settle check is due (default when idle)."""
+        with self.lock:
+            if not self.pending:
+                return default
+        return min(default, max(0.1, min(self.quiet_period, CLOSE_GRACE_SECONDS) / 2))
+
+    def __len__(self):
+        return len(self.pending)
+
+
+def create_settler(settings):
+    """Create a DownloadSettler configured from a settings dict."""
+    settler = DownloadSettler()
+    settler.configure(settings)
+    return settler
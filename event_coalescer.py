@@ -0,0 +1,100 @@
+"""
+Event Coalescer
+Folds the raw file system events for each path into one logical event.
+
+A browser finishing a download produces a burst for a single file: created,
+dozens of modified, closed, then a rename from the temporary name to the
+final one. Watcher callbacks only record the latest state of each path in
+a dict; a path is released once no event has arrived for it for the
+coalescing window, as a single ("changed" | "closed" | "gone", path, new)
+triple, where new says whether the burst created the file (or renamed it
+into place) rather than only wrote to a file that was already there.
+A rename moves the pending state to the new name, so a download renamed
+within the window is released once, under its final name (its temporary
+name only as "gone").
+"""
+
+import time
+import threading
+
+DEFAULT_COALESCE_SECONDS = 0.3
+
+CHANGED = "changed"
+CLOSED = "closed"
+GONE = "gone"
+
+
+class EventCoalescer:
+    """Per-path debounce of raw watcher events."""
+
+    def __init__(self, window=DEFAULT_COALESCE_SECONDS):
+        self.window = window
+        # path -> [state, monotonic time of the last event, created in this burst]
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def _record(self, path, state, now, new=False):
+        entry = self.pending.get(path)
+        if entry is None:
+            self.pending[path] = [state, now, new]
+            return
+        # A write reported after the close doesn't hide it (the settler still checks the size holds)
+        if not (state == CHANGED and entry[0] == CLOSED):
+            entry[0] = state
+        entry[1] = now
+        entry[2] = entry[2] or new
+
+    def created(self, path):
+        """A file was created."""
+        with self.lock:
+            self._record(str(path), CHANGED, time.monotonic(), new=True)
+
+    def changed(self, path):
+        """A file was written to."""
+        with self.lock:
+            self._record(str(path), CHANGED, time.monotonic())
+
+    def closed(self, path):
+        """The writer closed a file."""
+        with self.lock:
+            self._record(str(path), CLOSED, time.monotonic())
+
+    def gone(self, path):
+        """A file was deleted or renamed away."""
+        with self.lock:
+            self._record(str(path), GONE, time.monotonic())
+
+    def moved(self, src_path, dest_path):
+        """A file was renamed; dest_path inherits what was known about src_path.
+
+        dest_path may be None when the file left the watched folders.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.pending.get(str(src_path))
+            # Reported as gone in case something downstream already tracks the old name
+            self.pending[str(src_path)] = [GONE, now, False]
+            if dest_path is not None:
+                state = entry[0] if entry is not None and entry[0] != GONE else CHANGED
+                self._record(str(dest_path), state, now, new=True)
+
+    def drain(self, now=None):
+        """Return (state, path, new) for every path quiet for the window, oldest first, and forget them."""
+        now = time.monotonic() if now is None else now
+        released = []
+        with self.lock:
+            for path, (state, last_event, new) in list(self.pending.items()):
+                if now - last_event >= self.window:
+                    del self.pending[path]
+                    released.append((last_event, state, path, new))
+        released.sort()
+        return [(state, path, new) for _, state, path, new in released]
+
+    def discard(self, paths):
+        """Drop pending events for paths that were just handed over (echoes of the move itself)."""
+        with self.lock:
+            for path in paths:
+                self.pending.pop(str(path), None)
+
+    def __len__(self):
+        return len(self.pending)
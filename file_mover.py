@@ -0,0 +1,358 @@
+"""
+File Mover
+Shared helpers used by the monitors to place files in their destination folder.
+
+Moves within one filesystem are a single atomic os.replace. Only when the
+destination folder lives on another device (st_dev differs) is the data
+copied, using the kernel copy paths where available, and the source removed
+afterwards. Copies run in chunks paced by the destination device's
+bandwidth limit (see copy_throttle.py).
+"""
+
+import os
+import re
+import time
+import errno
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+
+from copy_throttle import next_chunk, copy_priority
+
+# Buffer size for the user-space copy fallback
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# st_dev per destination folder, so the device check costs one stat per folder
+_device_cache = {}
+
+# Destination folders already known to exist, so each is checked or created once
+_ensured_folders = set()
+_folders_lock = threading.Lock()
+
+# How each file was moved, for reporting
+move_stats = {"rename": 0, "copy": 0, "bytes_copied": 0, "folder_syscalls_saved": 0}
+_stats_lock = threading.Lock()
+
+
+def get_device(folder):
+    """Return st_dev of a folder (or its nearest existing parent), cached per folder."""
+    key = str(folder)
+    device = _device_cache.get(key)
+    if device is None:
+        path = Path(folder)
+        for candidate in (path, *path.parents):
+            try:
+                device = os.stat(candidate).st_dev
+                break
+            except OSError:
+                continue
+        if device is not None:
+            _device_cache[key] = device
+    return device
+
+
+def forget_device(folder):
+    """Drop a cached st_dev (e.g. after a drive was remounted)."""
+    _device_cache.pop(str(folder), None)
+
+
+def ensure_folder(folder, create=True):
+    """Make sure a destination folder exists, touching the disk only the first time.
+
+    Returns "cached" or "exists" if it was already there, "created" if it had
+    to be made, and None if it is missing and create is False.
+    """
+    key = str(folder)
+    if key in _ensured_folders:
+        with _stats_lock:
+            move_stats["folder_syscalls_saved"] += 1
+        return "cached"
+
+    if os.path.isdir(key):
+        result = "exists"
+    elif create:
+        Path(key).mkdir(parents=True, exist_ok=True)
+        result = "created"
+    else:
+        return None
+    with _folders_lock:
+        _ensured_folders.add(key)
+    return result
+
+
+def forget_folder(folder):
+    """Drop cached knowledge of a folder (and its subfolders) after it disappeared."""
+    key = str(folder)
+    prefix = os.path.join(key, "")
+    with _folders_lock:
+        gone = [f for f in _ensured_folders if f == key or f.startswith(prefix)]
+        _ensured_folders.difference_update(gone)
+    for cached in set(gone) | {key}:
+        destination_namer.forget(cached)
+        forget_device(cached)
+
+
+def get_move_stats():
+    """Return a copy of the rename/copy counters."""
+    with _stats_lock:
+        return dict(move_stats)
+
+
+def _record_move(method, bytes_copied=0):
+    with _stats_lock:
+        move_stats[method] += 1
+        move_stats["bytes_copied"] += bytes_copied
+
+
+def _try_create(path):
+    """Atomically create an empty placeholder. Returns False if the name is taken."""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    os.close(fd)
+    return True
+
+
+class DestinationNamer:
+    """Pick collision-free destination names without probing name_1, name_2, ...
+
+    For every destination folder it keeps an index of taken names, built
+    lazily with one os.scandir and updated on every claim, and per name the
+    last counter it issued. Counters are checked against the index in memory,
+    so names already in the folder are skipped without a syscall; a numeric
+    tail on an existing name (report_20241017.pdf) is never taken for a
+    counter. The final claim is still an O_EXCL create, so a stale index can
+    only cost an extra attempt, never an overwrite.
+    """
+
+    def __init__(self):
+        # folder -> {(stem, ext): [name taken, last counter issued for it]}
+        self.folders = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(stem, ext):
+        # Windows file names are case-insensitive
+        return (os.path.normcase(stem), os.path.normcase(ext))
+
+    def _note(self, index, file_name):
+        """Record a taken name in a folder index."""
+        stem, ext = os.path.splitext(file_name)
+        index.setdefault(self._key(stem, ext), [False, 0])[0] = True
+
+    def _index_for(self, folder):
+        index = self.folders.get(folder)
+        if index is None:
+            index = {}
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        self._note(index, entry.name)
+            except FileNotFoundError:
+                pass
+            self.folders[folder] = index
+        return index
+
+    def _create(self, path):
+        """Take a name on disk (see _try_create); planners override this to stay in memory."""
+        return _try_create(path)
+
+    def forget(self, folder):
+        """Drop a folder's index so it is rebuilt on the next claim."""
+        with self.lock:
+            self.folders.pop(str(folder), None)
+
+    def _claim_with_counter(self, folder, index, stem, ext, try_plain=True):
+        """Claim stem.ext if free, otherwise the first free stem_N.ext past the last N issued."""
+        entry = index.setdefault(self._key(stem, ext), [False, 0])
+
+        # The plain name may have been freed since the folder was indexed
+        if try_plain and self._create(os.path.join(folder, stem + ext)):
+            entry[0] = True
+            return stem + ext
+        entry[0] = True
+
+        while True:
+            entry[1] += 1
+            candidate = index.get(self._key(f"{stem}_{entry[1]}", ext))
+            if candidate is not None and candidate[0]:
+                continue
+            name = f"{stem}_{entry[1]}{ext}"
+            created = self._create(os.path.join(folder, name))
+            self._note(index, name)
+            if created:
+                return name
+
+    def claim(self, dest_folder, file_name, handle_duplicates=True, strategy="counter", source_path=None):
+        """Reserve a free path in dest_folder for file_name and return it (or None)."""
+        folder = str(dest_folder)
+
+        with self.lock:
+            index = self._index_for(folder)
+
+            created = self._create(os.path.join(folder, file_name))
+            self._note(index, file_name)
+            if created:
+                return Path(folder) / file_name
+            if not handle_duplicates:
+                return None
+
+            stem, ext = os.path.splitext(file_name)
+            if strategy == "timestamp":
+                name = self._claim_with_counter(folder, index, f"{stem}_{time.strftime('%Y%m%d-%H%M%S')}", ext)
+            elif strategy == "hash":
+                name = self._claim_with_counter(folder, index, f"{stem}_{_identity_hash(source_path or file_name)}", ext)
+            else:
+                name = self._claim_with_counter(folder, index, stem, ext, try_plain=False)
+            return Path(folder) / name
+
+
+def claimed_name_pattern(file_name):
+    """Regex that matches file_name and every name DestinationNamer.claim can give it instead.
+
+    Those are name_<N>.ext, name_<YYYYmmdd-HHMMSS>[_<N>].ext and
+    name_<8 hex digits>[_<N>].ext, for the three duplicate_naming strategies.
+    """
+    stem, ext = os.path.splitext(file_name)
+    suffix = r"(?:_(?:\d+|(?:\d{8}-\d{6}|[0-9a-f]{8})(?:_\d+)?))?"
+    return re.compile(re.escape(stem) + suffix + re.escape(ext), re.IGNORECASE if os.name == "nt" else 0)
+
+
+def _identity_hash(source_path):
+    """Short hash of a file's identity (name, size, mtime, inode) without reading it."""
+    try:
+        stat = os.stat(source_path)
+        identity = f"{source_path}|{stat.st_size}|{stat.st_mtime_ns}|{stat.st_ino}"
+    except OSError:
+        identity = f"{source_path}|{time.time_ns()}"
+    return hashlib.blake2b(identity.encode("utf-8", "surrogateescape"), digest_size=4).hexdigest()
+
+
+# Shared by every move in the process
+destination_namer = DestinationNamer()
+
+
+def claim_destination(dest_folder, file_name, handle_duplicates=True, strategy="counter", source_path=None,
+                      create_folder=False):
+    """Reserve a free destination path by creating an empty placeholder.
+
+    The placeholder is created with O_EXCL, so two moves running in parallel
+    can never pick the same name. Returns None if the name is taken and
+    duplicates are not handled. strategy picks the conflict suffix:
+    "counter" (name_1), "timestamp" (name_20240101-120000) or "hash" (name_1a2b3c4d).
+    If the folder turns out to be gone, the caches are dropped and, with
+    create_folder, it is recreated and the claim retried once.
+    """
+    try:
+        return destination_namer.claim(dest_folder, file_name, handle_duplicates, strategy, source_path)
+    except FileNotFoundError:
+        forget_folder(dest_folder)
+        if not create_folder:
+            raise
+    ensure_folder(dest_folder)
+    return destination_namer.claim(dest_folder, file_name, handle_duplicates, strategy, source_path)
+
+
+def release_destination(dest_path):
+    """Remove the placeholder (or partial copy) left behind by a failed move."""
+    try:
+        os.remove(dest_path)
+    except OSError:
+        pass
+
+
+def _copy_fd(src_fd, dst_fd, size, buffer_size, device=None):
+    """Copy size bytes between file descriptors, fastest method first.
+
+    Data goes in chunks; before each one the copy waits for the bandwidth
+    allowance of the destination device (if it has a limit).
+    """
+    copied = 0
+
+    # In-kernel copy (Linux): no data passes through user space,
+    # and filesystems that support it can share extents
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                sent = os.copy_file_range(src_fd, dst_fd, next_chunk(device, size - copied))
+                if sent == 0:
+                    break
+                copied += sent
+            return copied
+        except OSError as e:
+            if copied or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+
+    # sendfile between regular files (Linux)
+    if hasattr(os, "sendfile") and os.name == "posix":
+        try:
+            while copied < size:
+                sent = os.sendfile(dst_fd, src_fd, copied, next_chunk(device, size - copied))
+                if sent == 0:
+                    break
+                copied += sent
+            return copied
+        except OSError as e:
+            if copied or e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+
+    # Plain read/write with a large reusable buffer
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(src_fd, "rb", buffering=0, closefd=False) as src:
+        while copied < size:
+            # Charged for the bytes left to copy, not the whole buffer
+            read = src.readinto(view[:next_chunk(device, min(size - copied, buffer_size))])
+            if not read:
+                break
+            chunk = view[:read]
+            while chunk:
+                written = os.write(dst_fd, chunk)
+                chunk = chunk[written:]
+            copied += read
+    return copied
+
+
+def copy_file_data(source_path, dest_path, fsync=False, buffer_size=COPY_BUFFER_SIZE):
+    """Copy a file's contents and metadata to dest_path. Returns bytes copied."""
+    device = get_device(Path(dest_path).parent)
+    with copy_priority(), open(source_path, "rb") as src, open(dest_path, "wb") as dst:
+        size = os.fstat(src.fileno()).st_size
+        copied = _copy_fd(src.fileno(), dst.fileno(), size, buffer_size, device)
+        if fsync:
+            os.fsync(dst.fileno())
+    shutil.copystat(source_path, dest_path)
+    return copied
+
+
+def move_to_claimed(source_path, dest_path, fsync=False):
+    """Move a file over the placeholder reserved by claim_destination.
+
+    Returns "rename" when the file stayed on the same filesystem and "copy"
+    when its data had to be copied to another device.
+    """
+    dest_folder = Path(dest_path).parent
+    source_device = os.stat(source_path).st_dev
+
+    if source_device == get_device(dest_folder):
+        try:
+            # Same filesystem: atomic rename over the placeholder
+            os.replace(source_path, dest_path)
+            _record_move("rename")
+            return "rename"
+        except OSError as e:
+            if e.errno == errno.ENOENT and not dest_folder.is_dir():
+                # The destination folder was deleted after it was cached
+                forget_folder(dest_folder)
+            if e.errno != errno.EXDEV:
+                raise
+            # Cached device was stale (folder is now a different mount)
+            forget_device(dest_folder)
+
+    # Different filesystem: copy the data across, then remove the source
+    copied = copy_file_data(source_path, dest_path, fsync)
+    os.remove(source_path)
+    _record_move("copy", copied)
+    return "copy"
@@ -99,4 +99,26 @@ FILE_EXTENSIONS = {
 }
 
 # Default folder for unknown file types
-DEFAULT_FOLDER = 'Downloads/Others'
\ No newline at end of file
+DEFAULT_FOLDER = 'Downloads/Others'
+
+# Seconds a new file's size must stay unchanged before it is moved
+SETTLE_SECONDS = 2
+
+# Partial-download names that are never moved (they get renamed when complete)
+TEMP_SUFFIXES = ['.crdownload', '.part', '.partial', '.tmp', '.download', '.opdownload']
+
+# Seconds a file must go without new events before its burst of events is handled as one
+COALESCE_SECONDS = 0.3
+
+# Number of background threads moving files
+MOVE_WORKERS = 4
+
+# Maximum simultaneous copies onto one destination drive (same-drive renames are not limited)
+COPIES_PER_DEVICE = 1
+
+# Also organize files dropped into subfolders of Downloads (e.g. extracted archives)
+RECURSIVE = False
+
+# Folder levels below Downloads to follow, and folder names (globs) that are never followed
+RECURSIVE_MAX_DEPTH = 3
+RECURSIVE_EXCLUDE = ['.git', 'node_modules', '__pycache__']
@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import json
 from pathlib import Path
+from folder_monitor_json import write_json_atomic
 
 class FileOrganizerGUI:
     """GUI for managing file organization rules."""
@@ -17,6 +18,7 @@ class FileOrganizerGUI:
         
         # Data storage
         self.file_extensions = {}
+        self.rules = []
         self.settings = {}
         
         # Create GUI
@@ -151,6 +153,7 @@ class FileOrganizerGUI:
                     if isinstance(extensions, dict) and not category.startswith("_"):
                         self.file_extensions.update(extensions)
                 
+                self.rules = config.get("rules", [])
                 self.settings = config.get("settings", {})
                 self.status_var.set(f"Loaded {len(self.file_extensions)} rules from {self.config_file}")
             else:
@@ -177,6 +180,7 @@ class FileOrganizerGUI:
             "create_folders": True,
             "case_sensitive": False
         }
+        self.rules = []
         self.status_var.set("Created default configuration")
     
     def refresh_rules_display(self):
@@ -292,6 +296,10 @@ class FileOrganizerGUI:
                 "settings": self.settings
             }
             
+            # Ordered rules are not edited here, but must survive a save
+            if self.rules:
+                organized_config["rules"] = self.rules
+            
             # Group extensions by destination for better organization
             destinations = {}
             for ext, dest in self.file_extensions.items():
@@ -316,8 +324,8 @@ class FileOrganizerGUI:
                 category = category_names.get(dest, dest.replace("/", "_").lower())
                 organized_config["file_extensions"][category] = {ext: dest for ext in extensions}
             
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(organized_config, f, indent=2, ensure_ascii=False)
+            # Temp file + rename: a running monitor never reads a half-written file
+            write_json_atomic(self.config_file, organized_config)
             
             messagebox.showinfo("Success", f"Configuration saved to {self.config_file}")
             self.status_var.set(f"Saved {len(self.file_extensions)} rules to {self.config_file}")
@@ -351,6 +359,7 @@ class FileOrganizerGUI:
                 if messagebox.askyesno("Import Configuration", 
                                      f"Import {len(imported_extensions)} rules?\nThis will replace current rules."):
                     self.file_extensions = imported_extensions
+                    self.rules = config.get("rules", self.rules)
                     self.settings.update(config.get("settings", {}))
                     self.refresh_rules_display()
                     self.status_var.set(f"Imported {len(imported_extensions)} rules from {file_path}")
@@ -374,9 +383,10 @@ class FileOrganizerGUI:
                     },
                     "settings": self.settings
                 }
+                if self.rules:
+                    config["rules"] = self.rules
                 
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(config, f, indent=2, ensure_ascii=False)
+                write_json_atomic(file_path, config)
                 
                 messagebox.showinfo("Success", f"Configuration exported to {file_path}")
                 self.status_var.set(f"Exported configuration to {file_path}")
@@ -3,10 +3,10 @@ File Organizer Service
 A Windows service wrapper for the file organization monitor.
 """
 
-import os
 import sys
 import time
-import logging
+import asyncio
+import functools
 from pathlib import Path
 import win32serviceutil
 import win32service
@@ -17,7 +17,11 @@ import servicemanager
 script_dir = Path(__file__).parent.absolute()
 sys.path.insert(0, str(script_dir))
 
-from folder_monitor_json import monitor_downloads_folder, FileOrganizerConfig
+from folder_monitor_json import FileOrganizerConfig, move_file
+from monitor_core import MonitorCore
+from organizer_logging import setup_logging
+from dedup_index import AlreadyOrganized
+from organizer_metrics import DETECTION_LATENCY
 
 class FileOrganizerService(win32serviceutil.ServiceFramework):
     """Windows service for file organization monitoring."""
@@ -30,27 +34,16 @@ class FileOrganizerService(win32serviceutil.ServiceFramework):
         win32serviceutil.ServiceFramework.__init__(self, args)
         self.hWaitStop = win32event.CreateEvent(None, 0, 0, None)
         self.is_alive = True
+        self.core = None
         
         # Setup logging
         self.setup_logging()
         
     def setup_logging(self):
         """Setup logging for the service."""
-        log_dir = Path.home() / "AppData" / "Local" / "FileOrganizer"
-        log_dir.mkdir(parents=True, exist_ok=True)
-        
-        log_file = log_dir / "service.log"
-        
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file),
-                logging.StreamHandler()
-            ]
-        )
-        
-        self.logger = logging.getLogger(__name__)
+        # Queue-based pipeline: log calls never block on file I/O
+        log_file = Path.home() / "AppData" / "Local" / "FileOrganizer" / "service.log"
+        self.logger = setup_logging("FileOrganizerService", log_file)
     
     def SvcStop(self):
         """Stop the service."""
@@ -58,6 +51,8 @@ class FileOrganizerService(win32serviceutil.ServiceFramework):
         self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
         win32event.SetEvent(self.hWaitStop)
         self.is_alive = False
+        if self.core is not None:
+            self.core.stop()
     
     def SvcDoRun(self):
         """Main service execution."""
@@ -79,126 +74,35 @@ class FileOrganizerService(win32serviceutil.ServiceFramework):
             )
     
     def main_loop(self):
-        """Main monitoring loop."""
+        """Run the monitor core until the service is stopped."""
         # Load configuration
         config = FileOrganizerConfig()
-        
-        # Get the Downloads folder path
-        downloads_path = Path.home() / "Downloads"
-        
-        if not downloads_path.exists():
-            self.logger.error(f"Downloads folder not found: {downloads_path}")
-            return
-        
-        self.logger.info(f"Monitoring Downloads folder: {downloads_path}")
         self.logger.info(f"Loaded {len(config.file_extensions)} file organization rules")
         
-        # Get initial set of files
-        previous_files = set()
-        try:
-            previous_files = set(os.listdir(downloads_path))
-        except OSError as e:
-            self.logger.error(f"Error accessing Downloads folder: {e}")
+        # Same event loop as the command-line monitor; the service keeps to polling
+        # The monitor's own move_file, logging to the service log
+        mover = functools.partial(move_file, logger=self.logger)
+        self.core = MonitorCore(config, self.logger, mover, self.report_move,
+                                reconcile=config.settings.get("reconcile_on_start", False), backend="polling")
+        if not self.is_alive or not self.core.open():
             return
         
-        last_config_check = time.time()
-        config_check_interval = 5  # Check for config changes every 5 seconds
-        
-        while self.is_alive:
-            try:
-                # Check if service should stop
-                if win32event.WaitForSingleObject(self.hWaitStop, 0) == win32event.WAIT_OBJECT_0:
-                    break
-                
-                check_interval = config.settings.get('check_interval_seconds', 1)
-                time.sleep(check_interval)
-                
-                # Check if config file has been modified
-                current_time = time.time()
-                if current_time - last_config_check > config_check_interval:
-                    if config.config_file.exists():
-                        file_mtime = config.config_file.stat().st_mtime
-                        if file_mtime > last_config_check:
-                            self.logger.info("Reloading configuration...")
-                            config.reload_config()
-                    last_config_check = current_time
-                
-                # Get current files
-                current_files = set(os.listdir(downloads_path))
-                
-                # Find new files
-                new_files = current_files - previous_files
-                
-                # Process new files
-                for file_name in new_files:
-                    file_path = downloads_path / file_name
-                    if file_path.is_file():  # Only process actual files
-                        self.logger.info(f"New file detected: {file_name}")
-                        
-                        # Move file to appropriate folder
-                        moved_path = self.move_file(downloads_path, file_name, config)
-                        if moved_path:
-                            relative_path = moved_path.relative_to(Path.home())
-                            self.logger.info(f"Moved to: ~/{relative_path}")
-                        else:
-                            self.logger.warning(f"Failed to move file: {file_name}")
-                
-                # Update previous files set
-                previous_files = current_files
-                
-            except OSError as e:
-                self.logger.error(f"Error checking folder: {e}")
-                time.sleep(5)  # Wait longer if there's an error
-            except Exception as e:
-                self.logger.error(f"Unexpected error: {e}")
-                time.sleep(1)
-        
+        # SvcStop ends run() at once, even in the middle of a polling interval
+        asyncio.run(self.core.run())
         self.logger.info("File Organizer Service stopped")
     
-    def move_file(self, source_path, file_name, config):
-        """Move file to appropriate folder based on extension and configuration."""
-        import shutil
-        
-        file_path = Path(source_path) / file_name
-        file_extension = file_path.suffix
-        
-        # Skip if no extension
-        if not file_extension:
-            self.logger.debug(f"Skipping {file_name} (no extension)")
-            return None
-        
-        # Get destination folder from config
-        dest_folder = config.get_destination_folder(file_extension)
-        
-        # Create destination folder if enabled in settings
-        if config.settings.get("create_folders", True):
-            dest_folder.mkdir(parents=True, exist_ok=True)
-        elif not dest_folder.exists():
-            self.logger.warning(f"Destination folder doesn't exist: {dest_folder}")
-            return None
-        
-        # Destination file path
-        dest_path = dest_folder / file_name
-        
-        # Handle file name conflicts if enabled
-        if config.settings.get("handle_duplicates", True):
-            counter = 1
-            original_dest_path = dest_path
-            while dest_path.exists():
-                name_part = original_dest_path.stem
-                ext_part = original_dest_path.suffix
-                dest_path = dest_folder / f"{name_part}_{counter}{ext_part}"
-                counter += 1
-        elif dest_path.exists():
-            self.logger.warning(f"File already exists: {dest_path}")
-            return None
-        
-        try:
-            shutil.move(str(file_path), str(dest_path))
-            return dest_path
-        except Exception as e:
-            self.logger.error(f"Error moving file {file_name}: {e}")
-            return None
+    def report_move(self, file_name, detected_at):
+        """Build the callback that logs the outcome of one move."""
+        def on_done(moved_path):
+            if isinstance(moved_path, AlreadyOrganized):
+                self.logger.info(f"Already organized: {file_name} ({moved_path.action})")
+            elif moved_path:
+                DETECTION_LATENCY.observe(time.monotonic() - detected_at)
+                relative_path = moved_path.relative_to(Path.home())
+                self.logger.info(f"Moved to: ~/{relative_path}")
+            else:
+                self.logger.warning(f"Failed to move file: {file_name}")
+        return on_done
 
 if __name__ == '__main__':
     if len(sys.argv) == 1:
@@ -1,10 +1,14 @@
 import os
 import time
-import shutil
 from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from file_organizer_config import FILE_EXTENSIONS, DEFAULT_FOLDER
+from file_organizer_config import (FILE_EXTENSIONS, DEFAULT_FOLDER, SETTLE_SECONDS, TEMP_SUFFIXES,
+                                   COALESCE_SECONDS, RECURSIVE, RECURSIVE_MAX_DEPTH, RECURSIVE_EXCLUDE)
+from download_settler import DownloadSettler
+from event_coalescer import EventCoalescer, CLOSED, GONE
+from file_mover import claim_destination, move_to_claimed, release_destination, ensure_folder
+from folder_tree import TreeFilter
 
 def get_destination_folder(file_extension):
     """Get the destination folder for a file based on its extension."""
@@ -27,43 +31,106 @@ def move_file(source_path, file_name):
         return None
     
     dest_folder = get_destination_folder(file_extension)
-    dest_folder.mkdir(parents=True, exist_ok=True)
-    
-    dest_path = dest_folder / file_name
-    
-    # Handle file name conflicts
-    counter = 1
-    original_dest_path = dest_path
-    while dest_path.exists():
-        name_part = original_dest_path.stem
-        ext_part = original_dest_path.suffix
-        dest_path = dest_folder / f"{name_part}_{counter}{ext_part}"
-        counter += 1
+    dest_path = None
     
     try:
-        shutil.move(str(file_path), str(dest_path))
+        ensure_folder(dest_folder)
+        # Reserve a free destination name, then rename (same drive) or copy (other drive)
+        dest_path = claim_destination(dest_folder, file_name, create_folder=True)
+        move_to_claimed(file_path, dest_path)
         return dest_path
     except Exception as e:
         print(f"  → Error moving file {file_name}: {e}")
+        if dest_path is not None:
+            release_destination(dest_path)
         return None
 
+def move_ready_files(ready_paths):
+    """Move a batch of files that have finished downloading."""
+    for src_path in ready_paths:
+        file_name = os.path.basename(src_path)
+        print(f"📄 New file detected: {file_name}")
+        
+        # Move file to appropriate folder
+        moved_path = move_file(src_path, file_name)
+        if moved_path:
+            relative_path = moved_path.relative_to(Path.home())
+            print(f"  ✅ Moved to: ~/{relative_path}")
+        else:
+            print(f"  ❌ Failed to move file")
+
 class NewFileHandler(FileSystemEventHandler):
-    """Handler for file system events that monitors for new files."""
+    """Handler for file system events that monitors for new files.
+    
+    Watchdog callbacks only record events in an EventCoalescer; each file's
+    burst (created, modified..., closed, renamed) reaches the settler as one
+    update once it has been quiet for the coalescing window, and files that
+    finished downloading are handed to on_ready in one batch per check.
+    Only files created in (or renamed into) the folder are tracked; writing
+    to a file that was already there doesn't make it a new download.
+    
+    With a TreeFilter (recursive mode), files in subfolders it doesn't follow
+    (too deep, excluded, or a destination folder) are ignored.
+    """
+    
+    def __init__(self, root=None, tree=None, on_ready=move_ready_files, window=COALESCE_SECONDS):
+        super().__init__()
+        self.coalescer = EventCoalescer(window)
+        # New files wait here until they have finished downloading
+        self.settler = DownloadSettler(SETTLE_SECONDS, TEMP_SUFFIXES)
+        self.root = str(root) if root else None
+        self.tree = tree
+        self.on_ready = on_ready
+    
+    def wanted(self, path):
+        """True if a file at path is in a watched folder."""
+        return self.tree is None or self.tree.covers(self.root, os.path.dirname(path))
     
     def on_created(self, event):
         """Called when a file or directory is created."""
+        if not event.is_directory and self.wanted(event.src_path):
+            self.coalescer.created(event.src_path)
+    
+    def on_modified(self, event):
+        """Called when a file is written to."""
+        if not event.is_directory and self.wanted(event.src_path):
+            self.coalescer.changed(event.src_path)
+    
+    def on_closed(self, event):
+        """Called when a file opened for writing is closed."""
+        if not event.is_directory and self.wanted(event.src_path):
+            self.coalescer.closed(event.src_path)
+    
+    def on_moved(self, event):
+        """Called when a file is renamed (e.g. a .crdownload getting its final name)."""
         if not event.is_directory:
-            file_name = os.path.basename(event.src_path)
-            print(f"📄 New file detected: {file_name}")
-            
-            # Move file to appropriate folder
-            downloads_path = Path(event.src_path).parent
-            moved_path = move_file(event.src_path, file_name)
-            if moved_path:
-                relative_path = moved_path.relative_to(Path.home())
-                print(f"  ✅ Moved to: ~/{relative_path}")
-            else:
-                print(f"  ❌ Failed to move file")
+            self.coalescer.moved(event.src_path, event.dest_path if self.wanted(event.dest_path) else None)
+    
+    def on_deleted(self, event):
+        """Called when a file is deleted."""
+        if not event.is_directory:
+            self.coalescer.gone(event.src_path)
+    
+    def settle_events(self):
+        """Pass each file's coalesced event on to the settler."""
+        for state, path, new in self.coalescer.drain():
+            if state == GONE:
+                self.settler.forget(path)
+                continue
+            # Only new files are tracked; writes to files already here only update tracked ones
+            if new:
+                self.settler.track(path)
+            if state == CLOSED:
+                self.settler.mark_closed(path)
+    
+    def process_ready_files(self):
+        """Hand files that have stopped growing to on_ready, one batch per call."""
+        self.settle_events()
+        ready_paths = self.settler.pop_ready()
+        if ready_paths:
+            self.on_ready(ready_paths)
+            # Events the moves themselves caused are not new files
+            self.coalescer.discard(ready_paths)
 
 def monitor_downloads_folder():
     """Monitor the Downloads folder for new files."""
@@ -80,17 +147,23 @@ def monitor_downloads_folder():
     print("📦 Files will be automatically organized by type.")
     print("🚀 Press Ctrl+C to stop monitoring...")
     
-    # Create event handler and observer
-    event_handler = NewFileHandler()
+    # Create event handler and observer (destination folders inside Downloads are never followed)
+    tree = None
+    if RECURSIVE:
+        destinations = {Path.home() / folder for folder in FILE_EXTENSIONS.values()}
+        destinations.add(Path.home() / DEFAULT_FOLDER)
+        tree = TreeFilter(RECURSIVE_MAX_DEPTH, RECURSIVE_EXCLUDE, destinations)
+    event_handler = NewFileHandler(downloads_path, tree)
     observer = Observer()
-    observer.schedule(event_handler, str(downloads_path), recursive=False)
+    observer.schedule(event_handler, str(downloads_path), recursive=RECURSIVE)
     
     # Start monitoring
     observer.start()
     
     try:
         while True:
-            time.sleep(1)
+            time.sleep(0.5)
+            event_handler.process_ready_files()
     except KeyboardInterrupt:
         print("\nStopping file monitor...")
         observer.stop()
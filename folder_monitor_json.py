@@ -1,212 +1,624 @@
 import os
+import re
 import time
-import shutil
 import json
-import logging
+import asyncio
+import argparse
+import tempfile
+import threading
 from pathlib import Path
 from datetime import datetime
+from types import MappingProxyType
+from rule_engine import RuleEngine
+from organizer_logging import setup_logging, apply_log_settings
+from folder_watchers import create_watcher, PollingWatcher
+from folder_tree import TreeFilter, DEFAULT_MAX_DEPTH, DEFAULT_EXCLUDES
+from file_mover import (claim_destination, move_to_claimed, release_destination, get_move_stats,
+                        ensure_folder)
+from content_sniffer import create_sniffer, matches_extension
+from dedup_index import resolve_duplicate, AlreadyOrganized
+from organizer_metrics import (FILES_MOVED, FILES_FAILED, BYTES_COPIED, DETECTION_LATENCY, MOVE_DURATION,
+                               CONFIG_RELOADS, FILES_DEDUPLICATED, category_for)
 
-class FileOrganizerConfig:
-    """Handle loading and managing file organization configuration from JSON."""
+DEFAULT_FILE_EXTENSIONS = {
+    ".pdf": "Documents",
+    ".jpg": "Pictures",
+    ".mp3": "Music",
+    ".mp4": "Videos",
+    ".zip": "Downloads/Archives"
+}
+
+DEFAULT_SETTINGS = {
+    "default_folder": "Downloads/Others",
+    "check_interval_seconds": 1,
+    "max_check_interval_seconds": 10,
+    "handle_duplicates": True,
+    "duplicate_naming": "counter",
+    "create_folders": True,
+    "case_sensitive": False,
+    "watcher_backend": "auto",
+    "settle_seconds": 2,
+    "temp_suffixes": [".crdownload", ".part", ".partial", ".tmp", ".download", ".opdownload"],
+    "move_workers": 4,
+    "move_queue_size": 1000,
+    "copies_per_device": 1,
+    "stop_drain_seconds": 10,
+    "fsync_copies": False,
+    "copy_mb_per_second": 0,
+    "device_copy_mb_per_second": {},
+    "copy_io_priority": "normal",
+    "structured_move_logs": False,
+    "reconcile_files_per_second": 100,
+    "journal_enabled": True,
+    "journal_retention_days": 30,
+    "metrics_port": 0,
+    "content_sniffing": "extensionless",
+    "sniff_cache_size": 4096,
+    "dedup_mode": "off",
+    "sources": ["~/Downloads"],
+    "recursive": False,
+    "recursive_max_depth": DEFAULT_MAX_DEPTH,
+    "recursive_exclude": list(DEFAULT_EXCLUDES)
+}
+
+# Copy of the last configuration that loaded cleanly, used if file_rules.json is broken at startup
+LAST_GOOD_CONFIG = Path.home() / "AppData" / "Local" / "FileOrganizer" / "file_rules.last_good.json"
+
+def write_json_atomic(file_path, data):
+    """Write JSON to a temporary file and rename it over file_path.
     
-    def __init__(self, config_file="file_rules.json"):
-        self.config_file = Path(config_file)
-        self.file_extensions = {}
-        self.settings = {}
-        self.logger = self.setup_logging()
-        self.load_config()
+    Readers see either the old or the new file, never a half-written one.
+    """
+    file_path = Path(file_path)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{file_path.name}.", suffix=".tmp", dir=file_path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def file_identity(file_path):
+    """(inode, size, mtime) of a file, or None if it doesn't exist."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def freeze(value):
+    """Recursively turn dicts into read-only mappings and lists into tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def flatten_extensions(file_extensions):
+    """Flatten the nested category -> {extension: folder} structure (flat maps pass through)."""
+    flat = {}
+    for key, value in file_extensions.items():
+        if isinstance(value, (dict, MappingProxyType)):
+            if not key.startswith("_"):
+                flat.update(value)
+        elif not key.startswith("_"):
+            flat[key] = value
+    return flat
+
+class SourceFolder:
+    """One watched folder and the rules that apply to files found in it.
     
-    def setup_logging(self):
-        """Setup logging for the file organizer."""
-        # Create log directory
-        log_dir = Path.home() / "AppData" / "Local" / "FileOrganizer"
-        log_dir.mkdir(parents=True, exist_ok=True)
+    A source given as a plain path uses the global rules. A source given as
+    an object can add "rules" (checked before the global ones), override
+    "file_extensions" and set its own "default_folder":
+    
+        {"path": "~/Desktop", "rules": [...], "file_extensions": {".png": "Pictures/Desktop"},
+         "default_folder": "Desktop/Others"}
+    
+    "recursive", "max_depth" and "exclude" override the global recursive
+    settings for this source. Destination folders inside a recursive source
+    are never watched.
+    """
+    
+    __slots__ = ("path", "key", "rule_engine", "default_path", "tree_filter")
+    
+    def __init__(self, spec, snapshot):
+        if isinstance(spec, str):
+            spec = {"path": spec}
+        self.path = Path(spec["path"]).expanduser().absolute()
+        self.key = os.path.normcase(str(self.path))
         
-        # Setup logger
-        logger = logging.getLogger('FileOrganizer')
-        logger.setLevel(logging.INFO)
+        rules = spec.get("rules", ())
+        overrides = flatten_extensions(spec.get("file_extensions", {}))
+        if rules or overrides:
+            # Only sources with overrides pay for a rule engine of their own
+            file_extensions = dict(snapshot.file_extensions)
+            file_extensions.update(overrides)
+            self.rule_engine = RuleEngine(list(rules) + list(snapshot.rules), file_extensions,
+                                          snapshot.settings.get("case_sensitive", False))
+        else:
+            self.rule_engine = snapshot.rule_engine
         
-        # Clear existing handlers
-        logger.handlers.clear()
+        default_folder = spec.get("default_folder")
+        self.default_path = Path.home() / default_folder if default_folder else snapshot.default_path
         
-        # File handler with rotation
-        log_file = log_dir / "file_organizer.log"
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setLevel(logging.INFO)
+        settings = snapshot.settings
+        if spec.get("recursive", settings.get("recursive", False)):
+            destinations = {rule.dest_path for rule in self.rule_engine.rules}
+            destinations.add(self.default_path)
+            self.tree_filter = TreeFilter(
+                spec.get("max_depth", settings.get("recursive_max_depth", DEFAULT_MAX_DEPTH)),
+                spec.get("exclude", settings.get("recursive_exclude", DEFAULT_EXCLUDES)),
+                destinations)
+        else:
+            self.tree_filter = None
+
+class ConfigSnapshot:
+    """One immutable, precompiled version of the configuration.
+    
+    Snapshots are never changed after they are built. A reload builds a new
+    snapshot and swaps it in with a single assignment, so a move that picked
+    up a snapshot keeps seeing one consistent set of rules and settings.
+    """
+    
+    __slots__ = ("file_extensions", "rules", "settings", "rule_engine", "extension_paths", "default_path",
+                 "sources", "source_index", "file_id", "raw")
+    
+    def __init__(self, file_extensions, rules, settings, file_id=None, raw=None):
+        set_attr = object.__setattr__
+        set_attr(self, "file_extensions", freeze(file_extensions))
+        set_attr(self, "rules", freeze(list(rules)))
+        set_attr(self, "settings", freeze(settings))
+        # Compile ordered rules plus the extension map into one matcher
+        set_attr(self, "rule_engine", RuleEngine(self.rules, self.file_extensions,
+                                                 self.settings.get("case_sensitive", False)))
+        # Destination paths resolved once per snapshot instead of once per file
+        home = Path.home()
+        case_sensitive = self.settings.get("case_sensitive", False)
+        set_attr(self, "extension_paths", MappingProxyType({
+            ext if case_sensitive else ext.lower(): home / folder for ext, folder in self.file_extensions.items()
+        }))
+        set_attr(self, "default_path", home / self.settings.get("default_folder", "Downloads/Others"))
+        # Watched folders, each with its own rules compiled into this same snapshot
+        sources = tuple(SourceFolder(spec, self) for spec in self.settings.get("sources", DEFAULT_SETTINGS["sources"]))
+        set_attr(self, "sources", sources)
+        set_attr(self, "source_index", MappingProxyType({source.key: source for source in sources}))
+        set_attr(self, "file_id", file_id)
+        set_attr(self, "raw", raw)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigSnapshot is immutable")
+    
+    @classmethod
+    def default(cls):
+        return cls(DEFAULT_FILE_EXTENSIONS, [], DEFAULT_SETTINGS)
+    
+    @classmethod
+    def from_file(cls, config_file):
+        """Parse and compile a configuration file. Raises OSError or ValueError."""
+        with open(config_file, 'r', encoding='utf-8') as f:
+            stat = os.fstat(f.fileno())
+            raw = f.read()
+        config = json.loads(raw)
+        if not isinstance(config, dict):
+            raise ValueError("top level must be a JSON object")
         
-        # Console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
+        # Flatten the nested file_extensions structure
+        file_extensions = flatten_extensions(config.get("file_extensions", {}))
         
-        # Formatter
-        formatter = logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
+        rules = config.get("rules", [])
+        settings = config.get("settings", {})
+        if not isinstance(rules, list) or not isinstance(settings, dict):
+            raise ValueError("'rules' must be a list and 'settings' an object")
         
-        file_handler.setFormatter(formatter)
-        console_handler.setFormatter(formatter)
+        try:
+            return cls(file_extensions, rules, settings, (stat.st_ino, stat.st_size, stat.st_mtime_ns), raw)
+        except (KeyError, TypeError, AttributeError, re.error) as e:
+            raise ValueError(f"invalid rule or source: {e}") from e
+    
+    def source_for(self, folder):
+        """The SourceFolder a folder belongs to (itself or, if recursive, a parent), or None."""
+        source = self.source_index.get(os.path.normcase(str(folder)))
+        if source is None:
+            for parent in Path(folder).parents:
+                source = self.source_index.get(os.path.normcase(str(parent)))
+                if source is not None:
+                    return source if source.tree_filter is not None else None
+        return source
+    
+    def get_destination_folder(self, file_extension):
+        """Get the destination folder for a file based on its extension."""
+        # Handle case sensitivity setting
+        ext_key = file_extension.lower() if not self.settings.get("case_sensitive", False) else file_extension
+        return self.extension_paths.get(ext_key, self.default_path)
+    
+    def get_destination_for_file(self, file_path, stat_result=None, sniffer=None):
+        """Get the destination folder for a file using the compiled rules.
         
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
+        With a sniffer, files without an extension are classified by their
+        content (and, with content_sniffing "all", so are files whose content
+        contradicts their extension). Returns None for files without an
+        extension that nothing matched.
+        """
+        return self.classify(file_path, stat_result, sniffer)[0]
+    
+    def classify(self, file_path, stat_result=None, sniffer=None):
+        """Like get_destination_for_file, but returns (destination folder, name of the rule that matched).
         
-        return logger
+        The rule name is "default" for files that went to the default folder.
+        """
+        file_path = Path(file_path)
+        name = file_path.name
+        mode = self.settings.get("content_sniffing", "extensionless") if sniffer is not None else "off"
+        if mode == "all" or (mode == "extensionless" and not file_path.suffix):
+            detected = sniffer.sniff(file_path, stat_result)
+            if detected and not matches_extension(file_path.suffix, detected):
+                # Classify as if the file carried the extension its content says
+                name = (file_path.stem if file_path.suffix else name) + detected
+        
+        # Files in a watched source use that source's rules
+        source = self.source_for(file_path.parent)
+        rule_engine = source.rule_engine if source is not None else self.rule_engine
+        rule = rule_engine.match(name, file_path.parent, stat_result, file_path.stat)
+        if rule:
+            return rule.dest_path, rule.name
+        if not Path(name).suffix:
+            return None, None
+        return (source.default_path if source is not None else self.default_path), "default"
+
+class FileOrganizerConfig:
+    """Handle loading and managing file organization configuration from JSON.
+    
+    The current configuration is an immutable ConfigSnapshot; the attributes
+    below read from whichever snapshot is current.
+    """
+    
+    def __init__(self, config_file="file_rules.json"):
+        self.config_file = Path(config_file)
+        self.snapshot = None
+        self.logger = self.setup_logging()
+        self.load_config()
+        # Shared across reloads so its cache of sniffed headers survives
+        self.sniffer = create_sniffer(self.settings)
+    
+    @property
+    def file_extensions(self):
+        return self.snapshot.file_extensions
+    
+    @property
+    def rules(self):
+        return self.snapshot.rules
+    
+    @property
+    def settings(self):
+        return self.snapshot.settings
+    
+    @property
+    def rule_engine(self):
+        return self.snapshot.rule_engine
+    
+    def setup_logging(self):
+        """Setup logging for the file organizer."""
+        # Queue-based pipeline: log calls never block on file I/O
+        log_file = Path.home() / "AppData" / "Local" / "FileOrganizer" / "file_organizer.log"
+        return setup_logging('FileOrganizer', log_file)
     
     def load_config(self):
-        """Load configuration from JSON file."""
-        if not self.config_file.exists():
+        """Load configuration from JSON file. Returns True if a new snapshot was swapped in.
+        
+        A missing or broken file never replaces a working configuration; at
+        startup the last configuration that loaded cleanly is used instead.
+        """
+        try:
+            snapshot = ConfigSnapshot.from_file(self.config_file)
+        except FileNotFoundError:
             self.logger.warning(f"Configuration file not found: {self.config_file}")
-            self.logger.info("Creating default configuration file...")
-            self.create_default_config()
-            return
+            if self.snapshot is None:
+                self.create_default_config()
+            return False
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Error loading config {self.config_file}: {e}")
+            if self.snapshot is None:
+                self.load_last_good_config()
+            else:
+                self.logger.warning("Keeping the previous configuration until the file is fixed")
+            return False
+        
+        # Swap in the new snapshot (a single reference assignment)
+        self.snapshot = snapshot
+        apply_log_settings(self.logger, snapshot.settings)
+        self.save_last_good_config(snapshot)
         
+        self.logger.info(f"Configuration loaded successfully from {self.config_file}")
+        self.logger.info(f"Monitoring {len(snapshot.file_extensions)} file types")
+        if snapshot.rules:
+            self.logger.info(f"Loaded {len(snapshot.rules)} ordered rules")
+        return True
+    
+    def save_last_good_config(self, snapshot):
+        """Keep a copy of a configuration that loaded cleanly."""
         try:
-            with open(self.config_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-            
-            # Flatten the nested file_extensions structure
-            self.file_extensions = {}
-            for category, extensions in config.get("file_extensions", {}).items():
-                if isinstance(extensions, dict) and not category.startswith("_"):
-                    self.file_extensions.update(extensions)
-            
-            self.settings = config.get("settings", {})
-            
-            self.logger.info(f"Configuration loaded successfully from {self.config_file}")
-            self.logger.info(f"Monitoring {len(self.file_extensions)} file types")
-            
-        except json.JSONDecodeError as e:
-            self.logger.error(f"Error parsing JSON config: {e}")
-            self.logger.info("Using default configuration...")
-            self.create_default_config()
-        except Exception as e:
-            self.logger.error(f"Error loading config: {e}")
-            self.logger.info("Using default configuration...")
+            if LAST_GOOD_CONFIG.exists() and LAST_GOOD_CONFIG.read_text(encoding='utf-8') == snapshot.raw:
+                return
+            LAST_GOOD_CONFIG.parent.mkdir(parents=True, exist_ok=True)
+            write_json_atomic(LAST_GOOD_CONFIG, json.loads(snapshot.raw))
+        except (OSError, ValueError) as e:
+            self.logger.debug(f"Could not save last good configuration: {e}")
+    
+    def load_last_good_config(self):
+        """Use the last configuration that loaded cleanly, or the defaults if there is none."""
+        try:
+            self.snapshot = ConfigSnapshot.from_file(LAST_GOOD_CONFIG)
+            apply_log_settings(self.logger, self.snapshot.settings)
+            self.logger.warning(f"Using the last good configuration from {LAST_GOOD_CONFIG}")
+        except (OSError, ValueError):
+            self.logger.info("No previous configuration available, using default configuration...")
             self.create_default_config()
     
     def create_default_config(self):
         """Create a default configuration."""
-        self.file_extensions = {
-            ".pdf": "Documents",
-            ".jpg": "Pictures",
-            ".mp3": "Music",
-            ".mp4": "Videos",
-            ".zip": "Downloads/Archives"
-        }
-        self.settings = {
-            "default_folder": "Downloads/Others",
-            "check_interval_seconds": 1,
-            "handle_duplicates": True,
-            "create_folders": True,
-            "case_sensitive": False
-        }
+        self.snapshot = ConfigSnapshot.default()
         self.logger.info("Created default configuration")
     
     def get_destination_folder(self, file_extension):
         """Get the destination folder for a file based on its extension."""
-        # Handle case sensitivity setting
-        ext_key = file_extension.lower() if not self.settings.get("case_sensitive", False) else file_extension
-        
-        folder_name = self.file_extensions.get(ext_key)
-        if folder_name:
-            return Path.home() / folder_name
-        else:
-            default_folder = self.settings.get("default_folder", "Downloads/Others")
-            return Path.home() / default_folder
+        return self.snapshot.get_destination_folder(file_extension)
+    
+    def get_destination_for_file(self, file_path, stat_result=None, sniffer=None):
+        """Get the destination folder for a file using the compiled rules."""
+        return self.snapshot.get_destination_for_file(file_path, stat_result, sniffer)
     
     def reload_config(self):
-        """Reload configuration from file."""
+        """Reload configuration from file. Returns True if it changed."""
         self.logger.info("Reloading configuration...")
         old_count = len(self.file_extensions)
-        self.load_config()
+        if not self.load_config():
+            CONFIG_RELOADS.inc(result="error")
+            return False
+        CONFIG_RELOADS.inc(result="ok")
         new_count = len(self.file_extensions)
         if new_count != old_count:
             self.logger.info(f"Configuration updated: {old_count} → {new_count} file types")
+        return True
 
-def move_file(source_path, file_name, config):
-    """Move file to appropriate folder based on extension and configuration."""
-    logger = config.logger
+class ConfigWatcher:
+    """Reloads the configuration as soon as file_rules.json changes.
+    
+    Watches the folder holding the file with the same backends as the
+    Downloads monitor, so edits apply within milliseconds. Where only polling
+    is available the file itself is stat'ed every poll_interval seconds (a
+    directory listing would miss in-place edits).
+    """
+    
+    # Editors often write a file in several steps; wait for this much quiet
+    DEBOUNCE_SECONDS = 0.05
+    
+    def __init__(self, config, on_reload=None, poll_interval=0.5):
+        self.config = config
+        self.on_reload = on_reload
+        self.poll_interval = poll_interval
+        self.logger = config.logger
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last_seen = file_identity(config.config_file)
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="ConfigWatcher", daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+    
+    def _open_watcher(self, folder):
+        watcher = create_watcher(folder, self.config.settings)
+        if isinstance(watcher, PollingWatcher):
+            return None
+        try:
+            watcher.start()
+        except OSError as e:
+            self.logger.warning(f"Could not watch {folder} for config changes ({e}), polling instead")
+            return None
+        return watcher
+    
+    def run(self):
+        config_file = self.config.config_file.resolve()
+        watcher = self._open_watcher(config_file.parent)
+        
+        try:
+            while not self.stop_event.is_set():
+                if watcher is None:
+                    self.stop_event.wait(self.poll_interval)
+                else:
+                    events = watcher.read_events(timeout=self.poll_interval)
+                    if not any(event.name == config_file.name for event in events):
+                        continue
+                    # Let the writer finish before reading
+                    while watcher.read_events(timeout=self.DEBOUNCE_SECONDS):
+                        pass
+                
+                current = file_identity(config_file)
+                if current is None or current == self.last_seen:
+                    continue
+                self.last_seen = current
+                
+                self.logger.info("Configuration file modified, reloading...")
+                if self.config.reload_config() and self.on_reload is not None:
+                    try:
+                        self.on_reload(self.config.snapshot)
+                    except Exception as e:
+                        self.logger.error(f"Error applying reloaded configuration: {e}")
+        finally:
+            if watcher is not None:
+                watcher.close()
+
+def move_file(source_path, file_name, config, journal=None, dedup=None, logger=None):
+    """Move file to appropriate folder based on extension and configuration.
+    
+    Progress goes to logger (the config's logger by default).
+    
+    With a journal, the move is recorded before it starts and marked done
+    afterwards, so an interrupted move can be finished or rolled back on restart.
+    With a dedup index, a file whose content is already in the destination
+    folder is skipped, hardlinked or trashed according to "dedup_mode", and
+    an AlreadyOrganized outcome is returned instead of a destination path.
+    """
+    logger = logger or config.logger
     file_path = Path(source_path) / file_name
+    
+    # Use one configuration snapshot for the whole move, even if a reload happens meanwhile
+    snapshot = config.snapshot
+    settings = snapshot.settings
     file_extension = file_path.suffix
     
-    # Skip if no extension
-    if not file_extension:
+    # Get destination folder and the rule that chose it (sniffing the content if needed;
+    # this runs on a worker thread, so reading the header never delays detection)
+    dest_folder, rule = snapshot.classify(file_path, sniffer=config.sniffer)
+    
+    # Skip if no extension (and neither a rule nor the content identified it)
+    if dest_folder is None:
         logger.debug(f"Skipping {file_name} (no extension)")
         return None
     
-    # Get destination folder from config
-    dest_folder = config.get_destination_folder(file_extension)
+    # One structured line per move instead of the step-by-step messages
+    structured = settings.get("structured_move_logs", False)
     
     # Log the intended move
-    logger.info(f"Processing file: {file_name} ({file_extension}) → {dest_folder.name}")
-    
-    # Create destination folder if enabled in settings
-    if config.settings.get("create_folders", True):
-        if not dest_folder.exists():
-            logger.info(f"Creating destination folder: {dest_folder}")
-            dest_folder.mkdir(parents=True, exist_ok=True)
-            logger.info(f"Created folder: {dest_folder}")
-    elif not dest_folder.exists():
+    if not structured:
+        logger.info(f"Processing file: {file_name} ({file_extension}) → {dest_folder.name}")
+    
+    # Create destination folder if enabled in settings (checked once per folder)
+    create_folders = settings.get("create_folders", True)
+    folder_state = ensure_folder(dest_folder, create_folders)
+    if folder_state == "created":
+        logger.info(f"Created folder: {dest_folder}")
+    elif folder_state is None:
         logger.error(f"Destination folder doesn't exist: {dest_folder}")
+        FILES_FAILED.inc(category=category_for(dest_folder))
         return None
     
-    # Destination file path
-    dest_path = dest_folder / file_name
-    original_dest_path = dest_path
-    
-    # Handle file name conflicts if enabled
-    if config.settings.get("handle_duplicates", True):
-        counter = 1
-        while dest_path.exists():
-            name_part = original_dest_path.stem
-            ext_part = original_dest_path.suffix
-            new_name = f"{name_part}_{counter}{ext_part}"
-            dest_path = dest_folder / new_name
-            counter += 1
-            
-        if dest_path != original_dest_path:
-            logger.info(f"File renamed to avoid conflict: {file_name} → {dest_path.name}")
-            
-    elif dest_path.exists():
-        logger.warning(f"File already exists, skipping: {dest_path}")
+    # Get file size for logging (the stat also identifies the file in the journal)
+    try:
+        file_stat = file_path.stat()
+    except OSError as e:
+        logger.error(f"❌ File not found when moving {file_name}: {e}")
         return None
+    file_size = file_stat.st_size
+    file_size_mb = file_size / (1024 * 1024)
+    
+    done_path = journal.already_done(file_path, file_stat) if journal is not None else None
+    if done_path is not None:
+        logger.info(f"Skipping {file_name}: already organized (journal)")
+        return AlreadyOrganized("done", done_path)
     
-    # Get file size for logging
+    # Look for the same content in the destination (size, then partial hash, then full hash)
+    dedup_mode = settings.get("dedup_mode", "off")
+    fingerprint = None
+    if dedup is not None and dedup_mode != "off":
+        try:
+            duplicate, fingerprint = dedup.find_duplicate(dest_folder, file_path, file_stat)
+            if duplicate is not None:
+                result = resolve_duplicate(dedup_mode, file_path, duplicate)
+                FILES_DEDUPLICATED.inc(action=result.action)
+                logger.info(f"♻️ Duplicate of {duplicate.name}: {file_name} ({result.action})")
+                return result
+        except OSError as e:
+            logger.warning(f"Duplicate check failed for {file_name}, moving normally: {e}")
+    
+    # Journal the destination before claiming it, so a crash can't leave an untracked placeholder
+    move_id = None
+    if journal is not None:
+        try:
+            move_id = journal.reserve(file_path, dest_folder / file_name, file_stat, rule)
+        except Exception as e:
+            logger.error(f"❌ Could not journal the move of {file_name}, leaving it in place: {e}")
+            FILES_FAILED.inc(category=category_for(dest_folder))
+            return None
+    
+    # Reserve a free destination name (safe with parallel moves)
     try:
-        file_size = file_path.stat().st_size
-        file_size_mb = file_size / (1024 * 1024)
-    except:
-        file_size_mb = 0
+        dest_path = claim_destination(dest_folder, file_name, settings.get("handle_duplicates", True),
+                                      settings.get("duplicate_naming", "counter"), file_path, create_folders)
+    except FileNotFoundError:
+        logger.error(f"Destination folder doesn't exist: {dest_folder}")
+        if move_id is not None:
+            journal.abort(move_id)
+        FILES_FAILED.inc(category=category_for(dest_folder))
+        return None
+    if dest_path is None:
+        logger.warning(f"File already exists, skipping: {dest_folder / file_name}")
+        if move_id is not None:
+            journal.abort(move_id)
+        return None
+    
+    if dest_path.name != file_name and not structured:
+        logger.info(f"File renamed to avoid conflict: {file_name} → {dest_path.name}")
     
     # Attempt to move the file
+    method = None
     try:
+        if move_id is not None:
+            journal.begin(move_id, dest_path)
         start_time = time.time()
-        shutil.move(str(file_path), str(dest_path))
+        method = move_to_claimed(file_path, dest_path, settings.get("fsync_copies", False))
         move_time = time.time() - start_time
-        
-        logger.info(f"✅ FILE MOVED: {file_name} → {dest_path}")
-        logger.info(f"   Size: {file_size_mb:.2f} MB, Time: {move_time:.2f}s")
-        
-        return dest_path
-        
     except PermissionError as e:
         logger.error(f"❌ Permission denied moving {file_name}: {e}")
-        return None
     except FileNotFoundError as e:
         logger.error(f"❌ File not found when moving {file_name}: {e}")
-        return None
     except Exception as e:
         logger.error(f"❌ Error moving file {file_name}: {e}")
+    
+    if method is None:
+        # The move itself failed: the source is untouched, drop the placeholder
+        release_destination(dest_path)
+        if move_id is not None:
+            journal.abort(move_id)
+        FILES_FAILED.inc(category=category_for(dest_folder))
         return None
+    
+    # The file is in place now; a failure recording it must never undo the move
+    try:
+        if move_id is not None:
+            journal.finish(move_id, method)
+        if dedup is not None and dedup_mode != "off":
+            dedup.add(dest_path, fingerprint)
+        
+        category = category_for(dest_folder)
+        FILES_MOVED.inc(category=category, method=method)
+        MOVE_DURATION.observe(move_time, method=method)
+        if method == "copy":
+            BYTES_COPIED.inc(file_size)
+        
+        if structured:
+            logger.info(json.dumps({
+                "event": "move", "file": file_name, "source": str(file_path), "dest": str(dest_path),
+                "bytes": file_size, "method": method, "ms": round(move_time * 1000, 2)
+            }, ensure_ascii=False))
+        else:
+            logger.info(f"✅ FILE MOVED: {file_name} → {dest_path}")
+            logger.info(f"   Size: {file_size_mb:.2f} MB, Time: {move_time:.2f}s, Method: {method}")
+    except Exception as e:
+        logger.error(f"⚠️ {file_name} was moved to {dest_path}, but recording the move failed: {e}")
+    
+    return dest_path
 
 def print_organization_rules(config):
     """Print the current file organization rules from config."""
+    snapshot = config.snapshot
     print("\n📋 File Organization Rules (from JSON config):")
     print("=" * 60)
     
     # Group extensions by destination folder
     folder_groups = {}
-    for ext, folder in config.file_extensions.items():
+    for ext, folder in snapshot.file_extensions.items():
         if folder not in folder_groups:
             folder_groups[folder] = []
         folder_groups[folder].append(ext)
@@ -215,19 +627,68 @@ def print_organization_rules(config):
         print(f"📁 {folder}:")
         print(f"   {', '.join(sorted(extensions))}")
     
-    default_folder = config.settings.get("default_folder", "Downloads/Others")
+    if snapshot.rules:
+        print("\n🔀 Ordered rules (checked before extensions, first match wins):")
+        for rule in snapshot.rule_engine.rules[:len(snapshot.rules)]:
+            print(f"   {rule.index + 1}. {rule.name} → {rule.destination}")
+    
+    default_folder = snapshot.settings.get("default_folder", "Downloads/Others")
     print(f"📁 {default_folder}:")
     print("   All other file types")
+    
+    print("\n📥 Watched folders:")
+    for source in snapshot.sources:
+        overrides = " (with its own rules)" if source.rule_engine is not snapshot.rule_engine else ""
+        print(f"   {source.path}{overrides}")
     print("=" * 60)
     
     # Print settings
     print("\n⚙️  Settings:")
-    for key, value in config.settings.items():
-        print(f"   {key}: {value}")
+    for key, value in snapshot.settings.items():
+        if key != "sources":
+            print(f"   {key}: {value}")
     print("=" * 60)
 
-def monitor_downloads_folder():
-    """Monitor the Downloads folder for new files and organize them using JSON config."""
+def watched_folders(snapshot, logger):
+    """The configured sources that exist, as {path: TreeFilter or None (not recursive)}.
+    
+    Missing folders are logged and skipped.
+    """
+    folders = {}
+    for source in snapshot.sources:
+        if source.path.is_dir():
+            folders[source.path] = source.tree_filter
+        else:
+            logger.warning(f"Source folder not found, not watching it: {source.path}")
+    return folders
+
+def sync_watched_folders(watcher, folders, snapshot, logger):
+    """Add and remove watches after the sources changed. Returns the new {path: TreeFilter}.
+    
+    Runs on the monitor core's watcher executor, the same single thread that
+    reads the watcher's events, so no read is in progress meanwhile.
+    """
+    wanted = watched_folders(snapshot, logger)
+    for folder, tree in folders.items():
+        if folder not in wanted or wanted[folder] != tree:
+            watcher.remove_folder(folder)
+            logger.info(f"Stopped watching {folder}")
+    for folder, tree in list(wanted.items()):
+        if folder not in folders or folders[folder] != tree:
+            try:
+                watcher.add_folder(folder, tree)
+                logger.info(f"Now watching {folder}{' recursively' if tree else ''}")
+            except OSError as e:
+                logger.error(f"Could not watch {folder}: {e}")
+                del wanted[folder]
+    return wanted
+
+def monitor_downloads_folder(reconcile=False):
+    """Monitor the Downloads folder (and any other configured sources) and organize new files.
+    
+    All sources share one watcher, one configuration snapshot and one worker
+    pool. With reconcile=True, files already in them at startup are organized too.
+    """
     # Load configuration
     config = FileOrganizerConfig()
     logger = config.logger
@@ -239,84 +700,41 @@ def monitor_downloads_folder():
     logger.info(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info("="*60)
     
-    # Get the Downloads folder path
-    downloads_path = Path.home() / "Downloads"
-    
-    # Check if Downloads folder exists
-    if not downloads_path.exists():
-        logger.error(f"Downloads folder not found at: {downloads_path}")
-        logger.error("Please make sure the Downloads folder exists.")
-        return
-    
-    logger.info(f"Monitoring Downloads folder: {downloads_path}")
-    logger.info("Files will be automatically organized based on JSON rules.")
-    logger.info("Edit 'file_rules.json' to customize organization rules.")
-    
     # Show organization rules
     print_organization_rules(config)
     
-    print(f"\n🚀 Starting monitor (checking every {config.settings.get('check_interval_seconds', 1)}s)...")
-    print("Press Ctrl+C to stop, or modify file_rules.json to update rules.")
+    def report_move(file_name, detected_at):
+        """Build the callback that reports the outcome of one move."""
+        def on_done(moved_path):
+            if isinstance(moved_path, AlreadyOrganized):
+                relative_path = moved_path.path.relative_to(Path.home())
+                print(f"  ♻️ Already in ~/{relative_path} ({moved_path.action})")
+            elif moved_path:
+                DETECTION_LATENCY.observe(time.monotonic() - detected_at)
+                relative_path = moved_path.relative_to(Path.home())
+                print(f"  ✅ Moved to: ~/{relative_path}")
+                if not config.settings.get("structured_move_logs", False):
+                    logger.info(f"File successfully organized: {file_name} → ~/{relative_path}")
+            else:
+                print(f"  ❌ Failed to move file")
+                logger.error(f"Failed to organize file: {file_name}")
+        return on_done
     
-    # Get initial set of files
-    previous_files = set()
-    try:
-        previous_files = set(os.listdir(downloads_path))
-        logger.info(f"Initial scan found {len(previous_files)} files in Downloads folder")
-    except OSError as e:
-        logger.error(f"Error accessing Downloads folder: {e}")
+    # Watcher, settler, journal, worker pool and config reloads all run on one event loop
+    from monitor_core import MonitorCore
+    core = MonitorCore(config, logger, move_file, report_move,
+                       on_reload=lambda snapshot: print_organization_rules(config), reconcile=reconcile)
+    if not core.open():
         return
+    logger.info("Files will be automatically organized based on JSON rules.")
+    logger.info("Edit 'file_rules.json' to customize organization rules.")
     
-    last_config_check = time.time()
-    config_check_interval = 5  # Check for config changes every 5 seconds
+    print(f"\n🚀 Starting monitor ({core.watcher.name} backend)...")
+    print("Press Ctrl+C to stop, or modify file_rules.json to update rules.")
     
     try:
-        while True:
-            check_interval = config.settings.get('check_interval_seconds', 1)
-            time.sleep(check_interval)
-            
-            # Check if config file has been modified
-            current_time = time.time()
-            if current_time - last_config_check > config_check_interval:
-                if config.config_file.exists():
-                    file_mtime = config.config_file.stat().st_mtime
-                    if file_mtime > last_config_check:
-                        logger.info("Configuration file modified, reloading...")
-                        config.reload_config()
-                        print_organization_rules(config)
-                last_config_check = current_time
-            
-            try:
-                # Get current files
-                current_files = set(os.listdir(downloads_path))
-                
-                # Find new files
-                new_files = current_files - previous_files
-                
-                # Process new files
-                for file_name in new_files:
-                    file_path = downloads_path / file_name
-                    if file_path.is_file():  # Only process actual files, not directories
-                        logger.info(f"📄 NEW FILE DETECTED: {file_name}")
-                        
-                        # Move file to appropriate folder
-                        moved_path = move_file(downloads_path, file_name, config)
-                        if moved_path:
-                            relative_path = moved_path.relative_to(Path.home())
-                            print(f"  ✅ Moved to: ~/{relative_path}")
-                            logger.info(f"File successfully organized: {file_name} → ~/{relative_path}")
-                        else:
-                            print(f"  ❌ Failed to move file")
-                            logger.error(f"Failed to organize file: {file_name}")
-                
-                # Update previous files set
-                previous_files = current_files
-                
-            except OSError as e:
-                logger.error(f"Error checking folder: {e}")
-                print(f"❌ Error checking folder: {e}")
-                time.sleep(5)  # Wait longer if there's an error
-                
+        asyncio.run(core.run(handle_signals=True))
+        print("\n\n🛑 Stopping file monitor...")
     except KeyboardInterrupt:
         logger.info("File monitor stopped by user (Ctrl+C)")
         print("\n\n🛑 Stopping file monitor...")
@@ -324,9 +742,17 @@ def monitor_downloads_folder():
         logger.error(f"Unexpected error in monitor loop: {e}")
         print(f"\n\n❌ Unexpected error: {e}")
     
+    move_stats = get_move_stats()
+    logger.info(f"Moves this session: {move_stats['rename']} renamed, {move_stats['copy']} copied "
+                f"({move_stats['bytes_copied'] / (1024 * 1024):.2f} MB), "
+                f"{move_stats['folder_syscalls_saved']} folder checks skipped")
     logger.info("File monitoring session ended")
     logger.info("="*60)
     print("✨ File monitoring stopped.")
 
 if __name__ == "__main__":
-    monitor_downloads_folder()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Organize new files in the Downloads folder using file_rules.json")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="also organize files already in Downloads when the monitor starts")
+    args = parser.parse_args()
+    monitor_downloads_folder(reconcile=args.reconcile)
\ No newline at end of file
@@ -1,46 +1,19 @@
-import os
 import time
-import shutil
-import logging
 from pathlib import Path
 from datetime import datetime
-from file_organizer_config import FILE_EXTENSIONS, DEFAULT_FOLDER
+from organizer_logging import setup_logging as setup_organizer_logging
+from file_organizer_config import (FILE_EXTENSIONS, DEFAULT_FOLDER, SETTLE_SECONDS, TEMP_SUFFIXES,
+                                   MOVE_WORKERS, COPIES_PER_DEVICE)
+from download_settler import DownloadSettler
+from move_worker_pool import MoveWorkerPool
+from file_mover import claim_destination, move_to_claimed, release_destination, ensure_folder
+from name_snapshot import NameSnapshot, iter_names
 
 def setup_logging():
     """Setup logging for the file organizer."""
-    # Create log directory
-    log_dir = Path.home() / "AppData" / "Local" / "FileOrganizer"
-    log_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Setup logger
-    logger = logging.getLogger('FileOrganizerEnhanced')
-    logger.setLevel(logging.INFO)
-    
-    # Clear existing handlers
-    logger.handlers.clear()
-    
-    # File handler
-    log_file = log_dir / "file_organizer_enhanced.log"
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setLevel(logging.INFO)
-    
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    
-    # Formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-    
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
+    # Queue-based pipeline: log calls never block on file I/O
+    log_file = Path.home() / "AppData" / "Local" / "FileOrganizer" / "file_organizer_enhanced.log"
+    return setup_organizer_logging('FileOrganizerEnhanced', log_file)
 
 def get_destination_folder(file_extension):
     """Get the destination folder for a file based on its extension."""
@@ -72,26 +45,14 @@ def move_file(source_path, file_name, logger):
     # Log the intended move
     logger.info(f"Processing file: {file_name} ({file_extension}) → {dest_folder.name}")
     
-    # Create destination folder if it doesn't exist
-    if not dest_folder.exists():
-        logger.info(f"Creating destination folder: {dest_folder}")
-        dest_folder.mkdir(parents=True, exist_ok=True)
+    # Create destination folder if it doesn't exist (checked once per folder)
+    if ensure_folder(dest_folder) == "created":
         logger.info(f"Created folder: {dest_folder}")
     
-    # Destination file path
-    dest_path = dest_folder / file_name
-    original_dest_path = dest_path
-    
-    # Handle file name conflicts
-    counter = 1
-    while dest_path.exists():
-        name_part = original_dest_path.stem
-        ext_part = original_dest_path.suffix
-        new_name = f"{name_part}_{counter}{ext_part}"
-        dest_path = dest_folder / new_name
-        counter += 1
-        
-    if dest_path != original_dest_path:
+    # Reserve a free destination name (safe with parallel moves)
+    dest_path = claim_destination(dest_folder, file_name, create_folder=True)
+    
+    if dest_path.name != file_name:
         logger.info(f"File renamed to avoid conflict: {file_name} → {dest_path.name}")
     
     # Get file size for logging
@@ -104,23 +65,23 @@ def move_file(source_path, file_name, logger):
     # Attempt to move the file
     try:
         start_time = time.time()
-        shutil.move(str(file_path), str(dest_path))
+        method = move_to_claimed(file_path, dest_path)
         move_time = time.time() - start_time
         
         logger.info(f"✅ FILE MOVED: {file_name} → {dest_path}")
-        logger.info(f"   Size: {file_size_mb:.2f} MB, Time: {move_time:.2f}s")
+        logger.info(f"   Size: {file_size_mb:.2f} MB, Time: {move_time:.2f}s, Method: {method}")
         
         return dest_path
         
     except PermissionError as e:
         logger.error(f"❌ Permission denied moving {file_name}: {e}")
-        return None
     except FileNotFoundError as e:
         logger.error(f"❌ File not found when moving {file_name}: {e}")
-        return None
     except Exception as e:
         logger.error(f"❌ Error moving file {file_name}: {e}")
-        return None
+    
+    release_destination(dest_path)
+    return None
 
 def print_organization_rules():
     """Print the current file organization rules."""
@@ -172,41 +133,64 @@ def monitor_downloads_folder():
     print("\n🚀 Starting monitor... Press Ctrl+C to stop.")
     
     # Get initial set of files
-    previous_files = set()
+    previous_files = NameSnapshot()
     try:
-        previous_files = set(os.listdir(downloads_path))
+        previous_files = NameSnapshot.of_folder(downloads_path)
         logger.info(f"Initial scan found {len(previous_files)} files in Downloads folder")
     except OSError as e:
         logger.error(f"Error accessing Downloads folder: {e}")
         return
     
+    # New files are held here until they stop growing
+    settler = DownloadSettler(SETTLE_SECONDS, TEMP_SUFFIXES)
+    
+    # Moves run on worker threads so a slow copy never blocks detection
+    pool = MoveWorkerPool(workers=MOVE_WORKERS, copies_per_device=COPIES_PER_DEVICE, logger=logger)
+    
+    def report_move(file_name):
+        """Build the callback that reports the outcome of one move."""
+        def on_done(moved_path):
+            if moved_path:
+                relative_path = moved_path.relative_to(Path.home())
+                print(f"  ✅ Moved to: ~/{relative_path}")
+                logger.info(f"File successfully organized: {file_name} → ~/{relative_path}")
+            else:
+                print(f"  ❌ Failed to move file")
+                logger.error(f"Failed to organize file: {file_name}")
+        return on_done
+    
     try:
         while True:
             time.sleep(1)  # Check every second
             
             try:
                 # Get current files
-                current_files = set(os.listdir(downloads_path))
+                current_files = NameSnapshot.of_folder(downloads_path)
                 
-                # Find new files
-                new_files = current_files - previous_files
+                # Find new files (their names come from a second listing, only if there are any)
+                new_files = previous_files.added(current_files, iter_names(downloads_path))
                 
-                # Process new files
+                # Queue new files until they have finished downloading
                 for file_name in new_files:
-                    file_path = downloads_path / file_name
+                    if not settler.track(downloads_path / file_name):
+                        logger.debug(f"Ignoring partial download: {file_name}")
+                
+                # Hand files that have stopped growing to the move workers
+                ready_files = settler.pop_ready()
+                for ready_path in ready_files:
+                    file_path = Path(ready_path)
+                    file_name = file_path.name
                     if file_path.is_file():  # Only process actual files, not directories
                         logger.info(f"📄 NEW FILE DETECTED: {file_name}")
                         print(f"\n📄 New file detected: {file_name}")
-                        
-                        # Move file to appropriate folder
-                        moved_path = move_file(downloads_path, file_name, logger)
-                        if moved_path:
-                            relative_path = moved_path.relative_to(Path.home())
-                            print(f"  ✅ Moved to: ~/{relative_path}")
-                            logger.info(f"File successfully organized: {file_name} → ~/{relative_path}")
-                        else:
-                            print(f"  ❌ Failed to move file")
-                            logger.error(f"Failed to organize file: {file_name}")
+                        dest_folder = get_destination_folder(file_path.suffix)
+                        pool.submit(move_file, (downloads_path, file_name, logger),
+                                    file_path, dest_folder, report_move(file_name))
+                
+                if ready_files:
+                    stats = pool.stats()
+                    if stats["queue_depth"] >= len(pool.threads):  # Moves are backing up
+                        logger.info(f"Move queue: {stats['queue_depth']} waiting, {stats['in_flight']} in flight")
                 
                 # Update previous files set
                 previous_files = current_files
@@ -222,6 +206,8 @@ def monitor_downloads_folder():
     except Exception as e:
         logger.error(f"Unexpected error in monitor loop: {e}")
         print(f"\n\n❌ Unexpected error: {e}")
+    finally:
+        pool.shutdown()
     
     logger.info("File monitoring session ended")
     logger.info("="*60)
@@ -0,0 +1,263 @@
+"""
+Folder Trees
+Support for watching a source folder recursively.
+
+TreeFilter decides which subdirectories are followed: up to max_depth levels
+below the source, skipping directories whose name (or path relative to the
+source) matches an exclude glob, and skipping destination folders that live
+inside the source, so organized files are never picked up again.
+
+TreeScanner finds new files in whole trees without kernel events. It keeps
+the listing and mtime of every directory; a scan stats all directories in
+parallel and only lists again the ones whose mtime changed (adding or
+removing an entry always updates the directory's mtime). New subdirectories
+are walked level by level, with each level listed in parallel. Each
+directory's files are kept as a NameSnapshot (an array of name hashes), so
+a tree with millions of files doesn't hold millions of strings.
+"""
+
+import os
+import re
+import time
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+
+from name_snapshot import NameSnapshot
+
+DEFAULT_MAX_DEPTH = 3
+DEFAULT_EXCLUDES = (".git", "node_modules", "__pycache__", "$RECYCLE.BIN", "System Volume Information")
+SCAN_WORKERS = 8
+# Directories stat'ed or listed per task, so 100k directories don't mean 100k futures
+STAT_CHUNK = 512
+LIST_CHUNK = 32
+
+# A directory changed this recently may change again within the same mtime tick
+# (FAT and some network filesystems have 1-2 s resolution), so it is listed again
+MTIME_GRANULARITY_NS = 2 * 10 ** 9
+
+
+class TreeFilter:
+    """Which subdirectories of a recursively watched folder to follow."""
+
+    def __init__(self, max_depth=DEFAULT_MAX_DEPTH, exclude=DEFAULT_EXCLUDES, skip=()):
+        self.max_depth = max_depth
+        self.exclude = tuple(exclude)
+        self.skip = frozenset(os.path.normcase(os.path.abspath(str(path))) for path in skip)
+        # Globs with a slash match the path relative to the source, the others the folder name
+        flags = re.IGNORECASE if os.name == "nt" else 0
+        self.name_regex = self._compile([p for p in self.exclude if "/" not in p], flags)
+        self.path_regex = self._compile([p for p in self.exclude if "/" in p], flags)
+
+    @staticmethod
+    def _compile(patterns, flags):
+        if not patterns:
+            return None
+        return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns), flags)
+
+    def __eq__(self, other):
+        return (isinstance(other, TreeFilter) and self.max_depth == other.max_depth and
+                self.exclude == other.exclude and self.skip == other.skip)
+
+    def __hash__(self):
+        return hash((self.max_depth, self.exclude, self.skip))
+
+    def follows(self, path, depth, source):
+        """True if the directory at path (depth levels below source) should be watched."""
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        if self.name_regex is not None and self.name_regex.match(os.path.basename(path)):
+            return False
+        if self.path_regex is not None:
+            relative = path[len(source):].lstrip(os.sep).replace(os.sep, "/")
+            if self.path_regex.match(relative):
+                return False
+        return os.path.normcase(path) not in self.skip
+
+    def covers(self, source, folder):
+        """True if files in folder are watched: folder is source or a followed subdirectory of it."""
+        relative = os.path.relpath(folder, source)
+        if relative == os.curdir:
+            return True
+        parts = relative.split(os.sep)
+        if parts[0] == os.pardir:
+            return False
+        path = source
+        for depth, part in enumerate(parts, 1):
+            path = os.path.join(path, part)
+            if not self.follows(path, depth, source):
+                return False
+        return True
+
+    def split(self, entries, depth, source):
+        """Split a directory listing into (file entries, names of followed subdirectories)."""
+        files = []
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if not is_dir:
+                files.append(entry)
+            elif self.follows(entry.path, depth + 1, source):
+                subdirs.append(entry.name)
+        return files, subdirs
+
+
+def walk_tree(top, tree_filter, depth=0, executor=None, source=None):
+    """Yield (directory, depth, file DirEntries, followed subdirectory names) for a tree.
+
+    source is the watched folder top belongs to (top itself by default), for
+    the depth limit and relative exclude globs. With an executor, each level
+    of the tree is listed in parallel.
+    """
+    source = source or top
+    level = [(top, depth)]
+    while level:
+        paths = [path for path, _ in level]
+        if executor is not None:
+            chunks = [paths[i:i + LIST_CHUNK] for i in range(0, len(paths), LIST_CHUNK)]
+            listings = (listing for chunk in executor.map(_list_directories, chunks) for listing in chunk)
+        else:
+            listings = map(_list_directory, paths)
+        next_level = []
+        for (path, path_depth), entries in zip(level, listings):
+            if entries is None:
+                continue
+            files, subdirs = tree_filter.split(entries, path_depth, source)
+            yield path, path_depth, files, subdirs
+            next_level.extend((os.path.join(path, name), path_depth + 1) for name in subdirs)
+        level = next_level
+
+
+def _list_directory(path):
+    try:
+        with os.scandir(path) as entries:
+            return list(entries)
+    except OSError:
+        return None
+
+
+def _list_directories(paths):
+    return [_list_directory(path) for path in paths]
+
+
+def _stat_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _stat_mtimes(paths):
+    return [_stat_mtime(path) for path in paths]
+
+
+class _DirectoryState:
+    __slots__ = ("top", "depth", "mtime_ns", "listed_at", "files", "subdirs")
+
+    def __init__(self, top, depth):
+        self.top = top
+        self.depth = depth
+        self.mtime_ns = None
+        self.listed_at = 0
+        self.files = NameSnapshot()
+        self.subdirs = set()
+
+
+class TreeScanner:
+    """Polls directory trees for new files, listing only directories that changed."""
+
+    def __init__(self, workers=SCAN_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="TreeScanner")
+        self.trees = {}            # top of each tree -> (TreeFilter, source folder)
+        self.dirs = {}             # directory -> _DirectoryState
+        self.listed = 0            # directories the last scan had to list
+
+    def __len__(self):
+        return len(self.dirs)
+
+    def add_tree(self, top, tree_filter, depth=0, report=False):
+        """Take the listing of a tree. With report=True, return its files as new.
+
+        depth is how far top lies below its source folder, so the depth limit
+        and relative exclude globs still apply when only part of a source is
+        scanned.
+        """
+        top = str(top)
+        source = top
+        for _ in range(depth):
+            source = os.path.dirname(source)
+        self.trees[top] = (tree_filter, source)
+        return self._add_subtree(top, top, depth, report)
+
+    def _add_subtree(self, top, path, depth, report):
+        events = []
+        tree_filter, source = self.trees[top]
+        for directory, dir_depth, files, subdirs in walk_tree(path, tree_filter, depth, self.executor, source):
+            state = self.dirs[directory] = _DirectoryState(top, dir_depth)
+            self._update(directory, state, files, subdirs)
+            if report:
+                events.extend(("created", entry.name, False, directory) for entry in files)
+        return events
+
+    def _update(self, directory, state, files, subdirs):
+        """Store a fresh listing of directory. Returns the previous (files, subdirs)."""
+        state.mtime_ns = _stat_mtime(directory)
+        state.listed_at = time.time_ns()
+        previous_files, previous_subdirs = state.files, state.subdirs
+        state.files = NameSnapshot(entry.name for entry in files)
+        state.subdirs = set(subdirs)
+        return previous_files, previous_subdirs
+
+    def remove_tree(self, path):
+        """Forget a directory and everything below it."""
+        path = str(path)
+        prefix = path.rstrip(os.sep) + os.sep
+        for directory in [d for d in self.dirs if d == path or d.startswith(prefix)]:
+            del self.dirs[directory]
+        for top in [t for t in self.trees if t == path or t.startswith(prefix)]:
+            del self.trees[top]
+
+    def scan(self):
+        """Return (kind, name, is_dir, folder) tuples for changes since the last scan."""
+        directories = list(self.dirs)
+        chunks = [directories[i:i + STAT_CHUNK] for i in range(0, len(directories), STAT_CHUNK)]
+        mtimes = (mtime for chunk in self.executor.map(_stat_mtimes, chunks) for mtime in chunk)
+        changed = []
+        for directory, mtime_ns in zip(directories, mtimes):
+            state = self.dirs.get(directory)
+            if state is None:
+                continue
+            if mtime_ns is None:
+                # Gone: the parent's listing reports it (a top just stops being scanned)
+                if directory in self.trees:
+                    self.remove_tree(directory)
+                continue
+            if mtime_ns != state.mtime_ns or state.listed_at - mtime_ns < MTIME_GRANULARITY_NS:
+                changed.append(directory)
+        self.listed = len(changed)
+
+        events = []
+        for directory, entries in zip(changed, self.executor.map(_list_directory, changed)):
+            state = self.dirs.get(directory)
+            if state is None or entries is None:
+                continue
+            tree_filter, source = self.trees[state.top]
+            files, subdirs = tree_filter.split(entries, state.depth, source)
+            previous_files, previous_subdirs = self._update(directory, state, files, subdirs)
+            new_files = previous_files.added(state.files, (entry.name for entry in files))
+            events.extend(("created", name, False, directory) for name in new_files)
+            for name in previous_subdirs - state.subdirs:
+                self.remove_tree(os.path.join(directory, name))
+                events.append(("deleted", name, True, directory))
+            for name in state.subdirs - previous_subdirs:
+                # A new folder (e.g. an extracted archive): everything in it is new
+                events.append(("created", name, True, directory))
+                events.extend(self._add_subtree(state.top, os.path.join(directory, name), state.depth + 1, True))
+        return events
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.dirs = {}
+        self.trees = {}
@@ -0,0 +1,682 @@
+"""
+Folder Watchers
+Pluggable backends that report new entries in one or more watched folders.
+
+Backends:
+- inotify:  Linux kernel events via ctypes (no extra dependencies)
+- watchdog: the watchdog library (ReadDirectoryChangesW on Windows, FSEvents on macOS)
+- polling:  listing diff on an interval, used when nothing better is available
+
+Polling is kept cheap for network shares: a folder is only listed again
+when its mtime or ctime changed, and the interval backs off while nothing
+happens (up to max_check_interval_seconds), returning to
+check_interval_seconds as soon as something changes. Listings are kept as
+NameSnapshots (8 bytes per entry), so huge folders don't hold every name.
+
+Every backend serves any number of folders from a single instance (one
+inotify descriptor, one watchdog observer, one polling pass); each event
+names the folder it happened in.
+"""
+
+import os
+import sys
+import time
+import errno
+import queue
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from collections import namedtuple
+
+from organizer_metrics import POLL_SCAN_SECONDS, POLL_LISTINGS
+from folder_tree import TreeScanner, MTIME_GRANULARITY_NS
+from name_snapshot import NameSnapshot, iter_names
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+# A single change reported by a watcher.
+# kind is one of: created, modified, closed, moved_to, moved_from, deleted, overflow
+# folder is the watched folder holding the entry (None for overflow)
+WatchEvent = namedtuple("WatchEvent", ["kind", "name", "is_dir", "folder"], defaults=(None,))
+
+# inotify constants (from <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+# Each quiet polling pass stretches the interval by this factor, up to the ceiling
+BACKOFF_FACTOR = 1.5
+DEFAULT_MAX_INTERVAL = 10
+
+
+def folder_list(folders):
+    """Accept a single folder or an iterable of folders; return a list of strings."""
+    if isinstance(folders, (str, os.PathLike)):
+        return [str(folders)]
+    return [str(folder) for folder in folders]
+
+
+class AdaptiveInterval:
+    """Polling interval that backs off while nothing changes and snaps back after activity."""
+
+    def __init__(self, interval=1, ceiling=None, factor=BACKOFF_FACTOR):
+        self.factor = factor
+        self.configure(interval, ceiling)
+
+    def configure(self, interval, ceiling=None):
+        """Set the base interval and the idle ceiling (None: never back off)."""
+        self.interval = interval
+        self.ceiling = interval if ceiling is None else max(interval, ceiling)
+        self.current = interval
+
+    def update(self, active):
+        """Record whether the last pass saw a change. Returns the delay before the next one."""
+        if active:
+            self.current = self.interval
+        else:
+            self.current = min(self.ceiling, self.current * self.factor)
+        return self.current
+
+
+def directory_stamp(folder):
+    """(mtime_ns, ctime_ns) of a folder: adding, removing or renaming an entry changes it."""
+    stat = os.stat(folder)
+    return stat.st_mtime_ns, stat.st_ctime_ns
+
+
+class PollingWatcher:
+    """Fallback watcher that diffs directory listings on an interval.
+
+    A folder is stat'ed first and only listed again if its stamp changed
+    (or changed so recently that a second change could share the same
+    mtime tick). Folders watched recursively are handed to a TreeScanner,
+    which does the same for every directory of the tree. The interval
+    backs off while idle, up to max_interval.
+    """
+
+    name = "polling"
+
+    def __init__(self, folders, interval=1, logger=None, trees=None, max_interval=None):
+        self.folders = folder_list(folders)
+        self.pace = AdaptiveInterval(interval, max_interval)
+        self.logger = logger
+        self.trees = {str(folder): tree for folder, tree in (trees or {}).items() if tree is not None}
+        self.snapshots = {}        # folder -> NameSnapshot of its last listing
+        self.stamps = {}           # folder -> (stamp when last listed, time listed in ns)
+        self.tree_scanner = None
+
+    @property
+    def interval(self):
+        return self.pace.interval
+
+    def start(self):
+        """Take the initial listings so existing files are not reported."""
+        for folder in list(self.folders):
+            self.add_folder(folder, self.trees.get(folder))
+
+    def add_folder(self, folder, tree=None):
+        """Start watching another folder (recursively if a TreeFilter is given)."""
+        folder = str(folder)
+        if tree is not None:
+            if not os.path.isdir(folder):
+                raise FileNotFoundError(f"Folder not found: {folder}")
+            if self.tree_scanner is None:
+                self.tree_scanner = TreeScanner()
+            before = len(self.tree_scanner)
+            self.tree_scanner.add_tree(folder, tree)
+            self.trees[folder] = tree
+            found = f"{len(self.tree_scanner) - before} folders"
+        else:
+            self._list(folder)
+            found = f"{len(self.snapshots[folder])} files"
+        if folder not in self.folders:
+            self.folders.append(folder)
+        if self.logger:
+            self.logger.info(f"Initial scan found {found} in {folder}")
+
+    def remove_folder(self, folder):
+        """Stop watching a folder."""
+        folder = str(folder)
+        if folder in self.folders:
+            self.folders.remove(folder)
+        self.snapshots.pop(folder, None)
+        self.stamps.pop(folder, None)
+        if self.trees.pop(folder, None) is not None:
+            self.tree_scanner.remove_tree(folder)
+
+    def read_events(self, timeout=None):
+        """Sleep for one interval and return entries that appeared meanwhile."""
+        delay = self.pace.current if timeout is None else min(self.pace.current, timeout)
+        time.sleep(delay)
+        return self.scan()
+
+    def _list(self, folder):
+        """List a folder, remembering its stamp. Returns the names new since the last listing."""
+        # Stat before listing: a change in between shows up as a new stamp next time
+        stamp = directory_stamp(folder)
+        current = NameSnapshot.of_folder(folder)
+        self.stamps[folder] = (stamp, time.time_ns())
+        previous = self.snapshots.get(folder) or NameSnapshot()
+        self.snapshots[folder] = current
+        # The new names are picked out of a second, streamed listing (only when there are any)
+        return previous.added(current, iter_names(folder))
+
+    def _unchanged(self, folder):
+        """True if the folder's stamp says its listing cannot have changed."""
+        known = self.stamps.get(folder)
+        if known is None:
+            return False
+        stamp, listed_at = known
+        return directory_stamp(folder) == stamp and listed_at - stamp[0] >= MTIME_GRANULARITY_NS
+
+    def scan(self):
+        """Return entries that appeared since the last scan, without waiting."""
+        events = []
+        failed = None
+        listed = skipped = 0
+        started = time.perf_counter()
+        for folder in list(self.folders):
+            if folder in self.trees:
+                continue
+            try:
+                if self._unchanged(folder):
+                    skipped += 1
+                    continue
+                new_files = self._list(folder)
+            except OSError as e:
+                # One unreachable folder (e.g. a disconnected share) doesn't stop the others
+                failed = e
+                continue
+            listed += 1
+            events.extend(WatchEvent("created", name, False, folder) for name in new_files)
+        if self.tree_scanner is not None:
+            events.extend(WatchEvent(*change) for change in self.tree_scanner.scan())
+            listed += self.tree_scanner.listed
+            skipped += len(self.tree_scanner) - self.tree_scanner.listed
+        POLL_SCAN_SECONDS.observe(time.perf_counter() - started)
+        POLL_LISTINGS.inc(listed, result="listed")
+        POLL_LISTINGS.inc(skipped, result="skipped")
+        # Any listed folder means something changed there: keep polling at full speed
+        self.pace.update(listed > 0)
+
+        if failed is not None and not events and len(self.folders) == 1:
+            raise failed
+        return events
+
+    def close(self):
+        """Release the listings."""
+        self.snapshots = {}
+        self.stamps = {}
+        if self.tree_scanner is not None:
+            self.tree_scanner.close()
+            self.tree_scanner = None
+
+
+def default_watch_budget():
+    """Half of the per-user inotify watch limit, leaving the rest to other programs."""
+    try:
+        with open("/proc/sys/fs/inotify/max_user_watches") as f:
+            return max(1, int(f.read()) // 2)
+    except (OSError, ValueError):
+        return 4096
+
+
+class InotifyWatcher:
+    """Linux kernel-event watcher using inotify through ctypes.
+
+    Recursive folders get one watch per followed subdirectory, added and
+    removed as directories appear and disappear. At most max_watches are
+    used; parts of a tree beyond that are polled with a TreeScanner every
+    scan_interval seconds (backing off to max_interval while idle) instead
+    of exhausting the kernel limit.
+
+    Each watched directory also keeps a NameSnapshot of the listing taken
+    when its watch was added. If the kernel's event queue overflows, the
+    directories are listed again and only the names missing from their
+    snapshots are reported, the same diff the polling watcher makes.
+    """
+
+    name = "inotify"
+
+    MASK = (IN_CREATE | IN_MOVED_TO | IN_MOVED_FROM | IN_CLOSE_WRITE |
+            IN_MODIFY | IN_DELETE)
+
+    _libc = None
+
+    def __init__(self, folders, logger=None, trees=None, max_watches=None, scan_interval=1, max_interval=None):
+        self.folders = folder_list(folders)
+        self.logger = logger
+        self.trees = {str(folder): tree for folder, tree in (trees or {}).items() if tree is not None}
+        self.max_watches = max_watches or default_watch_budget()
+        self.scan_interval = scan_interval
+        self.pace = AdaptiveInterval(scan_interval, max_interval)
+        self.fd = None
+        self.watches = {}          # watch descriptor -> (folder, watched root, depth below it)
+        self.watched_dirs = {}     # folder -> watch descriptor
+        self.snapshots = {}        # watched folder -> NameSnapshot, for rescans after an overflow
+        self.fallback = None       # TreeScanner for directories beyond max_watches
+        self.next_scan = 0
+        self.lock = threading.RLock()
+        self._buffer = b""
+
+    @classmethod
+    def available(cls):
+        """Return True if inotify can be used on this platform."""
+        if not sys.platform.startswith("linux"):
+            return False
+        return cls._load_libc() is not None
+
+    @classmethod
+    def _load_libc(cls):
+        """Load libc once and declare the inotify prototypes."""
+        if cls._libc is None:
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+                cls._libc = libc
+            except (OSError, AttributeError):
+                return None
+        return cls._libc
+
+    def start(self):
+        """Create the inotify instance and register the folders."""
+        libc = self._load_libc()
+        if libc is None:
+            raise OSError("inotify is not available on this system")
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+        self.fd = fd
+
+        try:
+            for folder in list(self.folders):
+                self.add_folder(folder, self.trees.get(folder))
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, folder, root, depth):
+        """Watch one directory. Returns False if the watch budget is used up."""
+        if folder in self.watched_dirs:
+            return True
+        if len(self.watches) >= self.max_watches:
+            return False
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(folder), self.MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                # The system-wide limit is lower than our budget: stay below it from now on
+                self.max_watches = len(self.watches)
+                return False
+            raise OSError(err, f"inotify_add_watch failed for {folder}: {os.strerror(err)}")
+        self.watches[wd] = (folder, root, depth)
+        self.watched_dirs[folder] = wd
+        return True
+
+    def _remove_watch(self, folder):
+        wd = self.watched_dirs.pop(folder, None)
+        self.snapshots.pop(folder, None)
+        if wd is not None:
+            self.watches.pop(wd, None)
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def _watch_tree(self, root, top, depth, report=False):
+        """Watch top and its followed subdirectories, breadth first.
+
+        Each directory is watched before it is listed, so nothing created in
+        between is lost. With report=True the files found are returned as
+        "created" events (for folders that appeared with content, e.g. an
+        extracted archive).
+        """
+        tree = self.trees[root]
+        events = []
+        level = [(top, depth)]
+        while level:
+            next_level = []
+            for folder, folder_depth in level:
+                try:
+                    watched = self._add_watch(folder, root, folder_depth)
+                except OSError:
+                    continue
+                if not watched:
+                    events.extend(self._poll_tree(root, folder, folder_depth, report))
+                    continue
+                try:
+                    with os.scandir(folder) as entries:
+                        files, subdirs = tree.split(entries, folder_depth, root)
+                except OSError:
+                    continue
+                self.snapshots[folder] = NameSnapshot([entry.name for entry in files] + subdirs)
+                if report:
+                    events.extend(WatchEvent("created", entry.name, False, folder) for entry in files)
+                next_level.extend((os.path.join(folder, name), folder_depth + 1) for name in subdirs)
+            level = next_level
+        return events
+
+    def _poll_tree(self, root, top, depth, report):
+        """Hand a subtree to the polling fallback (out of kernel watches)."""
+        if self.fallback is None:
+            self.fallback = TreeScanner()
+            if self.logger:
+                self.logger.warning(f"inotify watch budget ({self.max_watches}) used up, "
+                                    f"polling the remaining folders every {self.scan_interval}s")
+        return [WatchEvent(*change) for change in self.fallback.add_tree(top, self.trees[root], depth, report)]
+
+    def _unwatch_tree(self, top):
+        """Drop the watches for a directory and everything below it."""
+        prefix = top.rstrip(os.sep) + os.sep
+        for folder in [f for f in self.watched_dirs if f == top or f.startswith(prefix)]:
+            self._remove_watch(folder)
+        if self.fallback is not None:
+            self.fallback.remove_tree(top)
+
+    def add_folder(self, folder, tree=None):
+        """Add a watch for another folder (and its subfolders, given a TreeFilter)."""
+        folder = str(folder)
+        with self.lock:
+            if not self._add_watch(folder, folder, 0):
+                raise OSError(errno.ENOSPC, f"No inotify watches left for {folder}")
+            if folder not in self.folders:
+                self.folders.append(folder)
+            if tree is not None:
+                self.trees[folder] = tree
+                self._watch_tree(folder, folder, 0)
+                if self.logger:
+                    self.logger.info(f"Watching {folder} recursively ({len(self.watches)} inotify watches in use)")
+            else:
+                # Listed after the watch is added, so nothing created in between is missed
+                self.snapshots[folder] = NameSnapshot.of_folder(folder)
+
+    def remove_folder(self, folder):
+        """Remove the watches for a folder."""
+        folder = str(folder)
+        with self.lock:
+            if self.trees.pop(folder, None) is not None:
+                self._unwatch_tree(folder)
+            else:
+                self._remove_watch(folder)
+            if folder in self.folders:
+                self.folders.remove(folder)
+
+    def read_events(self, timeout=None):
+        """Block until events arrive (or timeout) and return them."""
+        polling = self.fallback is not None and len(self.fallback) > 0
+        if polling:
+            wait = max(0, self.next_scan - time.monotonic())
+            timeout = wait if timeout is None else min(timeout, wait)
+
+        events = []
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            events = self.read_pending()
+
+        if polling and time.monotonic() >= self.next_scan:
+            events.extend(self.scan_fallback())
+        return events
+
+    def read_pending(self):
+        """Return the events already queued on the descriptor, without waiting."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        if not data:
+            return []
+        with self.lock:
+            return self._parse(data)
+
+    def scan_fallback(self):
+        """Poll the directories beyond the watch budget (if any) for changes."""
+        with self.lock:
+            if self.fallback is None or not len(self.fallback):
+                return []
+            events = [WatchEvent(*change) for change in self.fallback.scan()]
+            active = self.fallback.listed > 0
+        self.next_scan = time.monotonic() + self.pace.update(active)
+        return events
+
+    def _parse(self, data):
+        """Decode raw inotify records into WatchEvents."""
+        events = []
+        data = self._buffer + data
+        offset = 0
+        header_size = INOTIFY_EVENT_HEADER.size
+
+        while offset + header_size <= len(data):
+            wd, mask, cookie, length = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+            end = offset + header_size + length
+            if end > len(data):
+                break
+            raw_name = data[offset + header_size:end].rstrip(b"\0")
+            offset = end
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped: report what the listings say is new instead
+                events.append(WatchEvent("overflow", None, False))
+                events.extend(self.rescan())
+                continue
+            if mask & IN_IGNORED:
+                # The folder was deleted or unwatched; the kernel dropped the watch
+                watch = self.watches.pop(wd, None)
+                if watch is not None and self.watched_dirs.get(watch[0]) == wd:
+                    del self.watched_dirs[watch[0]]
+                    self.snapshots.pop(watch[0], None)
+                continue
+            watch = self.watches.get(wd)
+            if not raw_name or watch is None:
+                continue
+            folder, root, depth = watch
+
+            name = os.fsdecode(raw_name)
+            is_dir = bool(mask & IN_ISDIR)
+            if mask & IN_CREATE:
+                events.append(WatchEvent("created", name, is_dir, folder))
+            if mask & IN_MOVED_TO:
+                events.append(WatchEvent("moved_to", name, is_dir, folder))
+            if mask & IN_MODIFY:
+                events.append(WatchEvent("modified", name, is_dir, folder))
+            if mask & IN_CLOSE_WRITE:
+                events.append(WatchEvent("closed", name, is_dir, folder))
+            if mask & IN_MOVED_FROM:
+                events.append(WatchEvent("moved_from", name, is_dir, folder))
+            if mask & IN_DELETE:
+                events.append(WatchEvent("deleted", name, is_dir, folder))
+
+            if is_dir and root in self.trees:
+                path = os.path.join(folder, name)
+                if mask & (IN_MOVED_FROM | IN_DELETE):
+                    self._unwatch_tree(path)
+                if mask & (IN_CREATE | IN_MOVED_TO) and \
+                        self.trees[root].follows(path, depth + 1, root):
+                    events.extend(self._watch_tree(root, path, depth + 1, report=True))
+
+        self._buffer = data[offset:]
+        return events
+
+    def rescan(self):
+        """List every watched folder again and return the entries missing from its snapshot.
+
+        Used after the event queue overflowed: files are reported as
+        "created", and new subfolders of a recursive tree are watched (and
+        their files reported) as if their creation had been seen.
+        """
+        events = []
+        with self.lock:
+            for wd, (folder, root, depth) in list(self.watches.items()):
+                previous = self.snapshots.get(folder) or NameSnapshot()
+                try:
+                    current = NameSnapshot.of_folder(folder)
+                    # The new names are picked out of a second, streamed listing (only when there are any)
+                    new_names = previous.added(current, iter_names(folder))
+                except OSError:
+                    continue
+                self.snapshots[folder] = current
+                tree = self.trees.get(root)
+                for name in new_names:
+                    path = os.path.join(folder, name)
+                    if tree is not None and os.path.isdir(path):
+                        if tree.follows(path, depth + 1, root):
+                            events.extend(self._watch_tree(root, path, depth + 1, report=True))
+                    else:
+                        events.append(WatchEvent("created", name, False, folder))
+        return events
+
+    def close(self):
+        """Close the inotify file descriptor."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self.watches = {}
+            self.watched_dirs = {}
+            self.snapshots = {}
+        if self.fallback is not None:
+            self.fallback.close()
+            self.fallback = None
+
+
+class _QueueingHandler(FileSystemEventHandler):
+    """watchdog handler that forwards events into a queue.
+
+    For a recursive schedule, events from subfolders the TreeFilter doesn't
+    follow (too deep, excluded, destination folders) are dropped.
+    """
+
+    def __init__(self, event_queue, root=None, tree=None):
+        super().__init__()
+        self.event_queue = event_queue
+        self.root = root
+        self.tree = tree
+
+    def _put(self, kind, path, is_dir):
+        folder, name = os.path.split(path)
+        if self.tree is not None and not self.tree.covers(self.root, folder):
+            return
+        self.event_queue.put(WatchEvent(kind, name, is_dir, folder))
+
+    def on_created(self, event):
+        self._put("created", event.src_path, event.is_directory)
+
+    def on_modified(self, event):
+        self._put("modified", event.src_path, event.is_directory)
+
+    def on_closed(self, event):
+        self._put("closed", event.src_path, event.is_directory)
+
+    def on_moved(self, event):
+        self._put("moved_from", event.src_path, event.is_directory)
+        self._put("moved_to", event.dest_path, event.is_directory)
+
+    def on_deleted(self, event):
+        self._put("deleted", event.src_path, event.is_directory)
+
+
+class WatchdogWatcher:
+    """Watcher backed by the watchdog library's native observer.
+
+    Recursive folders use watchdog's own recursive schedule (a single
+    subtree handle on Windows); depth limits and excludes are applied to
+    the events.
+    """
+
+    name = "watchdog"
+
+    def __init__(self, folders, logger=None, trees=None):
+        self.folders = folder_list(folders)
+        self.logger = logger
+        self.trees = {str(folder): tree for folder, tree in (trees or {}).items() if tree is not None}
+        self.event_queue = queue.Queue()
+        self.observer = None
+        self.watches = {}          # folder -> watchdog ObservedWatch
+
+    @classmethod
+    def available(cls):
+        """Return True if watchdog is installed."""
+        return Observer is not None
+
+    def start(self):
+        """Schedule the folders on a single watchdog observer."""
+        self.observer = Observer()
+        for folder in list(self.folders):
+            self.add_folder(folder, self.trees.get(folder))
+        self.observer.start()
+
+    def add_folder(self, folder, tree=None):
+        """Schedule another folder (recursively if a TreeFilter is given) on the observer."""
+        folder = str(folder)
+        handler = _QueueingHandler(self.event_queue, folder, tree)
+        self.watches[folder] = self.observer.schedule(handler, folder, recursive=tree is not None)
+        if tree is not None:
+            self.trees[folder] = tree
+        if folder not in self.folders:
+            self.folders.append(folder)
+
+    def remove_folder(self, folder):
+        """Unschedule a folder."""
+        folder = str(folder)
+        watch = self.watches.pop(folder, None)
+        if watch is not None:
+            self.observer.unschedule(watch)
+        self.trees.pop(folder, None)
+        if folder in self.folders:
+            self.folders.remove(folder)
+
+    def read_events(self, timeout=None):
+        """Wait for the first event, then drain whatever else is queued."""
+        try:
+            events = [self.event_queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+
+        while True:
+            try:
+                events.append(self.event_queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def close(self):
+        """Stop the observer thread."""
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+            self.watches = {}
+
+
+def create_watcher(folders, settings, logger=None, trees=None):
+    """Create the best available watcher for one or more folders according to settings.
+
+    trees maps folders that should be watched recursively to their TreeFilter.
+    """
+    backend = settings.get("watcher_backend", "auto")
+    interval = settings.get("check_interval_seconds", 1)
+    max_interval = settings.get("max_check_interval_seconds", DEFAULT_MAX_INTERVAL)
+
+    if backend in ("auto", "inotify") and InotifyWatcher.available():
+        return InotifyWatcher(folders, logger, trees, settings.get("max_watches"), interval, max_interval)
+    if backend in ("auto", "watchdog") and WatchdogWatcher.available():
+        return WatchdogWatcher(folders, logger, trees)
+
+    if backend not in ("auto", "polling") and logger:
+        logger.warning(f"Watcher backend '{backend}' is not available, falling back to polling")
+    return PollingWatcher(folders, interval, logger, trees, max_interval)
@@ -0,0 +1,443 @@
+"""
+Monitor Core
+The event loop shared by the command-line monitor, the startup script and
+the Windows service.
+
+Everything the monitor waits for is an awaitable on a single asyncio loop:
+watcher events (the inotify descriptor is registered with the loop itself,
+polling scans run on a timer, other backends are read on a helper thread),
+configuration reloads, the settle timer and stop requests. Blocking work -
+directory scans, the settler's stat calls, handing files to the move
+workers - runs in executors, so stop() and request_reload() take effect at
+once from any thread instead of after the next sleep.
+"""
+
+import os
+import time
+import signal
+import sqlite3
+import asyncio
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from folder_monitor_json import ConfigWatcher, watched_folders, sync_watched_folders
+from folder_watchers import create_watcher, PollingWatcher, InotifyWatcher, DEFAULT_MAX_INTERVAL
+from download_settler import create_settler
+from move_worker_pool import create_pool, DEFAULT_STOP_DRAIN_SECONDS
+from copy_throttle import configure_copy_limits
+from reconcile import create_reconciler
+from file_mover import forget_folder
+from move_journal import open_journal
+from dedup_index import open_dedup_index, AlreadyOrganized, DEFAULT_INDEX_PATH
+from organizer_metrics import (FILES_DETECTED, DETECTION_LATENCY, category_for, watch_pool,
+                               start_metrics_server)
+
+# Longest wait for a message while no download is settling
+IDLE_SECONDS = 5
+# Pause before scanning again after a source folder could not be read
+ERROR_RETRY_SECONDS = 5
+# Longest blocking read_events() call on the watcher thread (watchdog and other backends)
+PUMP_TIMEOUT = 0.25
+
+
+class MonitorCore:
+    """Watches the source folders and feeds settled files to the move workers.
+
+    move_func(source_folder, file_name, config, journal, dedup) performs one
+    move on a worker thread; report(file_name, detected_at) builds the
+    callback that reports its outcome. on_reload(snapshot) is called on the
+    loop after a new configuration has been applied.
+    """
+
+    def __init__(self, config, logger, move_func, report=None, on_reload=None, reconcile=False, backend=None):
+        self.config = config
+        self.logger = logger
+        self.move_func = move_func
+        self.report = report or self._report_move
+        self.on_reload = on_reload
+        self.reconcile = reconcile
+        self.backend = backend
+        self.folders = {}
+        self.watcher = None
+        self.settler = None
+        self.journal = None
+        self.dedup = None
+        self.retired_dedup = []        # indexes turned off by a reload; queued moves may still hold them
+        self.pool = None
+        self.metrics_server = None
+        self.reconciler = None
+        self.config_watcher = None
+        self.loop = None
+        self.inbox = None
+        self.stop_event = None
+        self.stopping = False
+        self.watch_executor = None     # every watcher call, one at a time
+        self.pipeline = None           # settler and submissions, in event order
+
+    def open(self):
+        """Start the watcher and the move pipeline. Returns False if no source can be watched."""
+        settings = self.config.settings
+
+        # Get the folders to watch ("sources" setting, Downloads by default)
+        self.folders = watched_folders(self.config.snapshot, self.logger)
+        if not self.folders:
+            self.logger.error("None of the source folders were found.")
+            self.logger.error("Please make sure the Downloads folder (or the folders in 'sources') exists.")
+            return False
+        for folder, tree in self.folders.items():
+            self.logger.info(f"Monitoring folder: {folder}{' (recursive)' if tree else ''}")
+
+        # Kernel events where available, polling otherwise
+        self.watcher = self._start_watcher(settings)
+        if self.watcher is None:
+            return False
+        self.logger.info(f"Using {self.watcher.name} watcher backend")
+
+        # New files are held here until they stop growing
+        self.settler = create_settler(settings)
+
+        # Finish or roll back moves interrupted by a crash, before anything new starts
+        self.journal = open_journal(settings, self.logger)
+
+        # Index of files already in the destination folders (if dedup_mode is set)
+        self.dedup = open_dedup_index(settings, self.logger)
+
+        # Moves run on worker threads so a slow copy never blocks detection
+        self.pool = create_pool(settings, self.logger)
+        configure_copy_limits(settings, self.logger)
+
+        # Counters and histograms on localhost (if metrics_port is set)
+        watch_pool(self.pool)
+        self.metrics_server = start_metrics_server(settings, self.logger)
+        return True
+
+    def _start_watcher(self, settings):
+        interval = settings.get("check_interval_seconds", 1)
+        max_interval = settings.get("max_check_interval_seconds", DEFAULT_MAX_INTERVAL)
+        if self.backend == "polling":
+            watcher = PollingWatcher(self.folders, interval, self.logger, self.folders, max_interval)
+        else:
+            watcher = create_watcher(self.folders, settings, self.logger, self.folders)
+        try:
+            watcher.start()
+            return watcher
+        except OSError as e:
+            if isinstance(watcher, PollingWatcher):
+                self.logger.error(f"Error accessing source folders: {e}")
+                return None
+            self.logger.warning(f"{watcher.name} watcher failed to start ({e}), falling back to polling")
+
+        watcher = PollingWatcher(self.folders, interval, self.logger, self.folders, max_interval)
+        try:
+            watcher.start()
+        except OSError as e:
+            self.logger.error(f"Error accessing source folders: {e}")
+            return None
+        return watcher
+
+    def stop(self):
+        """Stop the monitor. Safe to call from any thread, even before run() has started."""
+        self.stopping = True
+        loop = self.loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self.stop_event.set)
+            except RuntimeError:
+                pass  # The loop has already finished
+
+    def request_reload(self):
+        """Reload file_rules.json now. Safe to call from any thread."""
+        self._post("reload", None)
+
+    def _post(self, kind, payload):
+        loop = self.loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self.inbox.put_nowait, (kind, payload))
+            except RuntimeError:
+                pass
+
+    def _report_move(self, file_name, detected_at):
+        """Build the callback that logs the outcome of one move."""
+        def on_done(moved_path):
+            if isinstance(moved_path, AlreadyOrganized):
+                self.logger.info(f"Already organized: {file_name} ({moved_path.action})")
+            elif moved_path:
+                DETECTION_LATENCY.observe(time.monotonic() - detected_at)
+                self.logger.info(f"Moved to: ~/{moved_path.relative_to(Path.home())}")
+            else:
+                self.logger.warning(f"Failed to move file: {file_name}")
+        return on_done
+
+    def submit_move(self, ready_path, detected_at=None):
+        """Queue one file for moving (blocks while the move queue is full)."""
+        file_path = Path(ready_path)
+        file_name = file_path.name
+        if not self.config.settings.get("structured_move_logs", False):
+            self.logger.info(f"📄 NEW FILE DETECTED: {file_name}")
+        dest_folder = self.config.get_destination_for_file(file_path)
+        FILES_DETECTED.inc(category=category_for(dest_folder))
+        self.pool.submit(self.move_func, (file_path.parent, file_name, self.config, self.journal, self.dedup),
+                         file_path, dest_folder or file_path.parent,
+                         self.report(file_name, detected_at or time.monotonic()))
+
+    def _start_reconciler(self):
+        """Organize files already in the sources (unless a pass is still running)."""
+        if self.reconciler is None or not self.reconciler.thread.is_alive():
+            self.reconciler = create_reconciler(self.folders, self.submit_move, self.settler, self.pool,
+                                                self.config.settings, self.logger)
+            self.reconciler.start()
+
+    def _process(self, events):
+        """Feed watcher events into the settler and move the files that settled (pipeline thread)."""
+        for event in events:
+            folder = Path(event.folder) if event.folder else None
+            if event.kind == "overflow":
+                # The watcher follows this with "created" events for the names its rescan found
+                self.logger.warning("Watcher event queue overflowed, rescanned the folders for missed files")
+            elif event.is_dir:
+                if event.kind in ("moved_from", "deleted"):
+                    # A destination folder inside a source (e.g. Others) went away
+                    forget_folder(folder / event.name)
+            elif event.kind in ("created", "moved_to"):
+                if not self.settler.track(folder / event.name):
+                    self.logger.debug(f"Ignoring partial download: {event.name}")
+            elif event.kind == "closed":
+                # Only files tracked since they appeared; edits to existing files are not downloads
+                self.settler.mark_closed(folder / event.name)
+            elif event.kind in ("moved_from", "deleted"):
+                self.settler.forget(folder / event.name)
+
+        # Hand files that have finished downloading to the move workers
+        ready_files = self.settler.pop_ready(with_times=True)
+        for ready_path, detected_at in ready_files:
+            if os.path.isfile(ready_path):  # Only process actual files, not directories
+                self.submit_move(ready_path, detected_at)
+
+        if ready_files:
+            stats = self.pool.stats()
+            if stats["queue_depth"] >= len(self.pool.threads):  # Moves are backing up
+                self.logger.info(f"Move queue: {stats['queue_depth']} waiting, {stats['in_flight']} in flight")
+
+    async def run(self, handle_signals=False):
+        """Run until stop() is called, then shut everything down.
+
+        With handle_signals=True, SIGINT and SIGTERM stop the monitor and
+        SIGHUP reloads the configuration (where the platform supports it).
+        """
+        self.loop = asyncio.get_running_loop()
+        self.inbox = asyncio.Queue()
+        self.stop_event = asyncio.Event()
+        if self.stopping:
+            self.stop_event.set()
+        self.watch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Watcher")
+        self.pipeline = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Pipeline")
+        if handle_signals:
+            self._add_signal_handlers()
+
+        # Organize files that arrived while the monitor was not running
+        if self.reconcile:
+            self._start_reconciler()
+
+        # Reload file_rules.json as soon as it changes
+        self.config_watcher = ConfigWatcher(self.config, lambda snapshot: self._post("reload", snapshot))
+        self.config_watcher.start()
+
+        stopped = asyncio.ensure_future(self.stop_event.wait())
+        sources = [asyncio.ensure_future(source) for source in self._event_sources()]
+        for source in sources:
+            source.add_done_callback(self._source_ended)
+        try:
+            while not stopped.done():
+                message = await self._next_message(stopped)
+                if stopped.done():
+                    break
+                try:
+                    if message is None:
+                        # Settle timer: check the files that are still being written
+                        if len(self.settler):
+                            await self._until_stopped(self._in_pipeline(self._process, []), stopped)
+                    elif message[0] == "events":
+                        await self._until_stopped(self._in_pipeline(self._process, message[1]), stopped)
+                    elif message[0] == "reload":
+                        await self._apply_config(message[1], stopped)
+                except Exception as e:
+                    self.logger.error(f"Unexpected error in monitor loop: {e}")
+            self.logger.info("Stop requested, shutting down the monitor")
+        finally:
+            for task in sources + [stopped]:
+                task.cancel()
+            await asyncio.gather(*sources, stopped, return_exceptions=True)
+            self.close()
+
+    def _add_signal_handlers(self):
+        for name, handler in (("SIGINT", self.stop), ("SIGTERM", self.stop), ("SIGHUP", self.request_reload)):
+            signum = getattr(signal, name, None)
+            if signum is None:
+                continue
+            try:
+                self.loop.add_signal_handler(signum, handler)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows: Ctrl+C arrives as KeyboardInterrupt instead
+
+    async def _next_message(self, stopped):
+        """The next inbox message, or None when the settle timer fires or stop is requested."""
+        getter = asyncio.ensure_future(self.inbox.get())
+        await asyncio.wait({getter, stopped}, timeout=self.settler.next_timeout(IDLE_SECONDS),
+                           return_when=asyncio.FIRST_COMPLETED)
+        if getter.done():
+            return getter.result()
+        getter.cancel()
+        return None
+
+    @staticmethod
+    async def _until_stopped(future, stopped):
+        """Wait for an executor job, returning early if stop is requested (the job still finishes)."""
+        await asyncio.wait({future, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        return future.result() if future.done() else None
+
+    def _in_pipeline(self, func, *args):
+        return self.loop.run_in_executor(self.pipeline, func, *args)
+
+    def _in_watcher(self, func, *args):
+        return self.loop.run_in_executor(self.watch_executor, func, *args)
+
+    async def _apply_config(self, snapshot, stopped):
+        """Apply a reloaded configuration; with snapshot=None, read file_rules.json first."""
+        if snapshot is None:
+            self.logger.info("Reload requested, reading configuration...")
+            if not await self._until_stopped(self.loop.run_in_executor(None, self.config.reload_config), stopped):
+                return
+            snapshot = self.config.snapshot
+        self.settler.configure(snapshot.settings)
+        configure_copy_limits(snapshot.settings, self.logger)
+        self._sync_dedup(snapshot.settings)
+        pace = getattr(self.watcher, "pace", None)
+        if pace is not None:
+            pace.configure(snapshot.settings.get("check_interval_seconds", 1),
+                           snapshot.settings.get("max_check_interval_seconds", DEFAULT_MAX_INTERVAL))
+        folders = await self._until_stopped(
+            self._in_watcher(sync_watched_folders, self.watcher, self.folders, snapshot, self.logger), stopped)
+        if folders is not None:
+            self.folders = folders
+        if self.on_reload is not None:
+            try:
+                self.on_reload(snapshot)
+            except Exception as e:
+                self.logger.error(f"Error applying reloaded configuration: {e}")
+
+    def _source_ended(self, task):
+        """Log an event source that ended on its own (each one loops until cancelled)."""
+        if task.cancelled() or self.stopping:
+            return
+        error = task.exception()
+        self.logger.error(f"Watcher event source stopped unexpectedly: {error or 'returned'}; "
+                          "new files will not be detected until the monitor is restarted")
+
+    def _sync_dedup(self, settings):
+        """Open, close or switch the dedup index when a reload changes dedup_mode or dedup_index_path."""
+        path = Path(settings.get("dedup_index_path", DEFAULT_INDEX_PATH)).expanduser()
+        enabled = settings.get("dedup_mode", "off") != "off"
+        if self.dedup is not None and (not enabled or self.dedup.db_path != path):
+            # Closed on shutdown: moves queued before the reload still hold it
+            self.retired_dedup.append(self.dedup)
+            self.dedup = None
+            if not enabled:
+                self.logger.info("Duplicate detection turned off")
+        if enabled and self.dedup is None:
+            try:
+                self.dedup = open_dedup_index(settings, self.logger)
+                self.logger.info(f"Duplicate detection on (dedup_mode {settings['dedup_mode']!r}), index {path}")
+            except (OSError, sqlite3.Error) as e:
+                self.logger.error(f"Could not open the dedup index {path}, duplicates are not detected: {e}")
+
+    def _deliver(self, events):
+        if events:
+            self.inbox.put_nowait(("events", events))
+
+    def _event_sources(self):
+        """Coroutines that deliver the watcher's events to the inbox."""
+        watcher = self.watcher
+        if isinstance(watcher, InotifyWatcher):
+            return [self._read_descriptor(watcher), self._scan_periodically(watcher.scan_fallback, watcher.pace)]
+        if isinstance(watcher, PollingWatcher):
+            return [self._scan_periodically(watcher.scan, watcher.pace)]
+        return [self._pump(watcher)]
+
+    async def _read_descriptor(self, watcher):
+        """Read inotify events as soon as the descriptor becomes readable."""
+        fd = watcher.fd
+        readable = None
+
+        def on_readable():
+            # Level-triggered: stop listening until the pending events have been read
+            self.loop.remove_reader(fd)
+            if not readable.done():
+                readable.set_result(None)
+
+        while True:
+            readable = self.loop.create_future()
+            self.loop.add_reader(fd, on_readable)
+            try:
+                await readable
+            finally:
+                self.loop.remove_reader(fd)
+            try:
+                self._deliver(await self._in_watcher(watcher.read_pending))
+            except Exception as e:
+                # Keep reading: a bad batch must not silently end event delivery
+                self.logger.error(f"Error reading watcher events: {e}")
+                await asyncio.sleep(ERROR_RETRY_SECONDS)
+
+    async def _scan_periodically(self, scan, pace):
+        """Run a polling scan at the watcher's current (adaptive) interval."""
+        while True:
+            await asyncio.sleep(pace.current)
+            try:
+                self._deliver(await self._in_watcher(scan))
+            except OSError as e:
+                self.logger.error(f"Error checking folder: {e}")
+                await asyncio.sleep(ERROR_RETRY_SECONDS)
+            except Exception as e:
+                self.logger.error(f"Unexpected error scanning folders: {e}")
+                await asyncio.sleep(ERROR_RETRY_SECONDS)
+
+    async def _pump(self, watcher):
+        """Read a backend that only offers blocking reads, a short wait at a time."""
+        while True:
+            try:
+                self._deliver(await self._in_watcher(watcher.read_events, PUMP_TIMEOUT))
+            except OSError as e:
+                self.logger.error(f"Error checking folder: {e}")
+                await asyncio.sleep(ERROR_RETRY_SECONDS)
+            except Exception as e:
+                self.logger.error(f"Unexpected error reading watcher events: {e}")
+                await asyncio.sleep(ERROR_RETRY_SECONDS)
+
+    def close(self):
+        """Stop the helper threads and release the watcher, pool, journal and index."""
+        if self.config_watcher is not None:
+            self.config_watcher.stop()
+        if self.reconciler is not None:
+            self.reconciler.stop()
+        for executor in (self.pipeline, self.watch_executor):
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+        if self.watcher is not None:
+            self.watcher.close()
+        if self.pool is not None:
+            # Queued moves get a bounded time to finish; any still waiting after it are named
+            dropped = self.pool.shutdown(drain_timeout=self.config.settings.get("stop_drain_seconds",
+                                                                                DEFAULT_STOP_DRAIN_SECONDS))
+            if dropped:
+                self.logger.warning(f"Stopped with {len(dropped)} queued moves not started; these files "
+                                    "were left where they are (start with --reconcile to organize them):")
+                for source_path in dropped:
+                    self.logger.warning(f"  Not moved: {source_path}")
+        if self.journal is not None:
+            self.journal.close()
+        for index in [self.dedup, *self.retired_dedup]:
+            if index is not None:
+                index.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
@@ -0,0 +1,402 @@
+"""
+Move Journal
+Crash-safe record of every move, stored in SQLite (WAL mode) next to the logs.
+It doubles as the move log that undo works from: rows are indexed by
+completion time, destination and the rule that chose it.
+
+Each move first writes a "claiming" row with the destination it asked for,
+before the empty placeholder reserving a name is created, then turns it
+into an "intent" row with the name it got before any data is touched, and
+marks it "done" afterwards. Rows are keyed by the source file's identity
+(st_dev, st_ino, size, mtime), so a restart can tell exactly which moves were
+interrupted and either finish them or roll them back, including removing
+placeholders that were never journaled under their final name.
+
+Writes go through a single writer thread that group-commits everything
+queued within a few milliseconds into one transaction. A worker only waits
+for the commit of its claiming and intent rows, which are synced to disk
+(synchronous=FULL) so they survive a power failure; if a commit fails,
+reserve() or begin() raises and the move must not go ahead. "done" rows are never
+waited for and commit with synchronous=NORMAL.
+"""
+
+import os
+import stat
+import time
+import queue
+import sqlite3
+import threading
+from pathlib import Path
+
+from file_mover import claimed_name_pattern
+
+DEFAULT_JOURNAL_PATH = Path.home() / "AppData" / "Local" / "FileOrganizer" / "journal.db"
+DEFAULT_RETENTION_DAYS = 30
+COMMIT_WINDOW_SECONDS = 0.005
+# How much older than its claiming row an orphaned placeholder's mtime may look
+PLACEHOLDER_SLACK_SECONDS = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS moves (
+    id INTEGER PRIMARY KEY,
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    dest TEXT NOT NULL,
+    state TEXT NOT NULL,
+    method TEXT,
+    started REAL NOT NULL,
+    finished REAL,
+    rule TEXT,
+    dest_ino INTEGER
+);
+"""
+
+# Created after older journals have been given the rule column
+INDEXES = """
+CREATE INDEX IF NOT EXISTS moves_identity ON moves (dev, ino, size, mtime_ns);
+CREATE INDEX IF NOT EXISTS moves_state ON moves (state);
+CREATE INDEX IF NOT EXISTS moves_finished ON moves (finished);
+CREATE INDEX IF NOT EXISTS moves_dest ON moves (dest);
+CREATE INDEX IF NOT EXISTS moves_rule ON moves (rule);
+"""
+
+
+class _Commit:
+    """Lets callers wait for the transaction holding their rows, and see whether it failed."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.error = None
+
+    def set(self, error=None):
+        self.error = error
+        self.event.set()
+
+    def wait(self):
+        self.event.wait()
+        return self.error
+
+
+def file_identity(stat_result):
+    """Journal key for a file: (st_dev, st_ino, size, mtime_ns)."""
+    return (stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+
+
+def _inode(path):
+    """st_ino of a file, or None if it can't be read."""
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+
+class MoveJournal:
+    """Append-only move journal with group commit."""
+
+    def __init__(self, db_path=DEFAULT_JOURNAL_PATH, logger=None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.logger = logger
+        self.ops = queue.Queue()
+        self.id_lock = threading.Lock()
+
+        # Reads use their own connection; WAL lets them run alongside the writer
+        self.reader = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.reader.execute("PRAGMA journal_mode=WAL")
+        self.reader.executescript(SCHEMA)
+        columns = {row[1] for row in self.reader.execute("PRAGMA table_info(moves)")}
+        if "rule" not in columns:
+            self.reader.execute("ALTER TABLE moves ADD COLUMN rule TEXT")
+        if "dest_ino" not in columns:
+            self.reader.execute("ALTER TABLE moves ADD COLUMN dest_ino INTEGER")
+        self.reader.executescript(INDEXES)
+        self.reader.commit()
+        self.read_lock = threading.Lock()
+
+        row = self.reader.execute("SELECT COALESCE(MAX(id), 0) FROM moves").fetchone()
+        self.next_id = row[0] + 1
+
+        self.writer = threading.Thread(target=self._write_loop, name="MoveJournal", daemon=True)
+        self.writer.start()
+
+    def _allocate_id(self):
+        with self.id_lock:
+            move_id = self.next_id
+            self.next_id += 1
+            return move_id
+
+    def _commit(self, statements):
+        """Queue (sql, params) statements and wait until they are durable. Raises sqlite3.Error on failure.
+
+        The statements are queued in order, so waiting for the last one to
+        commit covers all of them.
+        """
+        committed = _Commit()
+        for position, (sql, params) in enumerate(statements, 1):
+            self.ops.put((sql, params, committed if position == len(statements) else None))
+        if statements:
+            error = committed.wait()
+            if error is not None:
+                raise error
+
+    def reserve(self, source_path, dest_path, stat_result, rule=None):
+        """Record that a destination name is about to be claimed for a file. Returns the move id.
+
+        dest_path is the destination asked for; the placeholder may end up
+        under another name (name_1, ...), which begin() records. rule is the
+        name of the rule that chose the destination, for undo.
+        """
+        return self.reserve_many([(source_path, dest_path, stat_result, rule)])[0]
+
+    def reserve_many(self, moves):
+        """reserve() for several (source_path, dest_path, stat_result, rule) moves with one wait."""
+        move_ids = [self._allocate_id() for _ in moves]
+        started = time.time()
+        self._commit([(
+            "INSERT INTO moves (id, dev, ino, size, mtime_ns, source, dest, state, started, rule) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 'claiming', ?, ?)",
+            (move_id, *file_identity(stat_result), str(source_path), str(dest_path), started, rule),
+        ) for move_id, (source_path, dest_path, stat_result, rule) in zip(move_ids, moves)])
+        return move_ids
+
+    def begin(self, move_id, dest_path):
+        """Record the intent to move a reserved file to the claimed dest_path and wait until it is durable."""
+        self.begin_many([(move_id, dest_path)])
+
+    def begin_many(self, moves):
+        """begin() for several (move_id, dest_path) pairs with one wait.
+
+        The placeholder's inode is recorded too, so recovery only ever removes
+        the placeholder (or the partial copy written into it). Raises
+        sqlite3.Error if the intents could not be committed; none of the
+        moves may start then.
+        """
+        self._commit([("UPDATE moves SET state = 'intent', dest = ?, dest_ino = ? WHERE id = ?",
+                       (str(dest_path), _inode(dest_path), move_id))
+                      for move_id, dest_path in moves])
+
+    def finish(self, move_id, method):
+        """Mark a move as done (not waited for; recovery handles a lost row)."""
+        self.ops.put(("UPDATE moves SET state = 'done', method = ?, finished = ? WHERE id = ?",
+                      (method, time.time(), move_id), None))
+
+    def abort(self, move_id):
+        """Mark a move as rolled back after it failed cleanly (or never got its destination)."""
+        self.ops.put(("UPDATE moves SET state = 'rolled_back', finished = ? WHERE id = ?",
+                      (time.time(), move_id), None))
+
+    def mark_undone(self, move_ids):
+        """Mark moves as reverted, so they are neither undone twice nor treated as already organized."""
+        for move_id in move_ids:
+            self.ops.put(("UPDATE moves SET state = 'undone' WHERE id = ?", (move_id,), None))
+
+    def find_moves(self, since=None, until=None, rule=None, dest_folder=None):
+        """Return finished moves matching every given filter, newest first.
+
+        since and until are epoch seconds (of the move's completion), rule is
+        a glob on the rule name and dest_folder matches moves into that
+        folder or below it. Rows are (id, source, dest, size, mtime_ns, ino,
+        method, rule) tuples. Moves made by undo itself only match if rule
+        selects them.
+        """
+        conditions = ["state = 'done'"]
+        params = []
+        if since is not None:
+            conditions.append("finished >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("finished < ?")
+            params.append(until)
+        if rule is not None:
+            conditions.append("rule GLOB ?")
+            params.append(rule)
+        else:
+            conditions.append("rule IS NOT 'undo'")
+        if dest_folder is not None:
+            # A range on the dest index: everything below folder/
+            prefix = os.path.join(str(dest_folder), "")
+            conditions.append("dest >= ? AND dest < ?")
+            params.extend((prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)))
+
+        self.flush()
+        with self.read_lock:
+            return self.reader.execute(
+                "SELECT id, source, dest, size, mtime_ns, ino, method, rule FROM moves "
+                f"WHERE {' AND '.join(conditions)} ORDER BY id DESC", params).fetchall()
+
+    def already_done(self, source_path, stat_result):
+        """The destination this exact file was already organized to from this path, or None."""
+        with self.read_lock:
+            row = self.reader.execute(
+                "SELECT dest FROM moves WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ? "
+                "AND source = ? AND state = 'done' ORDER BY id DESC LIMIT 1",
+                (*file_identity(stat_result), str(source_path)),
+            ).fetchone()
+        if row is not None and os.path.exists(row[0]):
+            return Path(row[0])
+        return None
+
+    def flush(self):
+        """Wait until everything queued so far is committed (or failed, which the writer logs)."""
+        committed = _Commit()
+        self.ops.put((None, None, committed))
+        committed.wait()
+
+    def close(self):
+        """Commit pending rows and stop the writer thread."""
+        self.ops.put(None)
+        self.writer.join()
+        with self.read_lock:
+            self.reader.close()
+
+    def _write_loop(self):
+        connection = sqlite3.connect(str(self.db_path))
+        connection.execute("PRAGMA journal_mode=WAL")
+        synchronous = None
+
+        stopping = False
+        while not stopping:
+            op = self.ops.get()
+            batch = []
+            deadline = time.monotonic() + COMMIT_WINDOW_SECONDS
+
+            # Gather everything that arrives within the commit window
+            while op is not None:
+                batch.append(op)
+                remaining = deadline - time.monotonic()
+                try:
+                    op = self.ops.get(timeout=remaining) if remaining > 0 else self.ops.get_nowait()
+                except queue.Empty:
+                    op = False
+                    break
+            if op is None:
+                stopping = True
+
+            error = None
+            try:
+                # Intents someone waits for are synced to disk; done rows can wait for the next sync
+                mode = "FULL" if any(committed is not None for _, _, committed in batch) else "NORMAL"
+                if mode != synchronous:
+                    connection.execute(f"PRAGMA synchronous={mode}")
+                    synchronous = mode
+                with connection:
+                    for sql, params, _ in batch:
+                        if sql is not None:
+                            connection.execute(sql, params)
+            except sqlite3.Error as e:
+                error = e
+                if self.logger:
+                    self.logger.error(f"Journal write failed: {e}")
+
+            for _, _, committed in batch:
+                if committed is not None:
+                    committed.set(error)
+
+        connection.close()
+
+    def recover(self):
+        """Finish or roll back moves interrupted by a crash. Returns (finished, rolled_back).
+
+        Only a move whose source is gone (or whose file is at the destination
+        under its own inode) counts as finished; any other is rolled back to
+        its source, since a crash can leave a full-size copy whose data never
+        reached the disk.
+        """
+        with self.read_lock:
+            rows = self.reader.execute(
+                "SELECT id, source, dest, state, started, dev, ino, size, dest_ino FROM moves "
+                "WHERE state IN ('claiming', 'intent')"
+            ).fetchall()
+
+        finished = rolled_back = 0
+        for move_id, source, dest, state, started, dev, ino, size, dest_ino in rows:
+            if state == "claiming":
+                # Crashed around claiming the name: nothing was moved, only a placeholder may be left
+                self._sweep_placeholders(move_id, dest, started)
+                self.abort(move_id)
+                rolled_back += 1
+                continue
+
+            source_exists = os.path.exists(source)
+            try:
+                dest_stat = os.stat(dest)
+            except OSError:
+                dest_stat = None
+
+            if dest_stat is not None and (not source_exists or (dest_stat.st_dev, dest_stat.st_ino) == (dev, ino)):
+                # Rename (or copy + unlink) completed, only the done row was lost
+                self.finish(move_id, "recovered")
+                finished += 1
+                continue
+
+            # Otherwise roll back. With the source still there, the destination is a placeholder or
+            # a copy that may not have reached the disk (even at full size): keep the source instead.
+            # Only remove it while it is still the claimed file, never one that replaced it since
+            if source_exists and dest_stat is not None:
+                if dest_stat.st_ino == dest_ino and dest_stat.st_size <= size:
+                    try:
+                        os.remove(dest)
+                    except OSError as e:
+                        if self.logger:
+                            self.logger.warning(f"Could not remove interrupted copy {dest}: {e}")
+                elif self.logger:
+                    self.logger.warning(f"Left {dest} in place: it is no longer the file claimed for {source}")
+            self.abort(move_id)
+            rolled_back += 1
+
+        self.flush()
+        if rows and self.logger:
+            self.logger.info(f"Journal recovery: {finished} interrupted moves finished, {rolled_back} rolled back")
+        return finished, rolled_back
+
+    def _sweep_placeholders(self, move_id, dest, started):
+        """Remove the empty placeholder a crash left for a move still claiming dest.
+
+        Only the names the namer could have given dest (dest itself, name_1.ext,
+        name_<timestamp>.ext, ...; see claimed_name_pattern) are candidates. An
+        empty one created after the row and not recorded by any other move is
+        the orphaned placeholder.
+        """
+        folder, requested = os.path.split(dest)
+        pattern = claimed_name_pattern(requested)
+        try:
+            with os.scandir(folder) as entries:
+                candidates = [entry for entry in entries if pattern.fullmatch(entry.name)]
+        except OSError:
+            return
+        for entry in candidates:
+            try:
+                info = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            # Some filesystems only keep mtimes to the nearest 2 s
+            if not stat.S_ISREG(info.st_mode) or info.st_size or info.st_mtime < started - PLACEHOLDER_SLACK_SECONDS:
+                continue
+            with self.read_lock:
+                known = self.reader.execute("SELECT 1 FROM moves WHERE dest = ? AND id != ? LIMIT 1",
+                                            (entry.path, move_id)).fetchone()
+            if known is None:
+                try:
+                    os.remove(entry.path)
+                except OSError as e:
+                    if self.logger:
+                        self.logger.warning(f"Could not remove orphaned placeholder {entry.path}: {e}")
+
+    def prune(self, retention_days=DEFAULT_RETENTION_DAYS):
+        """Delete finished rows older than the retention period."""
+        cutoff = time.time() - retention_days * 86400
+        self.ops.put(("DELETE FROM moves WHERE state NOT IN ('claiming', 'intent') AND finished < ?",
+                      (cutoff,), None))
+
+
+def open_journal(settings, logger=None):
+    """Open the move journal (or return None if disabled), recovering interrupted moves."""
+    if not settings.get("journal_enabled", True):
+        return None
+    journal = MoveJournal(Path(settings.get("journal_path", DEFAULT_JOURNAL_PATH)).expanduser(), logger)
+    journal.recover()
+    journal.prune(settings.get("journal_retention_days", DEFAULT_RETENTION_DAYS))
+    return journal
@@ -0,0 +1,220 @@
+"""
+Move Worker Pool
+Runs file moves on background threads so detection never waits for a copy.
+
+Jobs go through a bounded queue into a fixed set of worker threads. Moves
+that stay on the same filesystem are plain renames and run immediately;
+moves that have to copy data to another device are limited per destination
+device (keyed on st_dev), so one slow disk can't take every worker.
+"""
+
+import os
+import queue
+import threading
+from collections import deque
+from pathlib import Path
+
+from file_mover import get_device
+
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_COPIES_PER_DEVICE = 1
+# How long queued moves may keep running after a stop before the rest are dropped
+DEFAULT_STOP_DRAIN_SECONDS = 10
+
+
+class MoveJob:
+    """A single queued move."""
+
+    __slots__ = ("func", "args", "source_path", "dest_folder", "on_done", "device_key")
+
+    def __init__(self, func, args, source_path, dest_folder, on_done):
+        self.func = func
+        self.args = args
+        self.source_path = source_path
+        self.dest_folder = dest_folder
+        self.on_done = on_done
+        self.device_key = None
+
+
+class MoveWorkerPool:
+    """Bounded queue feeding worker threads with per-device copy limits."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE,
+                 copies_per_device=DEFAULT_COPIES_PER_DEVICE, device_limits=None, logger=None):
+        self.logger = logger
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.copies_per_device = copies_per_device
+        self.device_limits = {}
+        self.set_device_limits(device_limits or {})
+
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.active_per_device = {}
+        self.deferred = {}
+        self.in_flight = 0
+        self.unfinished = 0
+        self.pending_sources = set()
+
+        self.threads = []
+        for index in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"MoveWorker-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def set_device_limits(self, device_limits):
+        """Set per-device copy limits from a {folder path: max copies} dict."""
+        limits = {}
+        for folder, limit in device_limits.items():
+            device = get_device(Path(folder).expanduser())
+            if device is not None:
+                limits[device] = limit
+        self.device_limits = limits
+
+    def submit(self, func, args, source_path, dest_folder, on_done=None):
+        """Queue func(*args) as a move of source_path into dest_folder.
+
+        Blocks while the queue is full. on_done(result) is called from the
+        worker thread once the move has finished. Returns False if the same
+        source is already queued or moving.
+        """
+        with self.lock:
+            # The same file can be reported twice (e.g. by a live event and the
+            # startup scan); only the first submission is queued
+            key = str(source_path)
+            if key in self.pending_sources:
+                return False
+            self.pending_sources.add(key)
+            self.unfinished += 1
+        self.jobs.put(MoveJob(func, args, source_path, dest_folder, on_done))
+        return True
+
+    def stats(self):
+        """Return queue depth and number of moves in flight."""
+        with self.lock:
+            deferred = sum(len(jobs) for jobs in self.deferred.values())
+            return {
+                "queue_depth": self.jobs.qsize() + deferred,
+                "in_flight": self.in_flight,
+            }
+
+    def wait_for_room(self, max_depth, timeout=None):
+        """Wait until at most max_depth jobs are waiting. Returns False on timeout."""
+        with self.idle:
+            return self.idle.wait_for(
+                lambda: self.jobs.qsize() + sum(len(jobs) for jobs in self.deferred.values()) <= max_depth,
+                timeout)
+
+    def join(self, timeout=None):
+        """Wait until every submitted job has finished."""
+        with self.idle:
+            return self.idle.wait_for(lambda: self.unfinished == 0, timeout)
+
+    def shutdown(self, wait=True, drain_timeout=None):
+        """Stop the workers after the queued jobs have run.
+
+        With drain_timeout, the queue gets at most that many seconds to
+        drain; jobs that haven't started by then are dropped (their files stay
+        where they are) and only moves already in flight are waited for.
+        Returns the source paths of the dropped jobs.
+        """
+        cancelled = []
+        if drain_timeout is not None and not self.join(drain_timeout):
+            with self.lock:
+                while True:
+                    try:
+                        job = self.jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is not None:
+                        cancelled.append(job)
+                for jobs in self.deferred.values():
+                    cancelled.extend(jobs)
+                self.deferred = {}
+                for job in cancelled:
+                    self.unfinished -= 1
+                    self.pending_sources.discard(str(job.source_path))
+                self.idle.notify_all()
+        for _ in self.threads:
+            self.jobs.put(None)
+        if wait:
+            for thread in self.threads:
+                thread.join()
+        return [job.source_path for job in cancelled]
+
+    def _device_key(self, job):
+        """None for same-device renames, otherwise the destination st_dev."""
+        dest_device = get_device(job.dest_folder)
+        try:
+            source_device = os.stat(job.source_path).st_dev
+        except OSError:
+            return None
+        return None if source_device == dest_device else dest_device
+
+    def _limit_for(self, device):
+        return self.device_limits.get(device, self.copies_per_device)
+
+    def _worker(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+
+            job.device_key = self._device_key(job)
+            with self.lock:
+                if job.device_key is not None:
+                    active = self.active_per_device.get(job.device_key, 0)
+                    if active >= self._limit_for(job.device_key):
+                        # Device busy: park the job, a finishing copy will pick it up
+                        self.deferred.setdefault(job.device_key, deque()).append(job)
+                        continue
+                    self.active_per_device[job.device_key] = active + 1
+
+            while job is not None:
+                job = self._run(job)
+
+    def _run(self, job):
+        """Run one job and return the next parked job for the same device, if any."""
+        with self.lock:
+            self.in_flight += 1
+
+        try:
+            result = job.func(*job.args)
+        except Exception as e:
+            result = None
+            if self.logger:
+                self.logger.error(f"Unexpected error in move worker for {job.source_path}: {e}")
+
+        if job.on_done is not None:
+            try:
+                job.on_done(result)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Error in move callback for {job.source_path}: {e}")
+
+        next_job = None
+        with self.lock:
+            self.in_flight -= 1
+            self.unfinished -= 1
+            self.pending_sources.discard(str(job.source_path))
+            if job.device_key is not None:
+                parked = self.deferred.get(job.device_key)
+                if parked:
+                    next_job = parked.popleft()
+                else:
+                    self.active_per_device[job.device_key] -= 1
+            # Wakes join() and anyone waiting for room in the queue
+            self.idle.notify_all()
+
+        return next_job
+
+
+def create_pool(settings, logger=None):
+    """Create a MoveWorkerPool configured from a settings dict."""
+    return MoveWorkerPool(
+        workers=settings.get("move_workers", DEFAULT_WORKERS),
+        queue_size=settings.get("move_queue_size", DEFAULT_QUEUE_SIZE),
+        copies_per_device=settings.get("copies_per_device", DEFAULT_COPIES_PER_DEVICE),
+        device_limits=settings.get("device_concurrency", {}),
+        logger=logger,
+    )
@@ -0,0 +1,120 @@
+"""
+Name Snapshot
+Compact record of the names in a directory listing, for polling diffs.
+
+A polling watcher only needs to answer "which names are new since the last
+listing?". Keeping each listing as a set of strings costs well over 100
+bytes per entry, twice over while two listings are diffed, which adds up to
+hundreds of megabytes for a Downloads folder or tree with a million files.
+A NameSnapshot keeps just a sorted array of 64-bit name hashes (8 bytes
+per entry). Two snapshots are diffed with a merge pass that skips identical
+runs a block at a time, and only the names whose hash is new are looked up
+again, in a listing the caller streams once more.
+
+Hashes are Python's own string hash: salted per process, which is fine for
+snapshots that never leave memory. Two names sharing a 64-bit hash would
+hide one of them, with odds around n / 2**64 per new file.
+"""
+
+import os
+import heapq
+from array import array
+from bisect import bisect_left
+
+# Hashes sorted per run: sorting makes an int object per hash, so big listings
+# are sorted in runs of this size and merged instead of all at once
+SORT_RUN = 65536
+
+
+def iter_names(folder):
+    """Stream the entry names of a folder without building a list."""
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            yield entry.name
+
+
+def _common_run(old, i, new, j):
+    """Length of the identical run starting at old[i] == new[j] (both memoryviews)."""
+    limit = min(len(old) - i, len(new) - j)
+    # Gallop: double the run while the next block still matches, comparing only that block
+    low, high = 1, 2
+    while high <= limit and old[i + low:i + high] == new[j + low:j + high]:
+        low, high = high, high * 2
+    # Then bisect for the first mismatch between low (matches) and high (doesn't, or past the end)
+    high = min(high, limit + 1)
+    while high - low > 1:
+        middle = (low + high) // 2
+        if old[i + low:i + middle] == new[j + low:j + middle]:
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+class NameSnapshot:
+    """The names of one listing, as a sorted array of their hashes."""
+
+    __slots__ = ("hashes",)
+
+    def __init__(self, names=()):
+        hashes = array("q")
+        hashes.extend(map(hash, names))
+        if len(hashes) <= SORT_RUN:
+            self.hashes = array("q", sorted(hashes))
+            return
+        runs = [array("q", sorted(hashes[start:start + SORT_RUN])) for start in range(0, len(hashes), SORT_RUN)]
+        del hashes
+        self.hashes = array("q")
+        self.hashes.extend(heapq.merge(*runs))
+
+    @classmethod
+    def of_folder(cls, folder):
+        """Snapshot a folder, streaming its listing."""
+        return cls(iter_names(folder))
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, name):
+        value = hash(name)
+        index = bisect_left(self.hashes, value)
+        return index < len(self.hashes) and self.hashes[index] == value
+
+    def nbytes(self):
+        """Memory held by the hash array."""
+        return self.hashes.buffer_info()[1] * self.hashes.itemsize
+
+    def added_hashes(self, newer):
+        """Hashes in the newer snapshot that are not in this one."""
+        old, new = self.hashes, newer.hashes
+        old_view, new_view = memoryview(old), memoryview(new)
+        added = set()
+        i = j = 0
+        count = len(old)
+        while j < len(new):
+            if i == count:
+                added.update(new[j:])
+                break
+            a, b = old[i], new[j]
+            if a == b:
+                run = _common_run(old_view, i, new_view, j)
+                i += run
+                j += run
+            elif a < b:
+                # Names that are gone
+                i = bisect_left(old, b, i + 1)
+            else:
+                added.add(b)
+                j += 1
+        return added
+
+    def added(self, newer, names):
+        """The names (from the listing newer was taken of) that this snapshot doesn't have.
+
+        names is only iterated when something was added, so it can be a
+        fresh streamed listing, e.g. iter_names(folder).
+        """
+        added = self.added_hashes(newer)
+        if not added:
+            return []
+        return [name for name in names if hash(name) in added]
@@ -0,0 +1,677 @@
+"""
+Organize
+Command-line tools for organizing whole folders in one reviewed batch.
+
+    python organize.py plan [SOURCE ...] [--output plan.json] [--recursive]
+    python organize.py apply plan.json
+    python organize.py undo --since 2h [--rule NAME] [--dest FOLDER] [--dry-run]
+    python organize.py classify [PATHS_FILE] [--null]
+
+plan scans the sources (the configured "sources" by default), classifies
+every file with file_rules.json and resolves all name collisions in memory,
+then writes the complete move plan as JSON or CSV (by the output's
+extension) without touching any file. apply executes a plan, checking first
+that each source is still the file that was planned.
+
+Plans are ordered for speed: same-device renames come first, grouped by
+destination folder and run in parallel; cross-device copies follow, one
+stream per destination device, in source inode order so large copies read
+and write sequentially instead of seeking between files.
+
+undo reverts finished moves recorded in the move journal, selected by time
+range, rule and/or destination folder. The reverse moves are run through the
+same parallel apply, so a misfiring rule's thousands of moves are put back
+with renames wherever the original move was one.
+
+classify answers "where would these go?" for any number of paths read from
+a file or stdin, one per line, without touching the files; organize_many()
+is the same for library callers, and can also move them.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import datetime
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+from folder_monitor_json import FileOrganizerConfig, write_json_atomic
+from folder_tree import TreeFilter, DEFAULT_MAX_DEPTH, DEFAULT_EXCLUDES
+from download_settler import create_settler
+from reconcile import iter_backlog
+from file_mover import (DestinationNamer, claim_destination, move_to_claimed, release_destination,
+                        ensure_folder, get_device)
+from move_journal import open_journal
+from copy_throttle import configure_copy_limits
+
+PLAN_VERSION = 1
+PLAN_FIELDS = ("source", "dest", "size", "mtime_ns", "ino", "method", "rule")
+DEFAULT_APPLY_WORKERS = 8
+# Renames per batch: one journal commit covers the whole batch
+APPLY_BATCH = 256
+TIME_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+# Paths classified per batch, and the most extensions BatchClassifier remembers
+CLASSIFY_BATCH = 65536
+MEMO_LIMIT = 65536
+READ_BLOCK = 1024 * 1024
+
+
+class PlanNamer(DestinationNamer):
+    """DestinationNamer that reserves names in memory instead of creating placeholders.
+
+    A name counts as taken if it exists in the folder or was already given
+    to another file in the plan.
+    """
+
+    def _create(self, path):
+        folder, name = os.path.split(path)
+        stem, ext = os.path.splitext(name)
+        entry = self.folders[folder].get(self._key(stem, ext))
+        return entry is None or not entry[0]
+
+
+class BatchClassifier:
+    """Classifies plain path strings in bulk, remembering the result per extension.
+
+    When only extensions decide where a file goes (no pattern, folder, size
+    or per-source rules, as in the shipped file_rules.json), the result for
+    a path is fixed by its last dot, the character before it and everything
+    after it; that text is the memo key, so a batch costs one dict lookup
+    per path. The character before the dot tells "a.pdf" from a dotfile
+    like "/.pdf". Paths the memo can't answer (a dot in a folder name, an
+    extension that ends a multi-part one like .tar.gz) are looked up by
+    their extension parts instead, and only new extensions, or every path
+    when other rules exist, go through ConfigSnapshot.classify. Files are
+    never opened, so extensionless files are not sniffed.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.case_sensitive = snapshot.settings.get("case_sensitive", False)
+        engine = self.engine = snapshot.rule_engine
+        self.memo = {} if self._extension_only(snapshot) else None
+        # extension parts -> result, for paths whose memo key is ambiguous
+        self.tails = {}
+        self.tail_parts = max(1, engine.max_ext_parts)
+        # Last parts of multi-part extensions: "x.gz" alone doesn't say whether it is a .tar.gz
+        self.ambiguous = frozenset(ext.rsplit(".", 1)[1] for rule in engine.rules
+                                   for ext in rule.extensions if ext.count(".") > 1)
+        # A drive letter ends the folder part too ("C:file.pdf")
+        self.separators = tuple(sep for sep in (os.sep, os.altsep) if sep) + ((":",) if os.name == "nt" else ())
+
+    @staticmethod
+    def _extension_only(snapshot):
+        engine = snapshot.rule_engine
+        if engine.unkeyed or any(source.rule_engine is not engine or source.default_path != snapshot.default_path
+                                 for source in snapshot.sources):
+            return False
+        return not any(rule.name_regex is not None or rule.source_regex is not None or rule.needs_stat
+                       for rule in engine.rules)
+
+    def classify(self, path):
+        """(destination folder as a string or None, rule name or None) for one path."""
+        dest_folder, rule = self.snapshot.classify(path)
+        return (str(dest_folder) if dest_folder is not None else None), rule
+
+    def classify_many(self, paths):
+        """Classify a list of path strings. Returns a list of classify() results in the same order."""
+        memo = self.memo
+        if memo is None:
+            return [self.classify(path) for path in paths]
+
+        get = memo.get
+        if self.case_sensitive:
+            results = [get(path[path.rfind(".") - 1:]) for path in paths]
+        else:
+            results = [get(path[path.rfind(".") - 1:].lower()) for path in paths]
+        # Jump between misses with list.index, which scans in C
+        position = 0
+        try:
+            while True:
+                position = results.index(None, position)
+                results[position] = self._classify_new(paths[position])
+        except ValueError:
+            return results
+
+    def _classify_new(self, path):
+        # The same key classify_many looks up (lowercasing can change a string's length)
+        key = path[path.rfind(".") - 1:]
+        folded = path
+        if not self.case_sensitive:
+            key = key.lower()
+            folded = path.lower()
+        name = folded[max(folded.rfind(sep) for sep in self.separators) + 1:]
+        if name in ("", "."):
+            # "folder/" or "folder/.": let Path normalize it
+            name = Path(folded).name
+        tail = tuple(self.engine.extension_parts(name, self.tail_parts))
+        result = self.tails.get(tail)
+        if result is None:
+            result = self.classify(path)
+            if len(self.tails) < MEMO_LIMIT:
+                self.tails[tail] = result
+
+        # Without a dot the key is just the path's last characters: no extension either way
+        if len(self.memo) < MEMO_LIMIT and ("." not in key or (
+                key[2:] not in self.ambiguous and not any(sep in key for sep in self.separators))):
+            self.memo[key] = result
+        return result
+
+
+def iter_batches(items, size=CLASSIFY_BATCH):
+    """Split any iterable into lists of at most size items."""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def read_path_batches(stream, separator="\n"):
+    """Yield lists of the paths in a text stream, one per line (or NUL-separated), a block at a time."""
+    pending = ""
+    while True:
+        block = stream.read(READ_BLOCK)
+        if not block:
+            break
+        paths = (pending + block).split(separator)
+        pending = paths.pop()
+        if separator == "\n" and "\r" in block:
+            paths = [path.rstrip("\r") for path in paths]
+        paths = [path for path in paths if path] if "" in paths else paths
+        if paths:
+            yield paths
+    pending = pending.rstrip("\r") if separator == "\n" else pending
+    if pending:
+        yield [pending]
+
+
+def plan_folders(snapshot, folders=None, recursive=False):
+    """The folders to plan, as {path: TreeFilter or None}.
+
+    Without folders, the configured sources are used with their own
+    recursive settings. With recursive=True, given folders are walked with
+    the global depth limit and excludes, skipping destination folders.
+    """
+    if not folders:
+        return {source.path: source.tree_filter for source in snapshot.sources if source.path.is_dir()}
+
+    settings = snapshot.settings
+    destinations = {rule.dest_path for rule in snapshot.rule_engine.rules}
+    destinations.add(snapshot.default_path)
+    planned = {}
+    for folder in folders:
+        path = Path(folder).expanduser().absolute()
+        source = snapshot.source_for(path)
+        tree = source.tree_filter if source is not None and source.path == path else None
+        if recursive and tree is None:
+            tree = TreeFilter(settings.get("recursive_max_depth", DEFAULT_MAX_DEPTH),
+                              settings.get("recursive_exclude", DEFAULT_EXCLUDES), destinations)
+        planned[path] = tree
+    return planned
+
+
+def order_moves(moves):
+    """Sort moves into execution order: renames by destination folder, then copies by device and inode."""
+    renames = [move for move in moves if move["method"] == "rename"]
+    copies = [move for move in moves if move["method"] != "rename"]
+    renames.sort(key=lambda move: (os.path.dirname(move["dest"]), move["dest"]))
+    copies.sort(key=lambda move: (get_device(os.path.dirname(move["dest"])) or 0, move["ino"]))
+    return renames + copies
+
+
+def plan_move(source, stat, dest_folder, rule, namer, settings):
+    """The planned move of one classified file, as (move, None) or (None, reason it is skipped).
+
+    The reason is None for files that are already in their destination.
+    """
+    if dest_folder is None:
+        return None, "no extension"
+    if os.path.normcase(str(dest_folder)) == os.path.normcase(os.path.dirname(source)):
+        return None, None
+    dest_path = namer.claim(dest_folder, os.path.basename(source), settings.get("handle_duplicates", True),
+                            settings.get("duplicate_naming", "counter"), source)
+    if dest_path is None:
+        return None, "exists"
+    return {
+        "source": source,
+        "dest": str(dest_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "ino": stat.st_ino,
+        "method": "rename" if stat.st_dev == get_device(dest_folder) else "copy",
+        "rule": rule,
+    }, None
+
+
+def build_plan(config, folders=None, recursive=False):
+    """Classify every file in the folders and return the move plan (nothing is touched)."""
+    snapshot = config.snapshot
+    settings = snapshot.settings
+    is_temporary = create_settler(settings).is_temporary
+    namer = PlanNamer()
+
+    moves = []
+    skipped = []
+    for folder, tree in plan_folders(snapshot, folders, recursive).items():
+        try:
+            for entry in iter_backlog(folder, is_temporary, tree):
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                dest_folder, rule = snapshot.classify(entry.path, stat, config.sniffer)
+                move, reason = plan_move(entry.path, stat, dest_folder, rule, namer, settings)
+                if move is not None:
+                    moves.append(move)
+                elif reason is not None:
+                    skipped.append({"source": entry.path, "reason": reason})
+        except OSError as e:
+            config.logger.error(f"Error scanning {folder}: {e}")
+
+    return {
+        "version": PLAN_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "config": str(config.config_file.absolute()),
+        "moves": order_moves(moves),
+        "skipped": skipped,
+    }
+
+
+def write_plan(plan, output="-", fmt=None):
+    """Write a plan as JSON or CSV (from fmt or the output's extension); "-" is stdout."""
+    fmt = fmt or ("csv" if str(output).lower().endswith(".csv") else "json")
+    if fmt == "csv":
+        if output == "-":
+            _write_csv(plan["moves"], sys.stdout)
+        else:
+            with open(output, "w", newline="", encoding="utf-8") as f:
+                _write_csv(plan["moves"], f)
+    elif output == "-":
+        json.dump(plan, sys.stdout, indent=2, ensure_ascii=False)
+        sys.stdout.write("\n")
+    else:
+        write_json_atomic(output, plan)
+
+
+def _write_csv(moves, stream):
+    writer = csv.DictWriter(stream, fieldnames=PLAN_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(moves)
+
+
+def read_plan(path):
+    """Load a plan written by write_plan (JSON or CSV)."""
+    if str(path).lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            moves = []
+            for row in csv.DictReader(f):
+                for field in ("size", "mtime_ns", "ino"):
+                    row[field] = int(row[field])
+                moves.append(row)
+        return {"version": PLAN_VERSION, "moves": moves}
+
+    with open(path, encoding="utf-8") as f:
+        plan = json.load(f)
+    if not isinstance(plan, dict) or plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"{path} is not a move plan (version {PLAN_VERSION})")
+    return plan
+
+
+def check_planned(move):
+    """Return the stat of a planned source if it is still the planned file, else None.
+
+    An "ino" of None skips the inode check (a copied file has a new one).
+    """
+    try:
+        stat = os.stat(move["source"])
+    except OSError:
+        return None
+    if (stat.st_size != move["size"] or stat.st_mtime_ns != move["mtime_ns"] or
+            (move["ino"] is not None and stat.st_ino != move["ino"])):
+        return None
+    return stat
+
+
+def claim_planned(move, settings):
+    """Reserve a planned move's destination.
+
+    Returns (outcome, destination path): outcome is None when the move can
+    go ahead, "exists" if the name is taken and duplicates are not handled,
+    or "failed".
+    """
+    dest = Path(move["dest"])
+    create_folders = settings.get("create_folders", True)
+    try:
+        if ensure_folder(dest.parent, create_folders) is None:
+            return "failed", None
+        # The planned name was free when the plan was made; claiming it again handles anything new
+        dest_path = claim_destination(dest.parent, dest.name, settings.get("handle_duplicates", True),
+                                      settings.get("duplicate_naming", "counter"), move["source"], create_folders)
+    except OSError:
+        return "failed", None
+    if dest_path is None:
+        return "exists", None
+    return None, dest_path
+
+
+def apply_moves(moves, settings, journal=None):
+    """Execute planned moves in order. Returns a list of (move, outcome, destination path or None).
+
+    outcome is "rename" or "copy" on success, "changed" if the source is no
+    longer the planned file, otherwise as in claim_planned. With a journal,
+    the destinations of the whole batch are journaled together before any
+    is claimed, and the claimed names together before the first move
+    starts; if either commit fails, none of them moves.
+    """
+    results = []
+    unchanged = []
+    for move in moves:
+        stat = check_planned(move)
+        if stat is None:
+            results.append((move, "changed", None))
+        else:
+            unchanged.append((move, stat))
+
+    move_ids = [None] * len(unchanged)
+    if journal is not None:
+        try:
+            move_ids = journal.reserve_many([(move["source"], move["dest"], stat, move.get("rule"))
+                                            for move, stat in unchanged])
+        except sqlite3.Error:
+            results.extend((move, "failed", None) for move, _ in unchanged)
+            return results
+
+    claimed = []
+    for (move, _), move_id in zip(unchanged, move_ids):
+        outcome, dest_path = claim_planned(move, settings)
+        if outcome is None:
+            claimed.append((move, dest_path, move_id))
+            continue
+        if move_id is not None:
+            journal.abort(move_id)
+        results.append((move, outcome, None))
+
+    if journal is not None and claimed:
+        try:
+            journal.begin_many([(move_id, dest_path) for _, dest_path, move_id in claimed])
+        except sqlite3.Error:
+            for move, dest_path, move_id in claimed:
+                release_destination(dest_path)
+                journal.abort(move_id)
+                results.append((move, "failed", None))
+            return results
+
+    for move, dest_path, move_id in claimed:
+        try:
+            method = move_to_claimed(move["source"], dest_path, settings.get("fsync_copies", False))
+        except OSError:
+            release_destination(dest_path)
+            if move_id is not None:
+                journal.abort(move_id)
+            results.append((move, "failed", None))
+            continue
+        if move_id is not None:
+            journal.finish(move_id, method)
+        results.append((move, method, dest_path))
+    return results
+
+
+def apply_plan(plan, config, workers=DEFAULT_APPLY_WORKERS, journal=None, settings=None, on_moved=None):
+    """Execute a plan: renames in parallel per destination folder, then copies one stream per device.
+
+    settings overrides the configured ones; on_moved(move, method, dest_path)
+    is called for every successful move. Returns {outcome: count} plus
+    "bytes" copied and "seconds" taken.
+    """
+    settings = config.settings if settings is None else settings
+    logger = config.logger
+    totals = {"rename": 0, "copy": 0, "changed": 0, "exists": 0, "failed": 0, "bytes": 0}
+    started = time.monotonic()
+
+    rename_batches = {}
+    copy_batches = {}
+    for move in plan["moves"]:
+        dest_folder = os.path.dirname(move["dest"])
+        if move["method"] == "rename":
+            rename_batches.setdefault(dest_folder, []).append(move)
+        else:
+            copy_batches.setdefault(get_device(dest_folder), []).append(move)
+
+    # A large folder is split so its renames still spread over the workers
+    rename_batches = [batch[i:i + APPLY_BATCH] for batch in rename_batches.values()
+                      for i in range(0, len(batch), APPLY_BATCH)]
+
+    def run_batch(moves):
+        results = apply_moves(moves, settings, journal)
+        for move, outcome, dest_path in results:
+            if dest_path is not None:
+                logger.debug(f"Moved {move['source']} → {dest_path} ({outcome})")
+            else:
+                logger.warning(f"Not moved ({outcome}): {move['source']}")
+        return results
+
+    for batches in (rename_batches, list(copy_batches.values())):
+        if not batches:
+            continue
+        with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+            for results in executor.map(run_batch, batches):
+                for move, outcome, dest_path in results:
+                    totals[outcome] += 1
+                    if outcome == "copy":
+                        totals["bytes"] += move["size"]
+                    if dest_path is not None and on_moved is not None:
+                        on_moved(move, outcome, dest_path)
+
+    totals["seconds"] = time.monotonic() - started
+    return totals
+
+
+def organize_many(paths, dry_run=False, config=None, journal=None, batch_size=CLASSIFY_BATCH,
+                  workers=DEFAULT_APPLY_WORKERS):
+    """Classify, and unless dry_run move, files given as path strings, a batch at a time.
+
+    Yields (path, destination, rule) for every path in input order as each
+    batch finishes. With dry_run the destination is the folder the file
+    would go to and nothing is touched; otherwise it is the file's new path,
+    or None if the file was not moved (missing, no extension, a partial
+    download, already in place, or changed while moving). config defaults
+    to file_rules.json in the current directory.
+    """
+    config = config or FileOrganizerConfig()
+    classifier = BatchClassifier(config.snapshot)
+    settings = config.settings
+    if not dry_run:
+        configure_copy_limits(settings, config.logger)
+    is_temporary = create_settler(settings).is_temporary
+    namer = PlanNamer()
+
+    for batch in iter_batches(paths, batch_size):
+        results = classifier.classify_many(batch)
+        if dry_run:
+            yield from ((path, dest_folder, rule) for path, (dest_folder, rule) in zip(batch, results))
+            continue
+
+        moves = []
+        for path, (dest_folder, rule) in zip(batch, results):
+            if dest_folder is None or is_temporary(os.path.basename(path)):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            move, _ = plan_move(path, stat, dest_folder, rule, namer, settings)
+            if move is not None:
+                moves.append(move)
+        moved = {}
+        apply_plan({"moves": order_moves(moves)}, config, workers, journal,
+                   on_moved=lambda move, method, dest_path: moved.__setitem__(move["source"], str(dest_path)))
+        yield from ((path, moved.get(path), rule) for path, (_, rule) in zip(batch, results))
+
+
+def parse_time(value, now=None):
+    """Epoch seconds for a relative age ("90s", "30m", "2h", "1d", "1w") or an ISO date/time."""
+    value = value.strip()
+    unit = TIME_UNITS.get(value[-1:].lower())
+    if unit is not None:
+        try:
+            return (time.time() if now is None else now) - float(value[:-1]) * unit
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a relative age (e.g. 2h) or ISO time: {value!r}")
+
+
+def build_undo_plan(journal, since=None, until=None, rule=None, dest_folder=None):
+    """A plan that moves the matching journaled moves back, newest first.
+
+    Each reverse move is checked against the file the original move left
+    behind; a renamed file must also still be the same inode.
+    """
+    moves = []
+    for move_id, source, dest, size, mtime_ns, ino, method, move_rule in journal.find_moves(
+            since, until, rule, dest_folder):
+        moves.append({"id": move_id, "source": dest, "dest": source, "size": size, "mtime_ns": mtime_ns,
+                      "ino": ino if method == "rename" else None, "method": method, "rule": "undo",
+                      "undoes": move_rule})
+    return {"version": PLAN_VERSION, "created": datetime.now().isoformat(timespec="seconds"),
+            "moves": moves, "skipped": []}
+
+
+def undo_moves(config, journal, plan, workers=DEFAULT_APPLY_WORKERS):
+    """Move the files of an undo plan back and mark the original moves as undone. Returns the totals."""
+    # The original name may have been taken since: restore next to it rather than fail
+    settings = dict(config.settings, handle_duplicates=True, duplicate_naming="counter", create_folders=True)
+    undone = []
+    totals = apply_plan(plan, config, workers, journal, settings,
+                        on_moved=lambda move, method, dest_path: undone.append(move["id"]))
+    journal.mark_undone(undone)
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Organize whole folders in one reviewed batch")
+    parser.add_argument("--config", default="file_rules.json", help="rules file (default: file_rules.json)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = commands.add_parser("plan", help="classify files and write the move plan without moving anything")
+    plan_parser.add_argument("sources", nargs="*", help="folders to plan (default: the configured sources)")
+    plan_parser.add_argument("-o", "--output", default="-", help="plan file (.json or .csv); default: stdout")
+    plan_parser.add_argument("--format", choices=("json", "csv"), help="override the format picked from --output")
+    plan_parser.add_argument("--recursive", action="store_true", help="include subfolders of the given sources")
+
+    apply_parser = commands.add_parser("apply", help="execute a move plan")
+    apply_parser.add_argument("plan", help="plan file written by 'plan'")
+    apply_parser.add_argument("--workers", type=int, default=DEFAULT_APPLY_WORKERS,
+                              help="destination folders renamed in parallel")
+
+    undo_parser = commands.add_parser("undo", help="move files back to where they were before being organized")
+    undo_parser.add_argument("--since", type=parse_time, help="moves made since, e.g. 2h, 1d or 2024-05-01T09:00")
+    undo_parser.add_argument("--until", type=parse_time, help="moves made before this age or time")
+    undo_parser.add_argument("--rule", help="moves made by this rule (a glob; 'default' for the default folder)")
+    undo_parser.add_argument("--dest", help="moves into this destination folder or below it")
+    undo_parser.add_argument("--dry-run", action="store_true", help="list the moves that would be undone")
+    undo_parser.add_argument("--workers", type=int, default=DEFAULT_APPLY_WORKERS,
+                             help="folders restored in parallel")
+
+    classify_parser = commands.add_parser("classify", help="print where each path would go, without touching files")
+    classify_parser.add_argument("paths", nargs="?", default="-", help="file listing one path per line (default: stdin)")
+    classify_parser.add_argument("-0", "--null", action="store_true", help="paths are NUL-separated (find -print0)")
+
+    args = parser.parse_args(argv)
+    config = FileOrganizerConfig(args.config)
+    configure_copy_limits(config.settings, config.logger)
+
+    if args.command == "undo":
+        return undo_command(args, config)
+    if args.command == "classify":
+        return classify_command(args, config)
+
+    if args.command == "plan":
+        plan = build_plan(config, args.sources, args.recursive)
+        write_plan(plan, args.output, args.format)
+        renames = sum(1 for move in plan["moves"] if move["method"] == "rename")
+        copy_bytes = sum(move["size"] for move in plan["moves"] if move["method"] != "rename")
+        print(f"📋 {len(plan['moves'])} moves planned ({renames} renames, "
+              f"{len(plan['moves']) - renames} copies of {copy_bytes / (1024 * 1024):.1f} MB), "
+              f"{len(plan['skipped'])} files skipped", file=sys.stderr)
+        return 0
+
+    try:
+        plan = read_plan(args.plan)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ Could not read plan: {e}", file=sys.stderr)
+        return 1
+    journal = open_journal(config.settings, config.logger)
+    try:
+        totals = apply_plan(plan, config, args.workers, journal)
+    finally:
+        if journal is not None:
+            journal.close()
+    print(f"✅ {totals['rename']} renamed, {totals['copy']} copied ({totals['bytes'] / (1024 * 1024):.1f} MB) "
+          f"in {totals['seconds']:.2f}s; {totals['changed']} changed since planning, "
+          f"{totals['exists']} already existed, {totals['failed']} failed")
+    return 0 if not totals["failed"] else 1
+
+
+def undo_command(args, config):
+    if args.since is None and args.until is None and args.rule is None and args.dest is None:
+        print("❌ Select the moves to undo with --since, --until, --rule and/or --dest", file=sys.stderr)
+        return 2
+    journal = open_journal(config.settings, config.logger)
+    if journal is None:
+        print("❌ The move journal is disabled (journal_enabled), so there is nothing to undo", file=sys.stderr)
+        return 1
+    try:
+        dest_folder = os.path.abspath(os.path.expanduser(args.dest)) if args.dest else None
+        plan = build_undo_plan(journal, args.since, args.until, args.rule, dest_folder)
+        if args.dry_run:
+            for move in plan["moves"]:
+                print(f"{move['source']} → {move['dest']} ({move['undoes'] or 'unknown rule'})")
+            print(f"📋 {len(plan['moves'])} moves would be undone", file=sys.stderr)
+            return 0
+        totals = undo_moves(config, journal, plan, args.workers)
+    finally:
+        journal.close()
+    print(f"↩️ {totals['rename'] + totals['copy']} moves undone ({totals['rename']} renamed, {totals['copy']} copied) "
+          f"in {totals['seconds']:.2f}s; {totals['changed']} changed since being moved, {totals['failed']} failed")
+    return 0 if not totals["failed"] else 1
+
+
+def classify_command(args, config):
+    """Stream "path<TAB>destination<TAB>rule" lines; both fields are empty for unmatched paths."""
+    classifier = BatchClassifier(config.snapshot)
+    # Each distinct result is formatted once
+    suffixes = {}
+    count = 0
+    started = time.monotonic()
+    stream = sys.stdin if args.paths == "-" else open(args.paths, encoding="utf-8", errors="surrogateescape")
+    try:
+        for paths in read_path_batches(stream, "\0" if args.null else "\n"):
+            results = classifier.classify_many(paths)
+            for result in set(results) - suffixes.keys():
+                suffixes[result] = f"\t{result[0] or ''}\t{result[1] or ''}\n"
+            sys.stdout.write("".join(map(str.__add__, paths, map(suffixes.__getitem__, results))))
+            count += len(paths)
+    except BrokenPipeError:
+        # The reader (e.g. head) has seen enough; keep the interpreter's final flush quiet
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    seconds = time.monotonic() - started
+    print(f"🔎 {count} paths classified in {seconds:.2f}s ({count / max(seconds, 1e-9):,.0f}/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Organizer Logging
+Asynchronous, batched logging pipeline shared by the monitors.
+
+Log calls on the monitor and worker threads only put the record on a queue
+(QueueHandler). A single background thread drains the queue in batches and
+hands each batch to the handlers, so the log file gets one write and one
+flush per batch instead of per line. The log file rotates by size and by age.
+"""
+
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+DEFAULT_ROTATE_HOURS = 24
+DEFAULT_BATCH_SIZE = 256
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class BatchRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotating file handler that writes a whole batch of records at once.
+
+    Rotates when the file would grow past max_bytes or when it is older than
+    rotate_seconds, keeping backup_count old files (file.log.1, file.log.2, ...).
+    """
+
+    def __init__(self, filename, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT,
+                 rotate_seconds=DEFAULT_ROTATE_HOURS * 3600, encoding='utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+        self.rotate_seconds = rotate_seconds
+        self.opened_at = self._file_start_time()
+
+    def _file_start_time(self):
+        """Creation time of the current log file (st_ctime is creation time on Windows)."""
+        try:
+            stat = os.stat(self.baseFilename)
+            return getattr(stat, "st_birthtime", stat.st_ctime)
+        except OSError:
+            return time.time()
+
+    def _needs_rollover(self, pending_bytes):
+        if self.stream is None:
+            self.stream = self._open()
+        if self.maxBytes > 0 and self.stream.tell() + pending_bytes > self.maxBytes and self.stream.tell() > 0:
+            return True
+        if self.rotate_seconds and time.time() - self.opened_at >= self.rotate_seconds:
+            return True
+        return False
+
+    def doRollover(self):
+        super().doRollover()
+        self.opened_at = time.time()
+
+    def emit(self, record):
+        self.handle_batch([record])
+
+    def handle_batch(self, records):
+        """Format, rotate if needed, then write and flush the batch once."""
+        lines = []
+        for record in records:
+            if record.levelno >= self.level:
+                try:
+                    lines.append(self.format(record) + self.terminator)
+                except Exception:
+                    self.handleError(record)
+        if not lines:
+            return
+
+        data = "".join(lines)
+        with self.lock:
+            try:
+                if self._needs_rollover(len(data.encode(self.encoding or 'utf-8', 'replace'))):
+                    self.doRollover()
+                self.stream.write(data)
+                self.stream.flush()
+            except Exception:
+                self.handleError(records[-1])
+
+
+class BatchQueueListener:
+    """Background thread that drains a log queue in batches."""
+
+    def __init__(self, log_queue, handlers, batch_size=DEFAULT_BATCH_SIZE):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._monitor, name="LogWriter", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Flush everything still queued and stop the thread."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _dispatch(self, records):
+        for handler in self.handlers:
+            if hasattr(handler, "handle_batch"):
+                handler.handle_batch(records)
+            else:
+                for record in records:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+    def _monitor(self):
+        while True:
+            record = self.queue.get()
+            stopping = record is None
+            batch = [] if stopping else [record]
+
+            # Take whatever else is already waiting, up to one batch
+            while not stopping and len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            if batch:
+                self._dispatch(batch)
+            if stopping:
+                return
+
+
+# Listener per logger name, so re-running setup replaces the old pipeline
+_listeners = {}
+
+
+def setup_logging(name, log_file, settings=None, console=True):
+    """Create a logger whose output goes through the batched queue pipeline."""
+    settings = settings or {}
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+
+    # Clear existing handlers (and stop a previous pipeline)
+    logger.handlers.clear()
+    old_listener = _listeners.pop(name, None)
+    if old_listener is not None:
+        old_listener.stop()
+
+    formatter = logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+
+    # File handler with size and time based rotation
+    file_handler = BatchRotatingFileHandler(log_file)
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(formatter)
+    handlers = [file_handler]
+
+    # Console handler
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    listener = BatchQueueListener(log_queue, handlers)
+    listener.start()
+    _listeners[name] = listener
+
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    apply_log_settings(logger, settings)
+    return logger
+
+
+def apply_log_settings(logger, settings):
+    """Apply rotation and batching options from a settings dict to a running pipeline."""
+    listener = _listeners.get(logger.name)
+    if listener is None:
+        return
+
+    listener.batch_size = settings.get("log_batch_size", DEFAULT_BATCH_SIZE)
+    for handler in listener.handlers:
+        if isinstance(handler, BatchRotatingFileHandler):
+            handler.maxBytes = int(settings.get("log_max_mb", DEFAULT_MAX_BYTES / (1024 * 1024)) * 1024 * 1024)
+            handler.backupCount = settings.get("log_backup_count", DEFAULT_BACKUP_COUNT)
+            handler.rotate_seconds = settings.get("log_rotate_hours", DEFAULT_ROTATE_HOURS) * 3600
+
+
+def shutdown_logging():
+    """Flush and stop every logging pipeline."""
+    for name in list(_listeners):
+        _listeners.pop(name).stop()
+
+
+atexit.register(shutdown_logging)
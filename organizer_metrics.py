@@ -0,0 +1,248 @@
+"""
+Organizer Metrics
+Counters, gauges and histograms for the running monitor, served in the
+Prometheus text format on a localhost HTTP port.
+
+Metrics are module-level objects that any part of the organizer can update;
+updating one is a dict operation under a lock, so they are always on. The
+HTTP endpoint is only started when "metrics_port" is set in the settings:
+
+    curl http://127.0.0.1:9464/metrics
+"""
+
+import bisect
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 300)
+DURATION_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30, 120)
+SCAN_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+# Every metric registers itself here, in definition order
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class: a named metric with optional labels."""
+
+    type = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return lines
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    type = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        if not self.label_names:
+            # Unlabelled counters are reported as 0 before their first increment
+            self.values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Current value, either set directly or read from a function at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self.function = None
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def set_function(self, function):
+        """Read the value from function() on every scrape (None to stop)."""
+        self.function = function
+
+    def samples(self):
+        function = self.function
+        if function is not None:
+            try:
+                yield f"{self.name} {_format_value(function())}"
+            except Exception:
+                pass
+            return
+        yield from super().samples()
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    type = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                # Per-bucket counts (plus +Inf), then sum
+                entry = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[bisect.bisect_left(self.buckets, value)] += 1
+            entry[-1] += value
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, list(entry)) for key, entry in self.values.items())
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(entry[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+# Pipeline metrics
+FILES_DETECTED = Counter("organizer_files_detected_total", "Files handed to the move pipeline", ["category"])
+FILES_MOVED = Counter("organizer_files_moved_total", "Files moved to their destination", ["category", "method"])
+FILES_FAILED = Counter("organizer_files_failed_total", "Files that could not be moved", ["category"])
+BYTES_COPIED = Counter("organizer_bytes_copied_total", "Bytes copied across devices")
+COPY_THROTTLE_SECONDS = Counter("organizer_copy_throttle_seconds_total",
+                                "Time copies spent waiting for their destination's bandwidth limit")
+DETECTION_LATENCY = Histogram("organizer_detection_to_move_seconds",
+                              "Time from first seeing a file to finishing its move", buckets=LATENCY_BUCKETS)
+MOVE_DURATION = Histogram("organizer_move_duration_seconds", "Time spent moving one file",
+                          ["method"], buckets=DURATION_BUCKETS)
+QUEUE_DEPTH = Gauge("organizer_move_queue_depth", "Moves waiting for a worker")
+MOVES_IN_FLIGHT = Gauge("organizer_moves_in_flight", "Moves currently running")
+FILES_DEDUPLICATED = Counter("organizer_files_deduplicated_total", "Files found to be already in their destination",
+                             ["action"])
+CONFIG_RELOADS = Counter("organizer_config_reloads_total", "Configuration reloads", ["result"])
+POLL_SCAN_SECONDS = Histogram("organizer_poll_scan_seconds", "Time to list and diff the folder in polling mode",
+                              buckets=SCAN_BUCKETS)
+POLL_LISTINGS = Counter("organizer_poll_listings_total",
+                        "Folders checked in polling mode, by whether they had to be listed", ["result"])
+
+
+def render_metrics():
+    """Return every registered metric in the Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def category_for(dest_folder):
+    """Metric label for a destination folder: its path relative to home."""
+    if dest_folder is None:
+        return "unmatched"
+    try:
+        return Path(dest_folder).relative_to(Path.home()).as_posix()
+    except ValueError:
+        return str(dest_folder)
+
+
+def watch_pool(pool):
+    """Report a MoveWorkerPool's queue depth and in-flight moves."""
+    QUEUE_DEPTH.set_function(lambda: pool.stats()["queue_depth"])
+    MOVES_IN_FLIGHT.set_function(lambda: pool.stats()["in_flight"])
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """HTTP server for /metrics on a background thread."""
+
+    def __init__(self, port, host=DEFAULT_METRICS_HOST):
+        self.httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="MetricsServer", daemon=True)
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_metrics_server(settings, logger=None):
+    """Start the metrics endpoint if "metrics_port" is set. Returns the server or None."""
+    port = settings.get("metrics_port")
+    if not port:
+        return None
+    try:
+        server = MetricsServer(port, settings.get("metrics_host", DEFAULT_METRICS_HOST))
+    except OSError as e:
+        if logger:
+            logger.error(f"Could not start metrics endpoint on port {port}: {e}")
+        return None
+    server.start()
+    if logger:
+        logger.info(f"Metrics available at {server.address}")
+    return server
@@ -0,0 +1,135 @@
+"""
+Startup Reconciliation
+Organizes files that were already in the watched folders when the monitor
+started (e.g. downloaded while the service was stopped).
+
+Each folder is streamed with os.scandir, so even a folder with hundreds of
+thousands of entries is never held in memory as a list, and DirEntry's cached
+type and stat information avoid extra system calls. Files are fed into the
+normal move pipeline at a limited rate and only while the move queue is
+short, so live events are never stuck behind the backlog.
+"""
+
+import os
+import time
+import threading
+
+from folder_watchers import folder_list
+from folder_tree import walk_tree
+
+DEFAULT_FILES_PER_SECOND = 100
+
+
+def iter_backlog(folder, is_temporary=None, tree=None):
+    """Yield DirEntry objects for the regular files currently in folder.
+
+    With a TreeFilter, the subfolders it follows are included too.
+    """
+    for entries in _listings(folder, tree):
+        for entry in entries:
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+            except OSError:
+                continue
+            if is_temporary is not None and is_temporary(entry.name):
+                continue
+            yield entry
+
+
+def _listings(folder, tree):
+    if tree is not None:
+        for _, _, files, _ in walk_tree(str(folder), tree):
+            yield files
+    else:
+        with os.scandir(folder) as entries:
+            yield entries
+
+
+class BacklogReconciler:
+    """Background thread that feeds existing files into the move pipeline."""
+
+    def __init__(self, folders, submit, settler, pool, files_per_second=DEFAULT_FILES_PER_SECOND, logger=None):
+        self.folders = folder_list(folders)
+        # {folder: TreeFilter} marks folders to reconcile recursively
+        self.trees = {str(folder): tree for folder, tree in folders.items()} if isinstance(folders, dict) else {}
+        self.submit = submit
+        self.settler = settler
+        self.pool = pool
+        self.files_per_second = files_per_second
+        self.logger = logger
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.submitted = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="BacklogReconciler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _wait_for_room(self):
+        """Keep the move queue short so live files are not stuck behind the backlog."""
+        low_water = len(self.pool.threads) * 2
+        while not self.pool.wait_for_room(low_water, timeout=0.1):
+            if self.stop_event.is_set():
+                return False
+        return True
+
+    def run(self):
+        interval = 1.0 / self.files_per_second if self.files_per_second else 0
+        next_slot = time.monotonic()
+        started = time.monotonic()
+
+        for folder in self.folders:
+            if self.stop_event.is_set():
+                break
+            next_slot = self._reconcile_folder(folder, interval, next_slot)
+
+        if self.logger:
+            elapsed = time.monotonic() - started
+            self.logger.info(f"Reconciliation finished: {self.submitted} existing files queued in {elapsed:.1f}s")
+
+    def _reconcile_folder(self, folder, interval, next_slot):
+        """Feed one folder's backlog into the pipeline; the rate limit carries over between folders."""
+        if self.logger:
+            self.logger.info(f"Reconciling files already in {folder}...")
+
+        try:
+            for entry in iter_backlog(folder, self.settler.is_temporary, self.trees.get(folder)):
+                if self.stop_event.is_set() or not self._wait_for_room():
+                    break
+
+                # Rate limit
+                now = time.monotonic()
+                if next_slot > now and self.stop_event.wait(next_slot - now):
+                    break
+                next_slot = max(next_slot, now) + interval
+
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                if time.time() - stat.st_mtime < self.settler.quiet_period:
+                    # Possibly still downloading: let the settler decide
+                    self.settler.track(entry.path)
+                else:
+                    self.submit(entry.path)
+                self.submitted += 1
+        except OSError as e:
+            if self.logger:
+                self.logger.error(f"Error reconciling {folder}: {e}")
+        return next_slot
+
+
+def create_reconciler(folders, submit, settler, pool, settings, logger=None):
+    """Create a BacklogReconciler for one or more folders, configured from a settings dict."""
+    return BacklogReconciler(
+        folders, submit, settler, pool,
+        files_per_second=settings.get("reconcile_files_per_second", DEFAULT_FILES_PER_SECOND),
+        logger=logger,
+    )
@@ -0,0 +1,286 @@
+"""
+Rule Engine
+Compiles the rules from file_rules.json into a matcher whose cost stays flat
+as the number of rules grows.
+
+Rules are checked in order and the first one that matches wins. A rule can
+combine any of these conditions (all given conditions must hold):
+
+    {
+      "name": "Compressed tarballs",
+      "destination": "Downloads/Archives",
+      "extensions": [".tar.gz", ".tgz"],      # multi-part extensions are fine
+      "pattern": "Screenshot*",                # glob on the file name
+      "regex": "^invoice-\\d+",               # regular expression searched in the file name
+      "source": "~/Downloads",                # folder the file was found in (glob)
+      "min_size": "10MB", "max_size": 1024,    # bytes or KB/MB/GB strings
+      "min_age_days": 0, "max_age_days": 30    # based on modification time
+    }
+
+The flat extension map ("file_extensions") is compiled as the last, lowest
+priority rules, so existing configurations behave exactly as before.
+
+Matching works in three stages:
+- a suffix trie over dotted extensions finds rules keyed on the file's extensions
+- name patterns that start with literal text are looked up by that prefix;
+  the remaining patterns are joined into one combined regular expression
+- rules without an extension or name condition, and stat-based conditions
+  (size, age), are only evaluated for the few candidates left
+"""
+
+import os
+import re
+import time
+import bisect
+import fnmatch
+from pathlib import Path
+
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+
+def parse_size(value):
+    """Parse a size given as bytes or as a string like '10MB'."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?B)?\s*", str(value).upper())
+    if not match:
+        raise ValueError(f"Invalid size: {value!r}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2) or "B"])
+
+
+def glob_prefix(pattern):
+    """Literal text before the first wildcard of a glob."""
+    match = re.search(r"[*?\[]", pattern)
+    return pattern[:match.start()] if match else pattern
+
+
+def regex_prefix(regex):
+    """Literal text an anchored regex requires at the start of the name.
+
+    Only simple cases are recognised; anything else returns "".
+    """
+    if not regex.startswith("^") or "|" in regex:
+        return ""
+    literal = re.match(r"[A-Za-z0-9 _\-]*", regex[1:]).group()
+    following = regex[1 + len(literal):2 + len(literal)]
+    if following in ("*", "?", "+", "{"):
+        # The last character is optional or repeated
+        literal = literal[:-1]
+    return literal
+
+
+class Rule:
+    """One compiled rule."""
+
+    __slots__ = ("index", "name", "destination", "dest_path", "extensions", "name_regex",
+                 "name_prefix", "source_regex", "min_size", "max_size", "min_age", "max_age")
+
+    def __init__(self, index, spec, case_sensitive=False):
+        self.index = index
+        self.name = spec.get("name", f"rule {index + 1}")
+        self.destination = spec["destination"]
+        self.dest_path = Path.home() / self.destination
+        flags = 0 if case_sensitive else re.IGNORECASE
+
+        extensions = spec.get("extensions") or []
+        if isinstance(extensions, str):
+            extensions = [extensions]
+        self.extensions = tuple(
+            ext if case_sensitive else ext.lower()
+            for ext in (e if e.startswith(".") else "." + e for e in extensions)
+        )
+
+        patterns = []
+        prefixes = [""]
+        if spec.get("pattern"):
+            patterns.append(fnmatch.translate(spec["pattern"]))
+            prefixes.append(glob_prefix(spec["pattern"]))
+        if spec.get("regex"):
+            patterns.append(f"(?s:.*?)(?:{spec['regex']})")
+            prefixes.append(regex_prefix(spec["regex"]))
+        self.name_regex = re.compile("".join(f"(?={p})" for p in patterns), flags) if patterns else None
+
+        # Literal text every matching name must start with ("" if unknown)
+        self.name_prefix = max(prefixes, key=len)
+        if not case_sensitive:
+            self.name_prefix = self.name_prefix.lower()
+
+        source = spec.get("source")
+        if source:
+            source = os.path.normcase(str(Path(source).expanduser()))
+            self.source_regex = re.compile(fnmatch.translate(source), flags)
+        else:
+            self.source_regex = None
+
+        self.min_size = parse_size(spec["min_size"]) if "min_size" in spec else None
+        self.max_size = parse_size(spec["max_size"]) if "max_size" in spec else None
+        self.min_age = spec["min_age_days"] * 86400 if "min_age_days" in spec else None
+        self.max_age = spec["max_age_days"] * 86400 if "max_age_days" in spec else None
+
+    @property
+    def needs_stat(self):
+        return (self.min_size is not None or self.max_size is not None or
+                self.min_age is not None or self.max_age is not None)
+
+    def check_predicates(self, file_name, source_folder, stat_result):
+        """Evaluate the conditions not covered by the trie and combined regex."""
+        if self.name_regex is not None and not self.name_regex.match(file_name):
+            return False
+        if self.source_regex is not None:
+            if source_folder is None or not self.source_regex.match(os.path.normcase(str(source_folder))):
+                return False
+        if self.needs_stat:
+            if stat_result is None:
+                return False
+            size = stat_result.st_size
+            if self.min_size is not None and size < self.min_size:
+                return False
+            if self.max_size is not None and size > self.max_size:
+                return False
+            age = time.time() - stat_result.st_mtime
+            if self.min_age is not None and age < self.min_age:
+                return False
+            if self.max_age is not None and age > self.max_age:
+                return False
+        return True
+
+
+class SuffixTrie:
+    """Trie over dotted extension parts, walked from the end of the file name."""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, extension, rule_index):
+        node = self.root
+        for part in reversed(extension.split(".")[1:]):
+            node = node.setdefault(part, {})
+        node.setdefault(None, []).append(rule_index)
+
+    def lookup(self, name_parts):
+        """Return rule indices for every extension that ends the name."""
+        found = []
+        node = self.root
+        # name_parts excludes the leading stem, so "a.tar.gz" -> ["tar", "gz"]
+        for part in reversed(name_parts):
+            node = node.get(part)
+            if node is None:
+                break
+            found.extend(node.get(None, ()))
+        return found
+
+
+class RuleEngine:
+    """Ordered rule list compiled once into a fast matcher."""
+
+    def __init__(self, rules=(), file_extensions=None, case_sensitive=False):
+        self.case_sensitive = case_sensitive
+        self.rules = []
+        self.trie = SuffixTrie()
+        self.max_ext_parts = 0
+        self.unkeyed = []          # rules with neither extensions nor a name pattern
+        pattern_rules = []         # rules whose only key is a name pattern
+
+        specs = list(rules)
+        # The legacy extension map becomes the lowest-priority rules
+        for ext, folder in (file_extensions or {}).items():
+            specs.append({"name": f"extension {ext}", "destination": folder, "extensions": [ext]})
+
+        for index, spec in enumerate(specs):
+            rule = Rule(index, spec, case_sensitive)
+            self.rules.append(rule)
+            if rule.extensions:
+                for ext in rule.extensions:
+                    self.trie.add(ext, index)
+                    self.max_ext_parts = max(self.max_ext_parts, ext.count("."))
+            elif rule.name_regex is not None:
+                pattern_rules.append(rule)
+            else:
+                self.unkeyed.append(index)
+
+        # Patterns starting with literal text are bucketed by that prefix, so
+        # only a handful are ever tested; the rest share one combined regex
+        self.prefix_index = {}
+        self.unprefixed_rules = []
+        for rule in pattern_rules:
+            if rule.name_prefix:
+                bucket = self.prefix_index.setdefault(len(rule.name_prefix), {})
+                bucket.setdefault(rule.name_prefix, []).append(rule.index)
+            else:
+                self.unprefixed_rules.append(rule)
+        self.prefix_lengths = sorted(self.prefix_index)
+
+        if self.unprefixed_rules:
+            flags = 0 if case_sensitive else re.IGNORECASE
+            combined = "|".join(f"(?P<r{rule.index}>{rule.name_regex.pattern})" for rule in self.unprefixed_rules)
+            self.combined_regex = re.compile(combined, flags)
+        else:
+            self.combined_regex = None
+
+    def __len__(self):
+        return len(self.rules)
+
+    def extension_parts(self, file_name, limit=None):
+        """Return the dotted parts after the stem, at most limit (default max_ext_parts) of them."""
+        parts = file_name.split(".")
+        if len(parts) < 2 or (len(parts) == 2 and not parts[0]):
+            # No extension, or a dotfile like ".bashrc"
+            return []
+        return parts[max(1, len(parts) - (self.max_ext_parts if limit is None else limit)):]
+
+    def match(self, file_name, source_folder=None, stat_result=None, stat_func=None):
+        """Return the first matching Rule, or None.
+
+        stat_result can be passed in if known; otherwise stat_func() is called
+        only when a candidate rule actually needs size or age.
+        """
+        folded_name = file_name if self.case_sensitive else file_name.lower()
+        candidates = self.trie.lookup(self.extension_parts(folded_name)) if self.max_ext_parts else []
+
+        for length in self.prefix_lengths:
+            if length > len(folded_name):
+                break
+            hits = self.prefix_index[length].get(folded_name[:length])
+            if hits:
+                candidates.extend(hits)
+
+        pattern_hit = None
+        if self.combined_regex is not None:
+            found = self.combined_regex.match(file_name)
+            if found:
+                pattern_hit = int(found.lastgroup[1:])
+                candidates.append(pattern_hit)
+
+        candidates.extend(self.unkeyed)
+        if not candidates:
+            return None
+        candidates.sort()
+
+        position = 0
+        while position < len(candidates):
+            index = candidates[position]
+            position += 1
+            rule = self.rules[index]
+
+            if rule.needs_stat and stat_result is None and stat_func is not None:
+                try:
+                    stat_result = stat_func()
+                except OSError:
+                    stat_func = None
+            if rule.check_predicates(file_name, source_folder, stat_result):
+                return rule
+
+            if index == pattern_hit:
+                # The combined regex only reports its first hit; if that rule failed,
+                # the next unprefixed pattern matching the name becomes a candidate
+                pattern_hit = self._next_pattern_rule(file_name, index)
+                if pattern_hit is not None:
+                    bisect.insort(candidates, pattern_hit, lo=position)
+        return None
+
+    def _next_pattern_rule(self, file_name, after_index):
+        """Index of the first unprefixed pattern rule after after_index matching the name."""
+        for rule in self.unprefixed_rules:
+            if rule.index > after_index and rule.name_regex.match(file_name):
+                return rule.index
+        return None
@@ -7,6 +7,7 @@ Alternative to Windows service for simpler installation.
 import os
 import sys
 import time
+import asyncio
 import logging
 import subprocess
 from pathlib import Path
@@ -105,8 +106,11 @@ def check_startup_status():
         print(f"❌ Error checking startup status: {e}")
         return False
 
-def run_file_organizer():
-    """Run the file organizer monitor."""
+def run_file_organizer(reconcile=False):
+    """Run the file organizer monitor.
+    
+    With reconcile=True, files that arrived while it was not running are organized first.
+    """
     logger = setup_logging()
     logger.info("Starting File Organizer from startup...")
     
@@ -119,10 +123,16 @@ def run_file_organizer():
         json_monitor = script_dir / "folder_monitor_json.py"
         if json_monitor.exists():
             logger.info("Running JSON-based file monitor...")
-            # Import and run the monitor
+            # Drive the same monitor core as the command-line monitor, without its console output
             sys.path.insert(0, str(script_dir))
-            from folder_monitor_json import monitor_downloads_folder
-            monitor_downloads_folder()
+            from folder_monitor_json import FileOrganizerConfig, move_file
+            from monitor_core import MonitorCore
+            config = FileOrganizerConfig()
+            core = MonitorCore(config, config.logger, move_file, reconcile=reconcile)
+            if core.open():
+                # Ctrl+C or SIGTERM stops it straight away
+                asyncio.run(core.run(handle_signals=True))
+                logger.info("File Organizer stopped")
         else:
             logger.error("folder_monitor_json.py not found!")
             
@@ -141,6 +151,7 @@ def main():
         print("  python startup_organizer.py uninstall - Remove from startup") 
         print("  python startup_organizer.py status    - Check startup status")
         print("  python startup_organizer.py run       - Run file organizer now")
+        print("                                          (add --reconcile to organize existing files)")
         return
     
     command = sys.argv[1].lower()
@@ -152,10 +163,10 @@ def main():
     elif command == "status":
         check_startup_status()
     elif command == "run":
-        run_file_organizer()
+        run_file_organizer(reconcile="--reconcile" in sys.argv)
     elif command == "--startup":
-        # This is called from Windows startup
-        run_file_organizer()
+        # This is called from Windows startup: catch up on files downloaded while logged off
+        run_file_organizer(reconcile="--no-reconcile" not in sys.argv)
     else:
         print(f"Unknown command: {command}")
 
@@ -0,0 +1,67 @@
+"""
+Tests for name_snapshot.py and the polling pass built on it.
+
+The memory and time ceilings are checked with the same code as
+benchmarks/check_snapshot_memory.py, on a folder small enough for CI.
+Run with: python -m unittest discover tests
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Import the organizer modules (and the snapshot check) from the repository root
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import name_snapshot
+from name_snapshot import NameSnapshot
+from check_snapshot_memory import run_check
+
+# Enough files that fixed overhead doesn't dominate, few enough to create in a second
+ENTRIES = 20000
+# Sort runs much smaller than the folder, so the run-and-merge path is what gets measured
+SORT_RUN = 4096
+
+
+class NameSnapshotTest(unittest.TestCase):
+
+    def test_added_reports_only_new_names(self):
+        old = [f"file_{i}.pdf" for i in range(300)]
+        new = old[50:] + ["a.jpg", "b.mp3"]
+        previous, current = NameSnapshot(old), NameSnapshot(new)
+        self.assertEqual(sorted(previous.added(current, new)), ["a.jpg", "b.mp3"])
+        self.assertEqual(previous.added(previous, old), [])
+
+    def test_runs_are_merged_into_one_sorted_array(self):
+        names = [f"download_{i}.zip" for i in range(1000)]
+        with mock.patch.object(name_snapshot, "SORT_RUN", 64):
+            snapshot = NameSnapshot(names)
+        self.assertEqual(list(snapshot.hashes), sorted(map(hash, names)))
+        self.assertIn("download_999.zip", snapshot)
+        self.assertNotIn("download_1000.zip", snapshot)
+        self.assertEqual(snapshot.nbytes(), 8 * len(names))
+
+
+class PollingPassCeilingTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with mock.patch.object(name_snapshot, "SORT_RUN", SORT_RUN):
+            cls.results, cls.failures = run_check(ENTRIES, log=lambda message: None)
+
+    def test_pass_reports_new_files(self):
+        self.assertNotIn("new_files", self.failures, self.failures.get("new_files"))
+
+    def test_memory_ceiling(self):
+        self.assertNotIn("peak", self.failures, self.failures.get("peak"))
+        self.assertNotIn("retained", self.failures, self.failures.get("retained"))
+
+    def test_time_bound(self):
+        self.assertNotIn("time", self.failures, self.failures.get("time"))
+
+
+if __name__ == "__main__":
+    unittest.main()